@@ -0,0 +1,66 @@
+"""Added a trigram index for substring searches of terms
+
+Revision ID: 7c1f3a9d2b45
+Revises: 04b2d51ca468
+Create Date: 2026-10-18 10:12:31.402117
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "7c1f3a9d2b45"
+down_revision = "04b2d51ca468"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    db_bind = op.get_bind()
+    if db_bind.engine.name != "postgresql":
+        return
+
+    # pg_trgm ships with postgres' contrib modules, which some builds leave out
+    available = db_bind.execute(
+        sa.sql.text(
+            """
+        SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm';
+    """
+        )
+    ).scalar()
+    if not available:
+        return
+
+    db_bind.execute(
+        sa.sql.text(
+            """
+        CREATE EXTENSION IF NOT EXISTS pg_trgm;
+    """
+        )
+    )
+
+    # a trigram GIN index lets postgres serve ILIKE '%term%' without a sequential scan
+    db_bind.execute(
+        sa.sql.text(
+            """
+        CREATE INDEX IF NOT EXISTS ix_definitions_term_trgm ON definitions USING gin (term gin_trgm_ops);
+    """
+        )
+    )
+
+
+def downgrade() -> None:
+    db_bind = op.get_bind()
+    if db_bind.engine.name != "postgresql":
+        return
+
+    # the extension is left installed in case anything else has started using it
+    db_bind.execute(
+        sa.sql.text(
+            """
+        DROP INDEX IF EXISTS ix_definitions_term_trgm;
+    """
+        )
+    )
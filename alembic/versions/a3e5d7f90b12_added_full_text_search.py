@@ -0,0 +1,160 @@
+"""Added dialect native full-text search of terms and definitions
+
+Revision ID: a3e5d7f90b12
+Revises: 7c1f3a9d2b45
+Create Date: 2026-10-18 11:02:47.218630
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "a3e5d7f90b12"
+down_revision = "7c1f3a9d2b45"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    db_bind = op.get_bind()
+    if db_bind.engine.name == "postgresql":
+        #
+        # A weighted tsvector of terms (A) and definitions (B), kept current by postgres
+        #
+        db_bind.execute(
+            sa.sql.text(
+                """
+            ALTER TABLE definitions ADD COLUMN IF NOT EXISTS tsv_search tsvector GENERATED ALWAYS AS (
+                setweight(to_tsvector('pg_catalog.english', COALESCE(term,'')), 'A') ||
+                setweight(to_tsvector('pg_catalog.english', COALESCE(definition,'')), 'B')
+            ) STORED;
+        """
+            )
+        )
+        db_bind.execute(
+            sa.sql.text(
+                """
+            CREATE INDEX IF NOT EXISTS ix_definitions_tsv_search ON definitions USING gin(tsv_search);
+        """
+            )
+        )
+
+    elif db_bind.engine.name == "mysql":
+        #
+        # MATCH() needs an index over exactly the columns it's passed, so terms get
+        # an index of their own to be weighted above definitions
+        #
+        db_bind.execute(
+            sa.sql.text(
+                """
+            ALTER TABLE definitions ADD FULLTEXT INDEX ix_definitions_term_fulltext (term);
+        """
+            )
+        )
+        db_bind.execute(
+            sa.sql.text(
+                """
+            ALTER TABLE definitions ADD FULLTEXT INDEX ix_definitions_fulltext (term, definition);
+        """
+            )
+        )
+
+    elif db_bind.engine.name == "sqlite":
+        #
+        # An external content FTS5 table over definitions, kept current by triggers
+        #
+        db_bind.execute(
+            sa.sql.text(
+                """
+            CREATE VIRTUAL TABLE definitions_fts USING fts5(
+                term, definition, content='definitions', content_rowid='id', tokenize='porter unicode61'
+            );
+        """
+            )
+        )
+        db_bind.execute(
+            sa.sql.text(
+                """
+            CREATE TRIGGER definitions_fts_insert AFTER INSERT ON definitions BEGIN
+                INSERT INTO definitions_fts(rowid, term, definition) VALUES (new.id, new.term, new.definition);
+            END;
+        """
+            )
+        )
+        db_bind.execute(
+            sa.sql.text(
+                """
+            CREATE TRIGGER definitions_fts_delete AFTER DELETE ON definitions BEGIN
+                INSERT INTO definitions_fts(definitions_fts, rowid, term, definition)
+                VALUES ('delete', old.id, old.term, old.definition);
+            END;
+        """
+            )
+        )
+        db_bind.execute(
+            sa.sql.text(
+                """
+            CREATE TRIGGER definitions_fts_update AFTER UPDATE ON definitions BEGIN
+                INSERT INTO definitions_fts(definitions_fts, rowid, term, definition)
+                VALUES ('delete', old.id, old.term, old.definition);
+                INSERT INTO definitions_fts(rowid, term, definition) VALUES (new.id, new.term, new.definition);
+            END;
+        """
+            )
+        )
+        # index existing records
+        db_bind.execute(
+            sa.sql.text(
+                """
+            INSERT INTO definitions_fts(definitions_fts) VALUES ('rebuild');
+        """
+            )
+        )
+
+
+def downgrade() -> None:
+    db_bind = op.get_bind()
+    if db_bind.engine.name == "postgresql":
+        db_bind.execute(
+            sa.sql.text(
+                """
+            DROP INDEX IF EXISTS ix_definitions_tsv_search;
+        """
+            )
+        )
+        db_bind.execute(
+            sa.sql.text(
+                """
+            ALTER TABLE definitions DROP COLUMN IF EXISTS tsv_search;
+        """
+            )
+        )
+
+    elif db_bind.engine.name == "mysql":
+        db_bind.execute(
+            sa.sql.text(
+                """
+            ALTER TABLE definitions DROP INDEX ix_definitions_fulltext;
+        """
+            )
+        )
+        db_bind.execute(
+            sa.sql.text(
+                """
+            ALTER TABLE definitions DROP INDEX ix_definitions_term_fulltext;
+        """
+            )
+        )
+
+    elif db_bind.engine.name == "sqlite":
+        for trigger in ("definitions_fts_insert", "definitions_fts_delete", "definitions_fts_update"):
+            db_bind.execute(sa.sql.text(f"DROP TRIGGER IF EXISTS {trigger};"))
+        db_bind.execute(
+            sa.sql.text(
+                """
+            DROP TABLE IF EXISTS definitions_fts;
+        """
+            )
+        )
@@ -0,0 +1,139 @@
+"""Partitioned interactions by month on postgres, and added interaction_rollups
+
+Revision ID: b7d3e1f5a962
+Revises: e4a92c6b1f08
+Create Date: 2026-10-18 20:02:14.518337
+
+"""
+
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "b7d3e1f5a962"
+down_revision = "e4a92c6b1f08"
+branch_labels = None
+depends_on = None
+
+# a copy of gloss.retention.PARTITIONS_AHEAD, as it may change after this migration
+PARTITIONS_AHEAD = 3
+
+
+def add_months(moment, months):
+    """Return the start of the month `months` after the month of `moment`"""
+    index = moment.year * 12 + moment.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def month_partitions(first, last):
+    """Yield the (name, start, end) of each monthly partition from the month of `first` to the month of `last`"""
+    start = add_months(first, 0)
+    while start <= last:
+        end = add_months(start, 1)
+        yield f"interactions_y{start.year:04d}m{start.month:02d}", start, end
+        start = end
+
+
+def upgrade() -> None:
+    op.create_table(
+        "interaction_rollups",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("month", sa.DateTime(), nullable=False),
+        sa.Column("term", sa.Unicode(255), nullable=False),
+        sa.Column("action", sa.Unicode(255), nullable=False),
+        sa.Column("count", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("month", "term", "action", name="uq_interaction_rollups_month_term_action"),
+    )
+
+    db_bind = op.get_bind()
+    if db_bind.engine.name != "postgresql":
+        # for finding the interactions to prune
+        op.create_index(op.f("ix_interactions_creation_date"), "interactions", ["creation_date"], unique=False)
+        return
+
+    # a partitioned table's primary key has to include the column it's partitioned by, which
+    # can't be null
+    now = datetime.utcnow()
+    first = db_bind.execute(sa.sql.text("SELECT min(creation_date) FROM interactions")).scalar() or now
+    db_bind.execute(
+        sa.sql.text("UPDATE interactions SET creation_date = :first WHERE creation_date IS NULL"), {"first": first}
+    )
+
+    db_bind.execute(
+        sa.sql.text(
+            """
+        ALTER TABLE interactions RENAME TO interactions_unpartitioned;
+        ALTER TABLE interactions_unpartitioned DROP CONSTRAINT interactions_pkey;
+        DROP INDEX ix_interactions_action;
+
+        CREATE TABLE interactions (
+            id INTEGER NOT NULL DEFAULT nextval('interactions_id_seq'),
+            creation_date TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            user_name VARCHAR(255),
+            term VARCHAR(255),
+            action VARCHAR(255),
+            CONSTRAINT interactions_pkey PRIMARY KEY (id, creation_date)
+        ) PARTITION BY RANGE (creation_date);
+        CREATE INDEX ix_interactions_action ON interactions (action);
+        CREATE INDEX ix_interactions_creation_date ON interactions (creation_date);
+        ALTER SEQUENCE interactions_id_seq OWNED BY interactions.id;
+
+        -- for anything that falls outside the monthly partitions
+        CREATE TABLE interactions_default PARTITION OF interactions DEFAULT;
+    """
+        )
+    )
+
+    for name, start, end in month_partitions(first, add_months(now, PARTITIONS_AHEAD)):
+        db_bind.execute(
+            sa.sql.text(f"CREATE TABLE {name} PARTITION OF interactions FOR VALUES FROM (:start) TO (:end)"),
+            {"start": start, "end": end},
+        )
+
+    db_bind.execute(
+        sa.sql.text(
+            """
+        INSERT INTO interactions (id, creation_date, user_name, term, action)
+        SELECT id, creation_date, user_name, term, action FROM interactions_unpartitioned;
+        DROP TABLE interactions_unpartitioned;
+    """
+        )
+    )
+
+
+def downgrade() -> None:
+    db_bind = op.get_bind()
+    if db_bind.engine.name == "postgresql":
+        db_bind.execute(
+            sa.sql.text(
+                """
+            ALTER TABLE interactions RENAME TO interactions_partitioned;
+            ALTER TABLE interactions_partitioned DROP CONSTRAINT interactions_pkey;
+            DROP INDEX ix_interactions_action;
+
+            CREATE TABLE interactions (
+                id INTEGER NOT NULL DEFAULT nextval('interactions_id_seq'),
+                creation_date TIMESTAMP WITHOUT TIME ZONE,
+                user_name VARCHAR(255),
+                term VARCHAR(255),
+                action VARCHAR(255),
+                CONSTRAINT interactions_pkey PRIMARY KEY (id)
+            );
+            CREATE INDEX ix_interactions_action ON interactions (action);
+            ALTER SEQUENCE interactions_id_seq OWNED BY interactions.id;
+
+            INSERT INTO interactions (id, creation_date, user_name, term, action)
+            SELECT id, creation_date, user_name, term, action FROM interactions_partitioned;
+            -- which drops its partitions along with it
+            DROP TABLE interactions_partitioned;
+        """
+            )
+        )
+    else:
+        op.drop_index(op.f("ix_interactions_creation_date"), table_name="interactions")
+
+    op.drop_table("interaction_rollups")
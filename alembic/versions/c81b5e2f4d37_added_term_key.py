@@ -0,0 +1,63 @@
+"""Added a normalized term_key column for case-insensitive lookups
+
+Revision ID: c81b5e2f4d37
+Revises: a3e5d7f90b12
+Create Date: 2026-10-18 11:48:09.551370
+
+"""
+
+import logging
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "c81b5e2f4d37"
+down_revision = "a3e5d7f90b12"
+branch_labels = None
+depends_on = None
+
+logger = logging.getLogger("alembic.runtime.migration")
+
+
+# a copy of gloss.models.normalize_term, as the models may change after this migration
+def normalize_term(term):
+    return term.lower()
+
+
+def upgrade() -> None:
+    op.add_column("definitions", sa.Column("term_key", sa.Unicode(255), nullable=True))
+
+    # keys are worked out in Python, as lookups do: the database's lower() may only fold
+    # ASCII, as sqlite's does, and postgres' does under the C locale
+    db_bind = op.get_bind()
+    rows = db_bind.execute(sa.sql.text("SELECT id, term, definition FROM definitions ORDER BY id")).all()
+    seen = set()
+    keys = []
+    duplicates = []
+    for row in rows:
+        term_key = normalize_term(row.term) if row.term is not None else None
+        if term_key is not None and term_key in seen:
+            duplicates.append(row)
+            continue
+        seen.add(term_key)
+        keys.append({"id": row.id, "term_key": term_key})
+    if keys:
+        db_bind.execute(sa.sql.text("UPDATE definitions SET term_key = :term_key WHERE id = :id"), keys)
+
+    # of any definitions differing just by case, lookups have been served the oldest, so that
+    # keeps its key. The others couldn't be looked up, and without a key couldn't be deleted
+    # either, so they're deleted now, and logged in case any are worth setting again
+    for row in duplicates:
+        logger.warning(f"Deleting definition {row.id}, {row.term!r} = {row.definition!r}, a duplicate of an older one")
+    if duplicates:
+        db_bind.execute(sa.sql.text("DELETE FROM definitions WHERE id = :id"), [{"id": row.id} for row in duplicates])
+
+    op.create_index(op.f("ix_definitions_term_key"), "definitions", ["term_key"], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_definitions_term_key"), table_name="definitions")
+    # not a batch operation, as recreating the table on sqlite would lose its full-text triggers
+    op.drop_column("definitions", "term_key")
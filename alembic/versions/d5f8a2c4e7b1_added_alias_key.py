@@ -0,0 +1,57 @@
+"""Added alias_key, so that aliases set before their term was defined can be found by index
+
+Revision ID: d5f8a2c4e7b1
+Revises: b7d3e1f5a962
+Create Date: 2026-10-19 09:14:37.204518
+
+"""
+
+import re
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "d5f8a2c4e7b1"
+down_revision = "b7d3e1f5a962"
+branch_labels = None
+depends_on = None
+
+# a copy of gloss.bot.ALIAS_KEYWORDS, as the bot may change after this migration
+ALIAS_KEYWORDS = ("see also", "see")
+
+
+def get_alias_term(definition):
+    for keyword in ALIAS_KEYWORDS:
+        if definition.lower().startswith(keyword):
+            return re.split(keyword, definition, flags=re.IGNORECASE)[1].strip()
+
+    return None
+
+
+# a copy of gloss.models.normalize_term, which the term_keys were made with
+def normalize_term(term):
+    return term.lower()
+
+
+def upgrade() -> None:
+    op.add_column("definitions", sa.Column("alias_key", sa.Unicode(255), nullable=True))
+
+    db_bind = op.get_bind()
+    rows = db_bind.execute(sa.sql.text("SELECT id, definition FROM definitions")).all()
+    keys = []
+    for row in rows:
+        alias_term = get_alias_term(row.definition or "")
+        if alias_term:
+            keys.append({"id": row.id, "alias_key": normalize_term(alias_term)[:255]})
+    if keys:
+        db_bind.execute(sa.sql.text("UPDATE definitions SET alias_key = :alias_key WHERE id = :id"), keys)
+
+    op.create_index(op.f("ix_definitions_alias_key"), "definitions", ["alias_key"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_definitions_alias_key"), table_name="definitions")
+    # not a batch operation, as recreating the table on sqlite would lose its full-text triggers
+    op.drop_column("definitions", "alias_key")
@@ -0,0 +1,76 @@
+"""Added alias_id, resolving aliases to the definition they point at
+
+Revision ID: e4a92c6b1f08
+Revises: c81b5e2f4d37
+Create Date: 2026-10-18 12:31:55.890214
+
+"""
+
+import re
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "e4a92c6b1f08"
+down_revision = "c81b5e2f4d37"
+branch_labels = None
+depends_on = None
+
+# a copy of gloss.bot.ALIAS_KEYWORDS, as the bot may change after this migration
+ALIAS_KEYWORDS = ("see also", "see")
+
+
+def get_alias_term(definition):
+    for keyword in ALIAS_KEYWORDS:
+        if definition.lower().startswith(keyword):
+            return re.split(keyword, definition, flags=re.IGNORECASE)[1].strip()
+
+    return None
+
+
+# a copy of gloss.models.normalize_term, which the term_keys were made with
+def normalize_term(term):
+    return term.lower()
+
+
+def upgrade() -> None:
+    db_bind = op.get_bind()
+    op.add_column("definitions", sa.Column("alias_id", sa.Integer(), nullable=True))
+    # sqlite can only add a foreign key by recreating the table, which would lose its
+    # full-text triggers, and it doesn't enforce foreign keys by default anyway
+    if db_bind.engine.name != "sqlite":
+        op.create_foreign_key(
+            "fk_definitions_alias_id",
+            "definitions",
+            "definitions",
+            ["alias_id"],
+            ["id"],
+            ondelete="SET NULL",
+        )
+
+    # resolve existing aliases
+    rows = db_bind.execute(
+        sa.sql.text(
+            """
+        SELECT id, term_key, definition FROM definitions;
+    """
+        )
+    ).all()
+    ids_by_key = {row.term_key: row.id for row in rows if row.term_key is not None}
+    for row in rows:
+        alias_term = get_alias_term(row.definition or "")
+        alias_id = ids_by_key.get(normalize_term(alias_term)) if alias_term else None
+        if alias_id is None or alias_id == row.id:
+            continue
+        db_bind.execute(
+            sa.sql.text("UPDATE definitions SET alias_id = :alias_id WHERE id = :id"),
+            {"alias_id": alias_id, "id": row.id},
+        )
+
+
+def downgrade() -> None:
+    if op.get_bind().engine.name != "sqlite":
+        op.drop_constraint("fk_definitions_alias_id", "definitions", type_="foreignkey")
+    op.drop_column("definitions", "alias_id")
@@ -1,36 +1,61 @@
-import json
+import atexit
 import logging
 import os
 import re
 
 from slack_bolt import App
 from slack_bolt.adapter.socket_mode import SocketModeHandler
+from slack_bolt.adapter.wsgi import SlackRequestHandler
 from slack_bolt.authorization import AuthorizeResult
 from slack_sdk.web.client import WebClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import Session
 
 from gloss.bot import Bot
+from gloss.cache import LRUCache, SlackIdentityCache, TermCache
+from gloss.changes import ChangeFeed
+from gloss.counters import CounterReconciler, GlossaryCounters
+from gloss.db import get_database_url
+from gloss.index import GlossaryIndex
+from gloss.interactions import InteractionLogger
+from gloss.metrics import Metrics, MetricsLogger, MetricsWriter
+from gloss.tracing import configure_tracing, instrument, traced
+from gloss.workers import WorkerPool, WorkerPoolFull
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-database_url = os.environ["DATABASE_URL"]
-# SQLAlchemy no longer recognizes postgres:// URLs as "postgresql"
-# https://github.com/sqlalchemy/sqlalchemy/issues/6083
-if database_url.startswith("postgres://"):
-    database_url = database_url.replace("postgres://", "postgresql://", 1)
-database_url = database_url.replace("ssl-mode=", "ssl_mode=", 1)
+database_url = get_database_url()
 
+# request counts and timings, served on /metrics, or logged when there's no HTTP server;
+# gunicorn's workers share theirs through METRICS_DIR, so that any of them can serve everyone's
+metrics = Metrics(directory=os.getenv("METRICS_DIR"))
 
+# spans of each request, exported when TRACING_EXPORTER is set
+tracer_provider = configure_tracing(os.getenv("TRACING_EXPORTER"), os.getenv("TRACING_FILE", "traces.jsonl"))
+
+# authorizations and user names, so that warm requests make no Slack API calls
+identity_cache = SlackIdentityCache(
+    maxsize=int(os.getenv("SLACK_CACHE_SIZE", "1024")),
+    ttl=int(os.getenv("SLACK_CACHE_TTL", "600")),
+)
+
+
+@traced
 def authorize(enterprise_id, team_id, user_id, client: WebClient, logger):
     logger.info(f"enterprise_id={enterprise_id},team_id={team_id},user_id={user_id}")
-    # You can implement your own logic here
-    token = os.environ["SLACK_BOT_TOKEN"]
-    return AuthorizeResult.from_auth_test_response(
-        auth_test_response=client.auth_test(token=token),
-        bot_token=token,
-    )
+    authorization = identity_cache.get_authorization(enterprise_id, team_id)
+    if authorization is None:
+        # You can implement your own logic here
+        token = os.environ["SLACK_BOT_TOKEN"]
+        with metrics.track("slack_api"):
+            auth_test_response = client.auth_test(token=token)
+        authorization = AuthorizeResult.from_auth_test_response(
+            auth_test_response=auth_test_response,
+            bot_token=token,
+        )
+        identity_cache.remember_authorization(enterprise_id, team_id, authorization)
+    return authorization
 
 
 app = App(
@@ -40,11 +65,77 @@ app = App(
     installation_store=None,
     authorize=authorize,
 )
+# another Slack Web API to call instead of Slack's own, like the stand-in the load test runs
+app.client.base_url = os.getenv("SLACK_API_URL", app.client.base_url)
 
 engine = create_engine(database_url, echo=False, pool_recycle=3600, pool_pre_ping=True)
+metrics.instrument(engine)
+instrument(engine)
+
+# shared by every request so the glossary is only loaded from the database once
+glossary_index = GlossaryIndex()
+result_cache = LRUCache(maxsize=int(os.getenv("RESULT_CACHE_SIZE", "1024")))
+term_cache = TermCache(
+    maxsize=int(os.getenv("TERM_CACHE_SIZE", "4096")),
+    negative_ttl=int(os.getenv("TERM_CACHE_NEGATIVE_TTL", "60")),
+)
+
+# interactions are written in batches by a background thread, instead of by each lookup
+interaction_logger = InteractionLogger(
+    engine,
+    max_buffer=int(os.getenv("INTERACTION_BUFFER_SIZE", "10000")),
+    flush_interval=float(os.getenv("INTERACTION_FLUSH_INTERVAL", "1")),
+)
+# write out whatever is still buffered on the way out
+atexit.register(interaction_logger.shutdown)
+
+# counts for the stats command, recounted now and then to pick up other processes' writes
+counters = GlossaryCounters()
+counter_reconciler = CounterReconciler(
+    counters, engine, interval=int(os.getenv("STATS_RECONCILE_INTERVAL", "3600"))
+)
+
+# keeps the index, caches and counters current with definitions changed by other processes
+change_feed = ChangeFeed(
+    engine,
+    glossary_index,
+    term_cache,
+    result_cache,
+    counters=counters,
+    poll_interval=float(os.getenv("CHANGE_POLL_INTERVAL", "5")),
+)
+
+# glossary work is done here, so that listeners can acknowledge Slack straight away
+worker_pool = WorkerPool(
+    workers=int(os.getenv("WORKER_THREADS", "4")),
+    max_queue=int(os.getenv("WORKER_QUEUE_SIZE", "100")),
+)
+
+metrics.add_stats("worker_pool", worker_pool.stats)
+metrics.add_stats("interaction_logger", interaction_logger.stats)
+metrics.add_stats("result_cache", result_cache.stats)
+metrics.add_stats("term_cache", term_cache.stats)
+metrics.add_stats("identity_cache", identity_cache.stats)
+
+BUSY_MESSAGE = "Sorry, Glossary Bot is busy right now. Please try again in a moment."
+
+
+def make_bot(session):
+    return Bot(
+        bot_name="Glossary Bot",
+        session=session,
+        index=glossary_index,
+        result_cache=result_cache,
+        term_cache=term_cache,
+        interaction_logger=interaction_logger,
+        counters=counters,
+        change_feed=change_feed,
+        metrics=metrics,
+    )
 
 
 @app.command(os.getenv("SLASH_COMMAND", "/glossary"))
+@traced
 def glossary_command(ack, respond, body):
     """
     values posted by Slack:
@@ -58,54 +149,127 @@ def glossary_command(ack, respond, body):
         command: the command that was used to generate the request (like '/gloss')
         text: the text that was sent along with the command (like everything after '/gloss ')
     """
+    ack()
     try:
-        logger.debug(body)
-        with Session(engine) as session:
-            bot = Bot(bot_name="Glossary Bot", session=session)
-            ack()
-            respond(
-                bot.handle_glossary(
+        worker_pool.submit(run_glossary_command, respond, body)
+    except WorkerPoolFull:
+        logger.warning(f"Turned away a command, worker pool stats: {worker_pool.stats()}")
+        respond(BUSY_MESSAGE)
+
+
+@traced
+def run_glossary_command(respond, body):
+    with metrics.request():
+        try:
+            logger.debug(body)
+            with Session(engine) as session:
+                bot = make_bot(session)
+                response = bot.handle_glossary(
                     user_name=body["user_name"],
                     slash_command=body["command"],
                     text=body["text"],
                 )
-            )
-    except Exception as e:
-        respond(f"An exception happened: {e}")
-        raise
+            with metrics.track("slack_api"):
+                respond(response)
+        except Exception as e:
+            respond(f"An exception happened: {e}")
+            raise
 
 
 @app.event("app_mention")
+@traced
 def glossary_mention(client, event, say):
+    # events are acknowledged by bolt before their listener runs
     try:
-        logger.info(event)
-        result = re.search(r"^\s*\<\@([a-zA-Z0-9]*)\>\s*(.*)", event["text"])
-        if result is None:
-            return
-
-        bot_info = client.users_info(user=result.group(1))
-        if not bot_info["ok"]:
-            raise RuntimeError("Unable to look up bot")
-        user_info = client.users_info(user=event["user"])
+        worker_pool.submit(run_glossary_mention, client, event, say)
+    except WorkerPoolFull:
+        logger.warning(f"Turned away a mention, worker pool stats: {worker_pool.stats()}")
+        say(BUSY_MESSAGE, thread_ts=event.get("thread_ts"))
+
+
+@traced
+def get_user_name(client, user_id, description):
+    """Look up the name of a Slack user, using the identity cache where possible"""
+    user_name = identity_cache.get_user_name(user_id)
+    if user_name is None:
+        with metrics.track("slack_api"):
+            user_info = client.users_info(user=user_id)
         if not user_info["ok"]:
-            raise RuntimeError("Unable to look up user")
-
-        with Session(engine) as session:
-            bot = Bot(bot_name="Glossary Bot", session=session)
-            response = bot.handle_glossary(
-                user_name=user_info["user"]["name"],
-                slash_command=f"@{bot_info['user']['name']}",
-                text=result.group(2),
-            )
-            print(json.dumps(response))
-            say(response, thread_ts=event.get("thread_ts"))
-    except Exception as e:
-        say(f"An exception happened: {e}")
-        raise
+            raise RuntimeError(f"Unable to look up {description}")
+        user_name = user_info["user"]["name"]
+        identity_cache.remember_user_name(user_id, user_name)
+    return user_name
+
+
+@traced
+def run_glossary_mention(client, event, say):
+    with metrics.request():
+        try:
+            logger.info(event)
+            result = re.search(r"^\s*\<\@([a-zA-Z0-9]*)\>\s*(.*)", event["text"])
+            if result is None:
+                return
+
+            bot_name = get_user_name(client, result.group(1), "bot")
+            user_name = get_user_name(client, event["user"], "user")
+
+            with Session(engine) as session:
+                bot = make_bot(session)
+                response = bot.handle_glossary(
+                    user_name=user_name,
+                    slash_command=f"@{bot_name}",
+                    text=result.group(2),
+                )
+                logger.debug(response)
+                with metrics.track("slack_api"):
+                    say(response, thread_ts=event.get("thread_ts"))
+        except Exception as e:
+            say(f"An exception happened: {e}")
+            raise
+
+
+slack_handler = SlackRequestHandler(app)
+
+# saves this process's metrics now and then, for the processes it shares METRICS_DIR with to serve
+metrics_writer = MetricsWriter(metrics, interval=float(os.getenv("METRICS_SAVE_INTERVAL", "1")))
+
+
+def wsgi_app(environ, start_response):
+    """For receiving Slack's requests over HTTP instead of Socket Mode: gunicorn app:wsgi_app.
+    Also serves the metrics of every process sharing METRICS_DIR, or else this one's, on /metrics.
+    """
+    if environ.get("PATH_INFO") == "/metrics" and environ.get("REQUEST_METHOD") == "GET":
+        body = metrics.render().encode("utf-8")
+        start_response(
+            "200 OK",
+            [("Content-Type", "text/plain; version=0.0.4; charset=utf-8"), ("Content-Length", str(len(body)))],
+        )
+        return [body]
+    return slack_handler(environ, start_response)
+
+
+def start_background_work():
+    """Start the threads that run alongside request handling"""
+    counter_reconciler.start()
+    change_feed.start()
+    if metrics.directory:
+        metrics_writer.start()
+
+
+def post_fork():
+    """Set up a process forked after the app was loaded, like gunicorn's workers"""
+    # the parent's connections can't be shared with it, and its threads didn't come along
+    engine.dispose(close=False)
+    start_background_work()
 
 
 if __name__ == "__main__":
     # export SLACK_APP_TOKEN=xapp-***
     # export SLACK_BOT_TOKEN=xoxb-***
+    start_background_work()
+    # without an HTTP server to serve /metrics from, log them now and then instead
+    metrics_log_interval = float(os.getenv("METRICS_LOG_INTERVAL", "60"))
+    if metrics_log_interval > 0:
+        MetricsLogger(metrics, interval=metrics_log_interval).start()
     handler = SocketModeHandler(app, os.environ["SLACK_APP_TOKEN"])
     handler.start()
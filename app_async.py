@@ -0,0 +1,208 @@
+import asyncio
+import atexit
+import logging
+import os
+import re
+
+from slack_bolt.adapter.socket_mode.async_handler import AsyncSocketModeHandler
+from slack_bolt.async_app import AsyncApp
+from slack_bolt.authorization import AuthorizeResult
+from slack_sdk.web.async_client import AsyncWebClient
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from gloss.async_bot import AsyncBot
+from gloss.cache import LRUCache, SlackIdentityCache, TermCache
+from gloss.changes import ChangeFeed
+from gloss.counters import CounterReconciler, GlossaryCounters
+from gloss.db import get_async_database_url, get_database_url
+from gloss.index import GlossaryIndex
+from gloss.interactions import InteractionLogger
+from gloss.metrics import Metrics, MetricsLogger
+from gloss.tracing import configure_tracing, instrument, traced
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+database_url = get_async_database_url(get_database_url())
+
+# request counts and timings, logged now and then
+metrics = Metrics()
+
+# spans of each request, exported when TRACING_EXPORTER is set
+tracer_provider = configure_tracing(os.getenv("TRACING_EXPORTER"), os.getenv("TRACING_FILE", "traces.jsonl"))
+
+# authorizations and user names, so that warm requests make no Slack API calls
+identity_cache = SlackIdentityCache(
+    maxsize=int(os.getenv("SLACK_CACHE_SIZE", "1024")),
+    ttl=int(os.getenv("SLACK_CACHE_TTL", "600")),
+)
+
+
+@traced
+async def authorize(enterprise_id, team_id, user_id, client: AsyncWebClient, logger):
+    logger.info(f"enterprise_id={enterprise_id},team_id={team_id},user_id={user_id}")
+    authorization = identity_cache.get_authorization(enterprise_id, team_id)
+    if authorization is None:
+        # You can implement your own logic here
+        token = os.environ["SLACK_BOT_TOKEN"]
+        with metrics.track("slack_api"):
+            auth_test_response = await client.auth_test(token=token)
+        authorization = AuthorizeResult.from_auth_test_response(
+            auth_test_response=auth_test_response,
+            bot_token=token,
+        )
+        identity_cache.remember_authorization(enterprise_id, team_id, authorization)
+    return authorization
+
+
+app = AsyncApp(
+    logger=logger,
+    token=os.environ.get("SLACK_BOT_TOKEN"),
+    signing_secret=os.environ.get("SLACK_SIGNING_SECRET"),
+    installation_store=None,
+    authorize=authorize,
+)
+# another Slack Web API to call instead of Slack's own, like the stand-in the load test runs
+app.client.base_url = os.getenv("SLACK_API_URL", app.client.base_url)
+
+engine = create_async_engine(database_url, echo=False, pool_recycle=3600, pool_pre_ping=True)
+# statements are run by the synchronous engine underneath, where they can be timed
+metrics.instrument(engine.sync_engine)
+instrument(engine.sync_engine)
+
+# shared by every request so the glossary is only loaded from the database once
+glossary_index = GlossaryIndex()
+result_cache = LRUCache(maxsize=int(os.getenv("RESULT_CACHE_SIZE", "1024")))
+term_cache = TermCache(
+    maxsize=int(os.getenv("TERM_CACHE_SIZE", "4096")),
+    negative_ttl=int(os.getenv("TERM_CACHE_NEGATIVE_TTL", "60")),
+)
+
+# interactions are written in batches by a background thread, instead of by each lookup;
+# that thread uses a synchronous engine of its own, as it's off the event loop
+sync_engine = create_engine(get_database_url(), echo=False, pool_recycle=3600, pool_pre_ping=True)
+interaction_logger = InteractionLogger(
+    sync_engine,
+    max_buffer=int(os.getenv("INTERACTION_BUFFER_SIZE", "10000")),
+    flush_interval=float(os.getenv("INTERACTION_FLUSH_INTERVAL", "1")),
+)
+# write out whatever is still buffered on the way out
+atexit.register(interaction_logger.shutdown)
+
+# counts for the stats command, recounted now and then to pick up other processes' writes
+counters = GlossaryCounters()
+counter_reconciler = CounterReconciler(
+    counters, sync_engine, interval=int(os.getenv("STATS_RECONCILE_INTERVAL", "3600"))
+)
+
+# keeps the index, caches and counters current with definitions changed by other processes
+change_feed = ChangeFeed(
+    sync_engine,
+    glossary_index,
+    term_cache,
+    result_cache,
+    counters=counters,
+    poll_interval=float(os.getenv("CHANGE_POLL_INTERVAL", "5")),
+)
+
+metrics.add_stats("interaction_logger", interaction_logger.stats)
+metrics.add_stats("result_cache", result_cache.stats)
+metrics.add_stats("term_cache", term_cache.stats)
+metrics.add_stats("identity_cache", identity_cache.stats)
+
+
+def make_bot(session):
+    return AsyncBot(
+        bot_name="Glossary Bot",
+        session=session,
+        index=glossary_index,
+        result_cache=result_cache,
+        term_cache=term_cache,
+        interaction_logger=interaction_logger,
+        counters=counters,
+        change_feed=change_feed,
+        metrics=metrics,
+    )
+
+
+@app.command(os.getenv("SLASH_COMMAND", "/glossary"))
+@traced
+async def glossary_command(ack, respond, body):
+    """The asyncio version of app.glossary_command"""
+    await ack()
+    with metrics.request():
+        try:
+            logger.debug(body)
+            async with AsyncSession(engine) as session:
+                bot = make_bot(session)
+                response = await bot.handle_glossary(
+                    user_name=body["user_name"],
+                    slash_command=body["command"],
+                    text=body["text"],
+                )
+            with metrics.track("slack_api"):
+                await respond(response)
+        except Exception as e:
+            await respond(f"An exception happened: {e}")
+            raise
+
+
+@traced
+async def get_user_name(client, user_id, description):
+    """The asyncio version of app.get_user_name"""
+    user_name = identity_cache.get_user_name(user_id)
+    if user_name is None:
+        with metrics.track("slack_api"):
+            user_info = await client.users_info(user=user_id)
+        if not user_info["ok"]:
+            raise RuntimeError(f"Unable to look up {description}")
+        user_name = user_info["user"]["name"]
+        identity_cache.remember_user_name(user_id, user_name)
+    return user_name
+
+
+@app.event("app_mention")
+@traced
+async def glossary_mention(client, event, say):
+    with metrics.request():
+        try:
+            logger.info(event)
+            result = re.search(r"^\s*\<\@([a-zA-Z0-9]*)\>\s*(.*)", event["text"])
+            if result is None:
+                return
+
+            bot_name, user_name = await asyncio.gather(
+                get_user_name(client, result.group(1), "bot"),
+                get_user_name(client, event["user"], "user"),
+            )
+
+            async with AsyncSession(engine) as session:
+                bot = make_bot(session)
+                response = await bot.handle_glossary(
+                    user_name=user_name,
+                    slash_command=f"@{bot_name}",
+                    text=result.group(2),
+                )
+                logger.debug(response)
+                with metrics.track("slack_api"):
+                    await say(response, thread_ts=event.get("thread_ts"))
+        except Exception as e:
+            await say(f"An exception happened: {e}")
+            raise
+
+
+async def main():
+    counter_reconciler.start()
+    change_feed.start()
+    metrics_log_interval = float(os.getenv("METRICS_LOG_INTERVAL", "60"))
+    if metrics_log_interval > 0:
+        MetricsLogger(metrics, interval=metrics_log_interval).start()
+    handler = AsyncSocketModeHandler(app, os.environ["SLACK_APP_TOKEN"])
+    await handler.start_async()
+
+
+if __name__ == "__main__":
+    # export SLACK_APP_TOKEN=xapp-***
+    # export SLACK_BOT_TOKEN=xoxb-***
+    asyncio.run(main())
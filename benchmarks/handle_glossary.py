@@ -0,0 +1,248 @@
+#!/usr/bin/env python
+"""Times Bot.handle_glossary against glossaries of different sizes.
+
+For each size, the database is emptied and seeded with that many generated definitions (a
+few of them aliases) and as many interactions, and then each command below is run a number
+of times, each with a fresh session and Bot sharing the process-wide index, caches and
+counters, as app.py does. The results are written as JSON:
+
+    python -m benchmarks.handle_glossary --sizes 1000 10000 --output results.json
+
+By default a temporary SQLite database is used. Pass --database-url to use another database,
+which is emptied first.
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from alembic import command
+from alembic.config import Config as AlembicConfig
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from gloss.bot import Bot
+from gloss.cache import LRUCache, TermCache
+from gloss.counters import GlossaryCounters
+from gloss.dump import Importer
+from gloss.index import GlossaryIndex
+from gloss.interactions import InteractionLogger
+
+logger = logging.getLogger(__name__)
+
+SIZES = (1000, 10000, 100000, 1000000)
+
+SYLLABLES = ("ka", "lo", "mi", "ne", "su", "ta", "ri", "po", "be", "du", "fi", "go", "ha", "je", "ku", "zo")
+WORDS = ("eligibility", "worker", "county", "benefit", "system", "case", "review", "request", "state", "service")
+ACTIONS = ("found", "not_found", "searched", "stats", "learnings")
+# the share of generated definitions that are aliases of another
+ALIAS_SHARE = 0.05
+
+# the commands timed, each made from a random number generator and the generated terms
+OPERATIONS = {
+    "hit": lambda rng, terms: rng.choice(terms["defined"]),
+    "alias_hit": lambda rng, terms: rng.choice(terms["aliases"]),
+    "miss_with_suggestions": lambda rng, terms: misspell(rng, rng.choice(terms["defined"])),
+    "search": lambda rng, terms: f"search {rng.choice(WORDS)} {rng.choice(terms['defined'])[:4]}",
+    "recent": lambda rng, terms: "recent",
+    "learnings_random": lambda rng, terms: "learnings random",
+    "learnings_all": lambda rng, terms: "learnings all",
+    "stats": lambda rng, terms: "stats",
+}
+
+
+def make_term(rng):
+    return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+
+
+def misspell(rng, term):
+    """Swap a character of the term for one that's unlikely to make another term"""
+    position = rng.randrange(len(term))
+    return term[:position] + "x" + term[position + 1 :]
+
+
+def make_records(size, rng):
+    """Return generated (table, record) pairs for `size` definitions and interactions, and the
+    terms generated, by kind
+    """
+    terms = {"defined": [], "aliases": []}
+    seen = set()
+    records = []
+    for definition_id in range(1, size + 1):
+        term = make_term(rng)
+        while term in seen:
+            term = f"{make_term(rng)} {rng.choice(WORDS)}"
+        seen.add(term)
+        # the last definition is an alias if none of the others happened to be, so there's one to look up
+        if terms["defined"] and (rng.random() < ALIAS_SHARE or (definition_id == size and not terms["aliases"])):
+            definition = f"see {rng.choice(terms['defined'])}"
+            terms["aliases"].append(term)
+        else:
+            definition = " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 12)))
+            terms["defined"].append(term)
+        records.append(
+            (
+                "definitions",
+                {
+                    "id": definition_id,
+                    "creation_date": f"2024-01-01T00:00:{definition_id % 60:02d}",
+                    "term": term,
+                    "definition": definition,
+                    "user_name": f"user{rng.randrange(100)}",
+                },
+            )
+        )
+    for interaction_id in range(1, size + 1):
+        records.append(
+            (
+                "interactions",
+                {
+                    "id": interaction_id,
+                    "creation_date": f"2024-02-01T00:00:{interaction_id % 60:02d}",
+                    "user_name": f"user{rng.randrange(100)}",
+                    "term": rng.choice(terms["defined"]),
+                    "action": rng.choice(ACTIONS),
+                },
+            )
+        )
+    return records, terms
+
+
+def migrate(database_url):
+    # without alembic.ini, whose logging configuration would silence ours
+    config = AlembicConfig()
+    config.set_main_option("script_location", str(Path(__file__).parent.parent / "alembic"))
+    os.environ["DATABASE_URL"] = database_url
+    command.upgrade(config, "heads")
+
+
+def seed(engine, size, rng):
+    """Replace everything in the database with `size` generated definitions and interactions,
+    returning the generated terms
+    """
+    records, terms = make_records(size, rng)
+    importer = Importer(engine, batch_size=5000, progress_interval=30)
+    importer.clear()
+    importer.load(records)
+    return terms
+
+
+def percentile(timings, share):
+    """Return the nearest-rank percentile of the sorted timings"""
+    return timings[max(0, int(round(share * len(timings))) - 1)]
+
+
+def summarize(timings):
+    first = timings[0]
+    timings = sorted(timings)
+    return {
+        "iterations": len(timings),
+        "first": first,
+        "mean": sum(timings) / len(timings),
+        "p50": percentile(timings, 0.5),
+        "p95": percentile(timings, 0.95),
+        "max": timings[-1],
+    }
+
+
+def time_operations(engine, terms, iterations, rng, operations=OPERATIONS):
+    """Time each operation `iterations` times, returning a summary of the timings of each, in seconds"""
+    index = GlossaryIndex()
+    result_cache = LRUCache()
+    term_cache = TermCache()
+    counters = GlossaryCounters()
+    interaction_logger = InteractionLogger(engine)
+    results = {}
+    try:
+        for name, make_text in operations.items():
+            timings = []
+            for _ in range(iterations):
+                text = make_text(rng, terms)
+                with Session(engine) as session:
+                    bot = Bot(
+                        bot_name="Glossary Bot",
+                        session=session,
+                        index=index,
+                        result_cache=result_cache,
+                        term_cache=term_cache,
+                        interaction_logger=interaction_logger,
+                        counters=counters,
+                    )
+                    started_at = time.perf_counter()
+                    bot.handle_glossary(user_name="benchmark", slash_command="/glossary", text=text)
+                    timings.append(time.perf_counter() - started_at)
+            results[name] = summarize(timings)
+            logger.info(
+                f"{name:>24}: p50 {results[name]['p50'] * 1000:9.2f}ms"
+                f"  p95 {results[name]['p95'] * 1000:9.2f}ms  first {results[name]['first'] * 1000:9.2f}ms"
+            )
+    finally:
+        interaction_logger.shutdown()
+    return results
+
+
+def run(database_url, sizes=SIZES, iterations=50, seed_value=0, operations=OPERATIONS):
+    """Seed and time each size in turn, returning the results"""
+    migrate(database_url)
+    engine = create_engine(database_url)
+    results = []
+    try:
+        for size in sizes:
+            rng = random.Random(seed_value)
+            started_at = time.perf_counter()
+            terms = seed(engine, size, rng)
+            seed_seconds = time.perf_counter() - started_at
+            logger.info(f"Seeded {size} definitions in {seed_seconds:.1f}s")
+            results.append(
+                {
+                    "size": size,
+                    "seed_seconds": seed_seconds,
+                    "operations": time_operations(engine, terms, iterations, rng, operations),
+                }
+            )
+    finally:
+        engine.dispose()
+    return {
+        "database": engine.dialect.name,
+        "python": platform.python_version(),
+        "iterations": iterations,
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time handle_glossary against glossaries of different sizes")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="how many definitions to seed, in turn")
+    parser.add_argument("--iterations", type=int, default=50, help="how many times to run each command")
+    parser.add_argument(
+        "--operations", nargs="+", choices=tuple(OPERATIONS), default=tuple(OPERATIONS), help="the commands to time"
+    )
+    parser.add_argument(
+        "--database-url", help="the database to use, which is emptied. By default, a temporary SQLite database"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="seeds the random generation of definitions and commands")
+    parser.add_argument("--output", help="where to write the results. By default, stdout")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+
+    operations = {name: OPERATIONS[name] for name in args.operations}
+    with tempfile.TemporaryDirectory() as directory:
+        database_url = args.database_url or f"sqlite:///{Path(directory) / 'benchmark.db'}"
+        results = run(database_url, args.sizes, args.iterations, args.seed, operations)
+
+    if args.output:
+        with open(args.output, "w") as out:
+            json.dump(results, out, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+
+
+if __name__ == "__main__":
+    main()
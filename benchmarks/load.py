@@ -0,0 +1,461 @@
+#!/usr/bin/env python
+"""Replays Slack traffic against the Bolt app over HTTP, and reports its throughput and latency.
+
+The app is started with gunicorn, pointed at a stand-in for Slack's Web API run by this
+script. Signed slash commands and app mentions are then sent to it at `--rate` a second for
+`--duration` seconds, in the proportions given by `--mix`. A command's latency runs from
+sending it until the stand-in receives the bot's reply, at the command's response_url or
+through chat.postMessage, so it includes any time spent waiting for a worker:
+
+    python -m benchmarks.load --rate 50 --duration 30 --mix hit=60,miss=10,search=10,stats=5,recent=5,mention=10
+
+By default the app uses a temporary SQLite database. Pass --database-url to use another
+database. To load an app that's already running instead, pass its events URL as --target.
+That app must have been started with SLACK_API_URL set to http://127.0.0.1:<--slack-port>/api/,
+and with the signing secret passed as --signing-secret.
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+from slack_sdk.signature import SignatureVerifier
+
+from .handle_glossary import migrate, percentile
+
+logger = logging.getLogger(__name__)
+
+TEAM_ID = "T0LOAD"
+BOT_USER_ID = "U0BOT"
+# how many different users send commands
+USERS = 50
+
+DEFAULT_MIX = "hit=60,miss=10,search=10,stats=5,recent=5,mention=10"
+
+# the text sent for each kind of command, made from a random number generator and the terms defined
+COMMANDS = {
+    "hit": lambda rng, terms: rng.choice(terms),
+    "miss": lambda rng, terms: rng.choice(terms).replace("load", "laod"),
+    "search": lambda rng, terms: "search load",
+    "stats": lambda rng, terms: "stats",
+    "recent": lambda rng, terms: "recent",
+    "define": lambda rng, terms: f"{rng.choice(terms)} = redefined under load",
+    # a lookup, as a mention rather than a slash command
+    "mention": lambda rng, terms: rng.choice(terms),
+}
+
+
+class FakeSlackHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlsplit(self.path)
+        self.handle_call(url.path, dict(parse_qsl(url.query)))
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode("utf-8")
+        if self.headers.get("Content-Type", "").startswith("application/json"):
+            params = json.loads(body) if body else {}
+        else:
+            params = dict(parse_qsl(body))
+        self.handle_call(urlsplit(self.path).path, params)
+
+    def handle_call(self, path, params):
+        self.server.calls["response_url" if path.startswith("/response/") else path] += 1
+        if path.startswith("/response/"):
+            self.server.reply(path[len("/response/") :])
+            self.send_json({"ok": True})
+        elif path == "/api/auth.test":
+            self.send_json(
+                {
+                    "ok": True,
+                    "team": "load",
+                    "team_id": TEAM_ID,
+                    "user": "glossarybot",
+                    "user_id": BOT_USER_ID,
+                    "bot_id": "B0BOT",
+                }
+            )
+        elif path == "/api/users.info":
+            self.send_json({"ok": True, "user": {"id": params.get("user"), "name": f"name-{params.get('user')}"}})
+        elif path == "/api/chat.postMessage":
+            # mentions are each sent from a channel of their own, so the channel says which this answers
+            self.server.reply(params.get("channel"))
+            self.send_json({"ok": True, "channel": params.get("channel"), "ts": f"{time.time():.6f}"})
+        else:
+            self.send_json({"ok": False, "error": "unknown_method"}, status=404)
+
+    def send_json(self, data, status=200):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeSlack(ThreadingHTTPServer):
+    """A stand-in for Slack's Web API and response_urls, noting when each command is replied to"""
+
+    daemon_threads = True
+
+    def __init__(self, port=0):
+        super().__init__(("127.0.0.1", port), FakeSlackHandler)
+        self.calls = Counter()
+        self.replies = {}
+        self._condition = threading.Condition()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def reply(self, key):
+        with self._condition:
+            self.replies[key] = time.perf_counter()
+            self._condition.notify_all()
+
+    def wait_for(self, keys, timeout):
+        """Wait until every key has been replied to, or `timeout` seconds have passed"""
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while not all(key in self.replies for key in keys):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+        return True
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="fake-slack", daemon=True).start()
+
+
+class LoadGenerator:
+    """Sends signed commands to the app at `target`, and records when each was sent and acknowledged"""
+
+    def __init__(self, target, slack, signing_secret, concurrency=64):
+        self.target = target
+        self.slack = slack
+        self.verifier = SignatureVerifier(signing_secret)
+        self.executor = ThreadPoolExecutor(max_workers=concurrency)
+        self.sent = {}
+        self.kinds = {}
+        self.acks = defaultdict(list)
+        self.errors = Counter()
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def next_key(self):
+        with self._lock:
+            self._count += 1
+            return self._count
+
+    def slash_command(self, key, text):
+        user = f"U{key % USERS:04d}"
+        body = urlencode(
+            {
+                "token": "load",
+                "team_id": TEAM_ID,
+                "team_domain": "load",
+                "channel_id": "C0LOAD",
+                "channel_name": "load",
+                "user_id": user,
+                "user_name": f"name-{user}",
+                "command": "/glossary",
+                "text": text,
+                "api_app_id": "A0LOAD",
+                "response_url": f"{self.slack.url}/response/{key}",
+                "trigger_id": str(key),
+            }
+        )
+        return str(key), body, "application/x-www-form-urlencoded"
+
+    def mention(self, key, text):
+        channel = f"C{key:08d}"
+        body = json.dumps(
+            {
+                "token": "load",
+                "team_id": TEAM_ID,
+                "api_app_id": "A0LOAD",
+                "type": "event_callback",
+                "event_id": f"Ev{key:08d}",
+                "event_time": int(time.time()),
+                "event": {
+                    "type": "app_mention",
+                    "user": f"U{key % USERS:04d}",
+                    "text": f"<@{BOT_USER_ID}> {text}",
+                    "ts": f"{time.time():.6f}",
+                    "channel": channel,
+                },
+                "authorizations": [{"enterprise_id": None, "team_id": TEAM_ID, "user_id": BOT_USER_ID, "is_bot": True}],
+            }
+        )
+        return channel, body, "application/json"
+
+    def submit(self, kind, text):
+        """Send a command in the background, returning the key its reply will be noted under"""
+        key = self.next_key()
+        reply_key, body, content_type = (self.mention if kind == "mention" else self.slash_command)(key, text)
+        self.kinds[reply_key] = kind
+        self.executor.submit(self.send, kind, reply_key, body, content_type)
+        return reply_key
+
+    def send(self, kind, reply_key, body, content_type):
+        timestamp = str(int(time.time()))
+        request = urllib.request.Request(
+            self.target,
+            data=body.encode("utf-8"),
+            headers={
+                "Content-Type": content_type,
+                "X-Slack-Request-Timestamp": timestamp,
+                "X-Slack-Signature": self.verifier.generate_signature(timestamp=timestamp, body=body),
+            },
+        )
+        self.sent[reply_key] = started_at = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                response.read()
+            self.acks[kind].append(time.perf_counter() - started_at)
+        except Exception:
+            logger.exception(f"Unable to send a {kind} command")
+            self.errors[kind] += 1
+
+    def run(self, rate, duration, mix, terms, rng):
+        """Send commands at `rate` a second for `duration` seconds, picked by the weights in `mix`,
+        returning their reply keys
+        """
+        kinds = list(mix)
+        weights = [mix[kind] for kind in kinds]
+        keys = []
+        started_at = time.perf_counter()
+        for sent in range(int(rate * duration)):
+            # keep to the schedule, rather than waiting on the app, so a slow app builds a queue
+            delay = started_at + sent / rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            kind = rng.choices(kinds, weights)[0]
+            keys.append(self.submit(kind, COMMANDS[kind](rng, terms)))
+        return keys
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+
+def summarize(latencies):
+    latencies = sorted(latencies)
+    if not latencies:
+        return None
+    return {
+        "p50": percentile(latencies, 0.5),
+        "p95": percentile(latencies, 0.95),
+        "p99": percentile(latencies, 0.99),
+        "max": latencies[-1],
+    }
+
+
+def report(generator, slack, keys, elapsed):
+    """Summarize the commands sent, by kind"""
+    latencies = defaultdict(list)
+    counts = Counter(generator.kinds[key] for key in keys)
+    for key in keys:
+        if key in slack.replies and key in generator.sent:
+            latencies[generator.kinds[key]].append(slack.replies[key] - generator.sent[key])
+    results = {}
+    for kind in sorted(counts):
+        results[kind] = {
+            "sent": counts[kind],
+            "replied": len(latencies[kind]),
+            "errors": generator.errors[kind],
+            "throughput": len(latencies[kind]) / elapsed,
+            "latency": summarize(latencies[kind]),
+            "ack_latency": summarize(generator.acks[kind]),
+        }
+        latency = results[kind]["latency"] or {"p50": 0, "p95": 0, "p99": 0}
+        logger.info(
+            f"{kind:>8}: {results[kind]['replied']:6d}/{counts[kind]:<6d} replied, {results[kind]['throughput']:7.1f}/s"
+            f"  p50 {latency['p50'] * 1000:8.1f}ms  p95 {latency['p95'] * 1000:8.1f}ms  p99 {latency['p99'] * 1000:8.1f}ms"
+        )
+    return results
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(","):
+        kind, _, weight = part.partition("=")
+        if kind not in COMMANDS:
+            raise argparse.ArgumentTypeError(f"unknown command {kind!r}, choose from {', '.join(COMMANDS)}")
+        mix[kind] = float(weight or 1)
+    return mix
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("The app exited while starting")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("The app didn't start listening in time")
+
+
+def start_app(slack, database_url, signing_secret, workers=None, threads=None):
+    """Start the app under gunicorn, returning the process and the URL to send events to"""
+    port = free_port()
+    env = dict(
+        os.environ,
+        PORT=str(port),
+        DATABASE_URL=database_url,
+        SLACK_API_URL=f"{slack.url}/api/",
+        SLACK_BOT_TOKEN="xoxb-load",
+        SLACK_SIGNING_SECRET=signing_secret,
+    )
+    if workers:
+        env["WEB_CONCURRENCY"] = str(workers)
+    if threads:
+        env["GUNICORN_THREADS"] = str(threads)
+    root = Path(__file__).parent.parent
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "--config", str(root / "gunicorn.conf.py"), "--log-level", "warning"],
+        cwd=root,
+        env=env,
+    )
+    wait_for_port(port, process)
+    return process, f"http://127.0.0.1:{port}/slack/events"
+
+
+def run(
+    target=None,
+    database_url=None,
+    rate=20,
+    duration=10,
+    mix=None,
+    terms=50,
+    signing_secret="load-test-secret",
+    slack_port=0,
+    workers=None,
+    threads=None,
+    concurrency=64,
+    timeout=30,
+    seed=0,
+):
+    """Run a load test, returning its results"""
+    mix = mix or parse_mix(DEFAULT_MIX)
+    slack = FakeSlack(slack_port)
+    slack.start()
+    process = None
+    try:
+        if target is None:
+            migrate(database_url)
+            process, target = start_app(slack, database_url, signing_secret, workers, threads)
+        generator = LoadGenerator(target, slack, signing_secret, concurrency=concurrency)
+        rng = random.Random(seed)
+
+        # define the terms that lookups will ask for, one after another
+        defined = [f"load{number:04d}" for number in range(terms)]
+        for term in defined:
+            key = generator.submit("define", f"{term} = a term defined for load testing")
+            if not slack.wait_for([key], timeout):
+                raise RuntimeError(f"The app didn't reply to the definition of {term}")
+        generator.kinds.clear()
+        generator.acks.clear()
+        generator.errors.clear()
+
+        logger.info(f"Sending {rate} commands a second for {duration}s")
+        started_at = time.perf_counter()
+        keys = generator.run(rate, duration, mix, defined, rng)
+        if not slack.wait_for(keys, timeout):
+            logger.warning(f"Gave up waiting for replies after {timeout}s")
+        generator.shutdown()
+        elapsed = max(slack.replies.get(key, started_at) for key in keys) - started_at if keys else duration
+        return {
+            "target": target,
+            "rate": rate,
+            "duration": duration,
+            "mix": mix,
+            "elapsed": elapsed,
+            "slack_calls": dict(slack.calls),
+            "results": report(generator, slack, keys, elapsed or duration),
+        }
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+        slack.shutdown()
+        slack.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay Slack traffic against the app and report its latency")
+    parser.add_argument("--rate", type=float, default=20, help="how many commands to send a second")
+    parser.add_argument("--duration", type=float, default=10, help="how many seconds to send commands for")
+    parser.add_argument(
+        "--mix",
+        type=parse_mix,
+        default=DEFAULT_MIX,
+        help=f"the weight of each kind of command, from {', '.join(COMMANDS)}. By default, {DEFAULT_MIX}",
+    )
+    parser.add_argument("--terms", type=int, default=50, help="how many terms to define before sending the load")
+    parser.add_argument("--target", help="the events URL of an app that's already running, instead of starting one")
+    parser.add_argument("--database-url", help="the database for the app started. By default, a temporary SQLite database")
+    parser.add_argument("--signing-secret", default="load-test-secret", help="the secret to sign commands with")
+    parser.add_argument("--slack-port", type=int, default=0, help="the port to run the stand-in Slack API on")
+    parser.add_argument("--workers", type=int, help="how many gunicorn workers to start. By default, WEB_CONCURRENCY")
+    parser.add_argument(
+        "--threads", type=int, help="how many threads each gunicorn worker has. By default, GUNICORN_THREADS"
+    )
+    parser.add_argument("--concurrency", type=int, default=64, help="how many commands can be being sent at once")
+    parser.add_argument("--timeout", type=float, default=30, help="how many seconds to wait for replies at the end")
+    parser.add_argument("--seed", type=int, default=0, help="seeds the random choice of commands")
+    parser.add_argument("--output", help="where to write the results. By default, stdout")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+
+    with tempfile.TemporaryDirectory() as directory:
+        results = run(
+            target=args.target,
+            database_url=args.database_url or f"sqlite:///{Path(directory) / 'load.db'}",
+            rate=args.rate,
+            duration=args.duration,
+            mix=args.mix,
+            terms=args.terms,
+            signing_secret=args.signing_secret,
+            slack_port=args.slack_port,
+            workers=args.workers,
+            threads=args.threads,
+            concurrency=args.concurrency,
+            timeout=args.timeout,
+            seed=args.seed,
+        )
+
+    if args.output:
+        with open(args.output, "w") as out:
+            json.dump(results, out, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+from .bot import Bot
+
+
+class AsyncBot:
+    """A Bot for asyncio apps, working against an AsyncSession.
+
+    The glossary logic is Bot's own: each call runs it through AsyncSession.run_sync, which
+    drives the synchronous ORM code with the session's asyncio driver underneath, so the
+    event loop is free to serve other requests while a query is waiting on the database.
+    """
+
+    def __init__(self, session, bot_name, **bot_kwargs):
+        self.session = session
+        self.bot_name = bot_name
+        # the shared index and caches, passed through to Bot
+        self.bot_kwargs = bot_kwargs
+
+    def _call(self, sync_session, method, *args, **kwargs):
+        bot = Bot(session=sync_session, bot_name=self.bot_name, **self.bot_kwargs)
+        return getattr(bot, method)(*args, **kwargs)
+
+    async def handle_glossary(self, user_name, slash_command, text):
+        return await self.session.run_sync(
+            self._call,
+            "handle_glossary",
+            user_name=user_name,
+            slash_command=slash_command,
+            text=text,
+        )
@@ -1,50 +1,67 @@
 #!/usr/bin/env python
 
+import argparse
 import json
 import logging
-import os
+import sys
 
 from sqlalchemy import create_engine
 from sqlalchemy.orm import Session
 
-from ..models import Definition, Interaction
+from ..db import get_database_url
+from ..dump import TABLES, iter_records, parse_watermark, write_ndjson
+from ..snapshot import COMPRESSIONS, check_compression, write_snapshot
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-database_url = os.environ["DATABASE_URL"]
-# SQLAlchemy no longer recognizes postgres:// URLs as "postgresql"
-# https://github.com/sqlalchemy/sqlalchemy/issues/6083
-if database_url.startswith("postgres://"):
-    database_url = database_url.replace("postgres://", "postgresql://", 1)
-database_url = database_url.replace("ssl-mode=", "ssl_mode=", 1)
-
-engine = create_engine(database_url)
-
-results = {"definitions": [], "interactions": []}
-with engine.connect() as conn:
-    with Session(engine) as session:
-        for row in session.query(Definition).order_by(Definition.creation_date.desc()).all():
-            results["definitions"].append(
-                {
-                    "id": row.id,
-                    "creation_date": row.creation_date.isoformat(),
-                    "term": row.term,
-                    "definition": row.definition,
-                    "user_name": row.user_name,
-                }
-            )
-
-        for row in session.query(Interaction).order_by(Interaction.creation_date.desc()).all():
-            results["interactions"].append(
-                {
-                    "id": row.id,
-                    "creation_date": row.creation_date.isoformat(),
-                    "user_name": row.user_name,
-                    "term": row.term,
-                    "action": row.action,
-                }
-            )
-
-
-print(json.dumps(results, indent=2))
+parser = argparse.ArgumentParser(description="Export the glossary to stdout")
+parser.add_argument(
+    "--format",
+    choices=("json", "ndjson", "snapshot"),
+    default="json",
+    help="json: a single document, built in memory. ndjson: one record per line, streamed. "
+    "snapshot: a compact, compressed binary format, streamed",
+)
+parser.add_argument("--compression", choices=tuple(COMPRESSIONS), default="gzip", help="how to compress a snapshot's chunks")
+parser.add_argument("--batch-size", type=int, default=1000, help="how many rows to fetch from the database at a time")
+parser.add_argument(
+    "--since",
+    action="append",
+    default=[],
+    metavar="[TABLE=]WATERMARK",
+    help="only export rows created after this ISO date, or with an id greater than this number. "
+    "Prefix it with a table name, like interactions=1234, to apply it to just that table",
+)
+args = parser.parse_args()
+
+since = {}
+for value in args.since:
+    table, _, watermark = value.rpartition("=")
+    if table and table not in TABLES:
+        parser.error(f"unknown table {table!r}")
+    for name in [table] if table else TABLES:
+        since[name] = parse_watermark(watermark)
+if args.format == "snapshot":
+    try:
+        check_compression(args.compression)
+    except ValueError as e:
+        parser.error(str(e))
+
+engine = create_engine(get_database_url())
+
+with Session(engine) as session:
+    if args.format == "ndjson":
+        written = write_ndjson(session, sys.stdout, batch_size=args.batch_size, since=since)
+        logger.info(f"Exported {written} records")
+    elif args.format == "snapshot":
+        written = write_snapshot(
+            session, sys.stdout.buffer, batch_size=args.batch_size, since=since, compression=args.compression
+        )
+        logger.info(f"Exported {written} records")
+    else:
+        results = {
+            table: list(iter_records(session, table, batch_size=args.batch_size, newest_first=True, since=since.get(table)))
+            for table in TABLES
+        }
+        print(json.dumps(results, indent=2))
@@ -1,37 +1,62 @@
 #!/usr/bin/env python
 
-import json
+import argparse
 import logging
 import os
 import sys
+import time
 
-from sqlalchemy import create_engine, delete
-from sqlalchemy.orm import Session
+from sqlalchemy import create_engine
 
-from ..models import Definition, Interaction
+from ..db import get_database_url
+from ..dump import Importer, iter_json, iter_ndjson
+from ..snapshot import iter_snapshot
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-database_url = os.environ["DATABASE_URL"]
-# SQLAlchemy no longer recognizes postgres:// URLs as "postgresql"
-# https://github.com/sqlalchemy/sqlalchemy/issues/6083
-if database_url.startswith("postgres://"):
-    database_url = database_url.replace("postgres://", "postgresql://", 1)
-database_url = database_url.replace("ssl-mode=", "ssl_mode=", 1)
-
-engine = create_engine(database_url)
-
-results = json.load(sys.stdin)
-
-with engine.connect() as conn:
-    with Session(engine) as session:
-        session.execute(delete(Definition))
-        for row in results["definitions"]:
-            session.add(Definition(**row))
-
-        session.execute(delete(Interaction))
-        for row in results["interactions"]:
-            session.add(Interaction(**row))
-
-        session.commit()
+parser = argparse.ArgumentParser(description="Replace the glossary with an export read from stdin, or merge the export in")
+parser.add_argument("--format", choices=("json", "ndjson", "snapshot"), default="json", help="the format the export is in")
+parser.add_argument("--batch-size", type=int, default=1000, help="how many rows to write at a time")
+parser.add_argument(
+    "--merge",
+    action="store_true",
+    help="keep what's already in the database, replacing definitions of the same terms, adding interactions, "
+    "and adding rolled up interaction counts to those already there",
+)
+parser.add_argument(
+    "--jobs",
+    type=int,
+    default=os.cpu_count() or 1,
+    help="how many processes to decode a snapshot's chunks with. By default, one per CPU",
+)
+
+
+def main():
+    args = parser.parse_args()
+
+    engine = create_engine(get_database_url())
+
+    if args.format == "snapshot":
+        records = iter_snapshot(sys.stdin.buffer, jobs=args.jobs)
+    elif args.format == "ndjson":
+        records = iter_ndjson(sys.stdin)
+    else:
+        records = iter_json(sys.stdin)
+    importer = Importer(engine, batch_size=args.batch_size, merge=args.merge)
+    started_at = time.monotonic()
+    if not args.merge:
+        importer.clear()
+    counts = importer.load(records)
+    logger.info(
+        f"Imported {counts['definitions']} definitions, {counts['interactions']} interactions"
+        f" and {counts['interaction_rollups']} interaction rollups"
+        f" in {time.monotonic() - started_at:.1f}s ({importer.rate():.0f} records/s)"
+    )
+    if importer.skipped:
+        logger.warning(f"Skipped {importer.skipped} definitions of terms that had already been imported")
+
+
+# the processes decoding a snapshot import this module too, and mustn't run the import themselves
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+#!/usr/bin/env python
+
+import argparse
+import logging
+from datetime import datetime
+
+from sqlalchemy import create_engine
+
+from ..db import get_database_url
+from ..retention import InteractionPruner, add_months
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+parser = argparse.ArgumentParser(
+    description="Roll old interactions up into monthly counts and delete them, and create the coming months' partitions"
+)
+parser.add_argument(
+    "--keep-months",
+    type=int,
+    default=12,
+    help="how many whole months of interactions to keep, before the current one",
+)
+parser.add_argument("--batch-size", type=int, default=5000, help="how many interactions to delete at a time")
+args = parser.parse_args()
+
+engine = create_engine(get_database_url())
+
+pruner = InteractionPruner(engine, batch_size=args.batch_size)
+if pruner.partitioned:
+    for name in pruner.create_partitions():
+        logger.info(f"Created {name}")
+pruned = pruner.prune(add_months(datetime.utcnow(), -args.keep_months))
+logger.info(f"Pruned {pruned} interactions")
@@ -3,10 +3,16 @@ import random
 import re
 from datetime import datetime
 
-from sqlalchemy import distinct, func
-from thefuzz import process
+from sqlalchemy import func
 
-from .models import Definition, Interaction
+from .cache import CachedDefinition, LRUCache, TermCache, normalize_query
+from .counters import GlossaryCounters
+from .index import GlossaryIndex
+from .metrics import Metrics
+from .models import Definition, Interaction, normalize_term
+from .render import get_image_url, make_bold, verify_image_url, verify_url  # noqa: F401
+from .search import get_search_backend
+from .tracing import set_attributes, traced
 
 STATS_CMDS = ("stats",)
 RECENT_CMDS = ("learnings", "recent")
@@ -19,60 +25,15 @@ ALIAS_KEYWORDS = ("see also", "see")
 
 MAX_CONFIDENCE = 50
 
-BOT_EMOJI = ":lipstick:"
-
-logger = logging.getLogger(__name__)
-
+# the longest chain of aliases that will be followed to find a definition
+MAX_ALIAS_HOPS = 10
 
-def get_image_url(text):
-    """Extract an image url from the passed text. If there are multiple image urls,
-    only the first one will be returned.
-    """
-    if "http" not in text:
-        return None
+# returned by cache lookups for keys that aren't cached
+MISSING = object()
 
-    for chunk in text.split(" "):
-        if verify_image_url(text) and verify_url(text):
-            return chunk
-
-    return None
-
-
-def make_bold(text):
-    """make the passed text bold, accounting for newlines"""
-    newline_split = text.split("\n")
-    bold_split = []
-    for line in newline_split:
-        bold_line = line
-        if line.strip() != "":
-            bold_line = "*{}*".format(line.strip())
-        bold_split.append(bold_line)
-
-    return "\n".join(bold_split)
-
-
-def verify_url(text):
-    """verify that the passed text is a URL
-
-    Adapted from @adamrofer's Python port of @dperini's pattern here: https://gist.github.com/dperini/729294
-    """
-    url_pattern = re.compile(
-        r"^(?:(?:https?)://|)(?:(?!(?:10|127)(?:\.\d{1,3}){3})(?!(?:169\.254|192\.168)(?:\.\d{1,3}){2})(?!172\.(?:1[6-9]|2\d|3[0-1])(?:\.\d{1,3}){2})(?:[1-9]\d?|1\d\d|2[01]\d|22[0-3])(?:\.(?:1?\d{1,2}|2[0-4]\d|25[0-5])){2}(?:\.(?:[1-9]\d?|1\d\d|2[0-4]\d|25[0-4]))|(?:(?:[a-z\u00a1-\uffff0-9]-*)*[a-z\u00a1-\uffff0-9]+)(?:\.(?:[a-z\u00a1-\uffff0-9]-*)*[a-z\u00a1-\uffff0-9]+)*(?:\.(?:com|net|org|edu|gov|mil|aero|asia|biz|cat|coop|info|int|jobs|mobi|museum|name|post|pro|tel|travel|xxx|ac|ad|ae|af|ag|ai|al|am|an|ao|aq|ar|as|at|au|aw|ax|az|ba|bb|bd|be|bf|bg|bh|bi|bj|bm|bn|bo|br|bs|bt|bv|bw|by|bz|ca|cc|cd|cf|cg|ch|ci|ck|cl|cm|cn|co|cr|cs|cu|cv|cx|cy|cz|dd|de|dj|dk|dm|do|dz|ec|ee|eg|eh|er|es|et|eu|fi|fj|fk|fm|fo|fr|ga|gb|gd|ge|gf|gg|gh|gi|gl|gm|gn|gp|gq|gr|gs|gt|gu|gw|gy|hk|hm|hn|hr|ht|hu|id|ie|il|im|in|io|iq|ir|is|it|je|jm|jo|jp|ke|kg|kh|ki|km|kn|kp|kr|kw|ky|kz|la|lb|lc|li|lk|lr|ls|lt|lu|lv|ly|ma|mc|md|me|mg|mh|mk|ml|mm|mn|mo|mp|mq|mr|ms|mt|mu|mv|mw|mx|my|mz|na|nc|ne|nf|ng|ni|nl|no|np|nr|nu|nz|om|pa|pe|pf|pg|ph|pk|pl|pm|pn|pr|ps|pt|pw|py|qa|re|ro|rs|ru|rw|sa|sb|sc|sd|se|sg|sh|si|sj|Ja|sk|sl|sm|sn|so|sr|ss|st|su|sv|sx|sy|sz|tc|td|tf|tg|th|tj|tk|tl|tm|tn|to|tp|tr|tt|tv|tw|tz|ua|ug|uk|us|uy|uz|va|vc|ve|vg|vi|vn|vu|wf|ws|ye|yt|yu|za|zm|zw)))(?::\d{2,5})?(?:/\S*)?$",
-        re.UNICODE,
-    )
-    return url_pattern.match(text)
-
-
-def verify_image_url(text):
-    """Verify that the passed text is an image URL.
+BOT_EMOJI = ":lipstick:"
 
-    We're verifying image URLs for inclusion in Slack's Incoming Webhook integration, which
-    requires a scheme at the beginning (http(s)) and a file extension at the end to render
-    correctly. So, a URL which passes verify_url() (like example.com/kitten.gif) might not
-    pass this test. If you need to test that the URL is both valid AND an image suitable for
-    the Incoming Webhook integration, run it through both verify_url() and verify_image_url().
-    """
-    return re.match("http", text) and re.search(r"[gif|jpg|jpeg|png|bmp]$", text)
+logger = logging.getLogger(__name__)
 
 
 def parse_learnings_params(command_params):
@@ -121,11 +82,70 @@ def check_definition_for_alias(definition):
     return None
 
 
+def get_alias_key(definition):
+    """Return the key of the term the passed definition text makes it an alias of, if any"""
+    alias_term = check_definition_for_alias(definition or "")
+    return normalize_term(alias_term) if alias_term else None
+
+
+def get_alias_target(session, definition):
+    """Return the Definition that the passed definition's alias_key makes it an alias of, if any"""
+    if not definition.alias_key:
+        return None
+    target = session.query(Definition).filter(Definition.term_key == definition.alias_key).first()
+    if target is None or target is definition:
+        return None
+    return target
+
+
+def link_alias(session, definition):
+    """Set the alias_key and alias_id of the passed definition from its text"""
+    definition.alias_key = get_alias_key(definition.definition)
+    alias_target = get_alias_target(session, definition)
+    definition.alias_id = alias_target.id if alias_target else None
+
+
+def link_aliases(session):
+    """Resolve the alias_key and alias_id of every definition, for after definitions have been loaded in bulk"""
+    ids_by_key = dict(session.query(Definition.term_key, Definition.id))
+    for definition in session.query(Definition):
+        definition.alias_key = get_alias_key(definition.definition)
+        alias_id = ids_by_key.get(definition.alias_key) if definition.alias_key else None
+        definition.alias_id = alias_id if alias_id != definition.id else None
+
+
 class Bot:
-    def __init__(self, session, bot_name):
+    def __init__(
+        self,
+        session,
+        bot_name,
+        index=None,
+        result_cache=None,
+        term_cache=None,
+        interaction_logger=None,
+        counters=None,
+        change_feed=None,
+        metrics=None,
+    ):
         self.session = session
         self.bot_name = bot_name
-
+        # share one index between bots to avoid reloading the glossary for every request
+        self.index = index if index is not None else GlossaryIndex()
+        # search and suggestion results, invalidated whenever a definition is set or deleted
+        self.result_cache = result_cache if result_cache is not None else LRUCache()
+        # definitions by term, updated in place whenever a definition is set or deleted
+        self.term_cache = term_cache if term_cache is not None else TermCache()
+        # an InteractionLogger to write interactions in the background; without one, they're
+        # written as they happen
+        self.interaction_logger = interaction_logger
+        # counts for the stats command, updated in place whenever a definition or interaction is written
+        self.counters = counters if counters is not None else GlossaryCounters()
+        # a ChangeFeed to tell other processes about the definitions this one changes
+        self.change_feed = change_feed
+        # request counts and timings, by command
+        self.metrics = metrics if metrics is not None else Metrics()
+
+    @traced
     def get_payload_values(self, channel_id="", text=None):
         """Get a dict describing a standard webhook"""
         payload_values = {}
@@ -135,13 +155,11 @@ class Bot:
         payload_values["icon_emoji"] = BOT_EMOJI
         return payload_values
 
+    @traced
     def get_stats(self):
         """Gather and return some statistics"""
-        entries = self.session.query(func.count(Definition.term)).scalar()
-        definers = self.session.query(
-            func.count(distinct(Definition.user_name))
-        ).scalar()
-        queries = self.session.query(func.count(Interaction.action)).scalar()
+        self.counters.ensure_loaded(self.session)
+        entries, definers, queries = self.counters.counts()
         outputs = (
             (
                 "I have definitions for",
@@ -180,6 +198,7 @@ class Bot:
         # return the message
         return "\n".join(lines)
 
+    @traced
     def get_learnings(self, how_many=12, sort_order="recent", offset=0):
         """Gather and return some recent definitions"""
         order_descending = Definition.creation_date.desc()
@@ -232,49 +251,160 @@ class Bot:
         )
         return plain_text, rich_text
 
+    @traced
     def log_query(self, term, user_name, action):
         """Log a query into the interactions table"""
+        self.counters.interaction_logged()
+        if self.interaction_logger is not None:
+            self.interaction_logger.log(term=term, user_name=user_name, action=action)
+            return
         try:
             self.session.add(Interaction(term=term, user_name=user_name, action=action))
             self.session.commit()
         except Exception:
-            pass
+            self.session.rollback()
+            logger.exception("Unable to log an interaction")
 
-    def query_definition(self, term):
-        """Query the definition for a term from the database"""
+    @traced
+    def load_definition(self, term):
+        """Load the Definition for a term from the database, for changing it"""
         return (
             self.session.query(Definition)
-            .filter(func.lower(Definition.term) == func.lower(term))
+            .filter(Definition.term_key == normalize_term(term))
             .first()
         )
 
+    @traced
+    def query_definition(self, term):
+        """Get a read-only copy of the definition for a term, or None if there isn't one"""
+        key = normalize_term(term)
+        entry = self.term_cache.get(key, MISSING)
+        if entry is not MISSING:
+            return entry
+
+        # read before loading, so a definition that's written while this one loads isn't replaced by it
+        writes = self.term_cache.writes
+        definition = self.load_definition(term)
+        entry = CachedDefinition.from_definition(definition) if definition else None
+        self.term_cache.fill(key, entry, writes)
+        return entry
+
+    @traced
+    def query_definition_by_id(self, definition_id):
+        """Get a read-only copy of the definition with the passed id, or None if there isn't one"""
+        entry = self.term_cache.get_by_id(definition_id, MISSING)
+        if entry is not MISSING:
+            return entry
+
+        writes = self.term_cache.writes
+        definition = self.session.get(Definition, definition_id)
+        if definition is None:
+            return None
+        entry = CachedDefinition.from_definition(definition)
+        self.term_cache.fill(normalize_term(entry.term), entry, writes)
+        return entry
+
+    @traced
+    def resolve_alias(self, entry):
+        """Follow the chain of aliases starting at the passed entry and return the definition
+        it ends at. A chain that loops back on itself ends at the last entry before the loop.
+        """
+        seen = {entry.id}
+        while entry.alias_id is not None and len(seen) <= MAX_ALIAS_HOPS:
+            target = self.query_definition_by_id(entry.alias_id)
+            if target is None or target.id in seen:
+                break
+            seen.add(target.id)
+            entry = target
+        return entry
+
+    @traced
+    def link_dangling_aliases(self, definition):
+        """Point any aliases of the passed definition's term, set before it was defined, at it.
+        Returns the aliases that were changed.
+        """
+        # found through the alias_key index, rather than by scanning every definition's text
+        linked = (
+            self.session.query(Definition)
+            .filter(
+                Definition.alias_key == definition.term_key,
+                Definition.alias_id.is_(None),
+                Definition.id != definition.id,
+            )
+            .all()
+        )
+        for candidate in linked:
+            candidate.alias_id = definition.id
+        return linked
+
+    @traced
+    def publish_change(self, ids=(), terms=()):
+        """Tell other processes about changed definitions, as part of the current transaction"""
+        if self.change_feed is not None:
+            self.change_feed.publish(self.session, ids=ids, terms=terms)
+
+    @traced
+    def definition_saved(self, entry, user_name, previous_term=None, previous_user_name=None, changed_aliases=()):
+        """Bring the shared caches up to date after a definition has been saved"""
+        if previous_term is not None:
+            self.index.remove(previous_term)
+            self.term_cache.discard(normalize_term(previous_term))
+            self.counters.definition_replaced(previous_user_name, user_name)
+        else:
+            self.counters.definition_added(user_name)
+        self.index.add(entry.term, entry.definition)
+        for alias in (entry,) + tuple(changed_aliases):
+            self.term_cache.remember(normalize_term(alias.term), alias)
+        self.result_cache.bump_generation()
+
+    @traced
+    def definition_deleted(self, entry, user_name, changed_aliases=()):
+        """Bring the shared caches up to date after a definition has been deleted"""
+        self.index.remove(entry.term)
+        self.counters.definition_removed(user_name)
+        self.term_cache.remember(normalize_term(entry.term), None)
+        self.term_cache.forget_id(entry.id)
+        for alias in changed_aliases:
+            self.term_cache.remember(normalize_term(alias.term), alias)
+        self.result_cache.bump_generation()
+
+    @traced
+    def get_substring_matches(self, term):
+        """Get the terms containing the passed text, in reverse alphabetical order"""
+        # strip pattern-matching metacharacters from the term
+        term = re.sub(r"\||_|%|\*|\+|\?|\{|\}|\(|\)|\[|\]", "", term)
+
+        # postgres can serve ILIKE from its trigram index, everything else uses
+        # the trigram index we keep in memory
+        if self.session.get_bind().dialect.name == "postgresql":
+            # in SQL: SELECT term FROM definitions WHERE term ILIKE '%{}%'.format(term);
+            like_matches = (
+                self.session.query(Definition.term)
+                .filter(Definition.term.ilike(f"%{term}%"))
+                .order_by(Definition.term.desc())
+            )
+            return [entry.term for entry in like_matches]
+
+        self.index.ensure_loaded(self.session)
+        return sorted(self.index.substring_matches(term), reverse=True)
+
+    @traced
     def get_matches_for_term(self, term):
         """Search the glossary for entries that are matches for the passed term."""
+        cache_key = ("matches", normalize_query(term))
+        results = self.result_cache.get(cache_key)
+        if results is not None:
+            return list(results)
+        # read before searching, so results that a write makes stale while searching aren't cached
+        generation = self.result_cache.generation
 
-        # strip pattern-matching metacharacters from the term
-        stripped_term = re.sub(r"\||_|%|\*|\+|\?|\{|\}|\(|\)|\[|\]", "", term)
-        # get ILIKE matches for the term
-        # in SQL: SELECT term FROM definitions WHERE term ILIKE '%{}%'.format(stripped_term);
-        like_matches = (
-            self.session.query(Definition)
-            .filter(Definition.term.ilike(f"%{stripped_term}%"))
-            .order_by(Definition.term.desc())
-        )
-        like_results = [entry.term for entry in like_matches]
+        like_results = self.get_substring_matches(term)
 
-        all_rows = {
-            row.term: row.definition
-            for row in self.session.query(Definition)
-            .order_by(Definition.term.asc())
-            .all()
-        }
+        self.index.ensure_loaded(self.session)
         fuzzy_results = [
-            result[2]
+            result[0]
             for result in sorted(
-                filter(
-                    lambda result: result[1] >= MAX_CONFIDENCE,
-                    process.extract(term, all_rows, limit=20),
-                ),
+                self.fuzzy_matches(term),
                 key=lambda result: result[1],
             )
         ]
@@ -284,8 +414,15 @@ class Bot:
             if check_term not in results:
                 results.insert(0, check_term)
 
+        self.result_cache.set(cache_key, list(results), generation=generation)
         return results
 
+    @traced
+    def fuzzy_matches(self, term):
+        with self.metrics.track("fuzzy"):
+            return self.index.fuzzy_matches(term, limit=20, score_cutoff=MAX_CONFIDENCE)
+
+    @traced
     def query_definition_and_get_response(self, slash_command, command_text, user_name):
         """Get the definition for the passed term and return the appropriate responses"""
         # query the definition
@@ -308,33 +445,30 @@ class Bot:
         # remember this query
         self.log_query(term=command_text, user_name=user_name, action="found")
 
-        # if the definition starts with an alias keyphrase, check to see if the rest
-        # of the definition matches another entry, and return that definition instead
-        alias_term = check_definition_for_alias(entry.definition)
-        if alias_term:
-            alias_entry = self.query_definition(alias_term)
-
-            if alias_entry:
-                entry = alias_entry
-
-        image_url = get_image_url(entry.definition)
-
-        returnVal = f"{make_bold(entry.term)}: {entry.definition}"
-        if image_url is not None:
-            return {
-                "text": returnVal,
-                "blocks": [
-                    {"type": "section", "text": {"type": "mrkdwn", "text": returnVal}},
-                    {"type": "image", "image_url": image_url, "alt_text": returnVal},
-                ],
-            }
+        # if the definition is an alias of another entry, return that definition instead
+        entry = self.resolve_alias(entry)
 
-        return returnVal
+        # rendered when the definition was cached
+        return entry.response
 
+    @traced
     def search_term_and_get_response(self, command_text):
         """Search the database for the passed term and return the results"""
-        # query the definition
-        search_results = self.get_matches_for_term(command_text)
+        cache_key = ("search", normalize_query(command_text))
+        search_results = self.result_cache.get(cache_key)
+        if search_results is None:
+            generation = self.result_cache.generation
+            backend = get_search_backend(self.session)
+            if backend is None:
+                search_results = self.get_matches_for_term(command_text)
+            else:
+                # ranked full-text matches first, then any terms the text is part of
+                search_results = backend.search(command_text)
+                for check_term in reversed(self.get_substring_matches(command_text)):
+                    if check_term not in search_results:
+                        search_results.append(check_term)
+            self.result_cache.set(cache_key, search_results, generation=generation)
+
         if len(search_results):
             search_results_styled = ", ".join(
                 [make_bold(term) for term in search_results]
@@ -345,6 +479,7 @@ class Bot:
 
         return message
 
+    @traced
     def set_definition_and_get_response(self, slash_command, command_params, user_name):
         """Set the definition for the passed parameters and return the appropriate responses"""
         set_components = command_params.split("=", 1)
@@ -360,34 +495,61 @@ class Bot:
             return f"Sorry, but *{self.bot_name}* can't set a definition for {make_bold(set_term)} because it's a reserved term."
 
         # check the database to see if the term's already defined
-        entry = self.query_definition(set_term)
+        entry = self.load_definition(set_term)
         if entry:
             if set_term != entry.term or set_value != entry.definition:
                 # update the definition in the database
                 last_term = entry.term
                 last_value = entry.definition
+                last_user_name = entry.user_name
                 entry.term = set_term
                 entry.definition = set_value
                 entry.user_name = user_name
                 entry.creation_date = datetime.utcnow()
+                link_alias(self.session, entry)
 
                 self.session.add(entry)
+                self.session.flush()
+                saved = CachedDefinition.from_definition(entry)
+                self.publish_change(ids=[saved.id], terms=[last_term])
                 self.session.commit()
 
+                self.definition_saved(
+                    saved, user_name=user_name, previous_term=last_term, previous_user_name=last_user_name
+                )
+
                 return f"The definition for {make_bold(set_term)} is now set to {make_bold(set_value)}, overwriting the previous entry, which was {make_bold(last_term)} defined as {make_bold(last_value)}"
             else:
                 return f"The definition for {make_bold(set_term)} was already set to {make_bold(set_value)}"
 
         # save the definition in the database
         entry = Definition(term=set_term, definition=set_value, user_name=user_name)
+        link_alias(self.session, entry)
         self.session.add(entry)
+        self.session.flush()
+        linked = self.link_dangling_aliases(entry)
+        self.session.flush()
+        saved = CachedDefinition.from_definition(entry)
+        changed_aliases = [CachedDefinition.from_definition(alias) for alias in linked]
+        self.publish_change(ids=[saved.id] + [alias.id for alias in changed_aliases])
         self.session.commit()
 
+        self.definition_saved(saved, user_name=user_name, changed_aliases=changed_aliases)
+
         return (
             f"Definition for {make_bold(set_term)} is now set to {make_bold(set_value)}"
         )
 
+    @traced
     def handle_glossary(self, user_name, slash_command, text):
+        # timed, and named after the command the text turns out to be
+        with self.metrics.request() as request:
+            response = self.dispatch_glossary(request, user_name, slash_command, text)
+            set_attributes(**{"glossary.command": request.name})
+            return response
+
+    @traced
+    def dispatch_glossary(self, request, user_name, slash_command, text):
         full_text = text.strip()
         full_text = re.sub(" +", " ", full_text)
         command_text = full_text
@@ -403,6 +565,7 @@ class Bot:
             and command_text.lower()
             not in STATS_CMDS + RECENT_CMDS + HELP_CMDS + SET_CMDS
         ):
+            request.name = "get"
             return self.query_definition_and_get_response(
                 slash_command, command_text, user_name
             )
@@ -413,6 +576,7 @@ class Bot:
 
         # if the text contains an '=', treat it as a 'set' command
         if "=" in command_text:
+            request.name = "set"
             return self.set_definition_and_get_response(
                 slash_command, command_text, user_name
             )
@@ -425,17 +589,28 @@ class Bot:
         #
 
         if command_action in DELETE_CMDS:
+            request.name = "delete"
             delete_term = command_params
 
             # verify that the definition is in the database
-            entry = self.query_definition(delete_term)
+            entry = self.load_definition(delete_term)
             if not entry:
                 return f"Sorry, there is no definition for {make_bold(delete_term)}"
 
-            # delete the definition from the database
+            # unlink any aliases of the definition, then delete it from the database
+            unlinked = self.session.query(Definition).filter(Definition.alias_id == entry.id).all()
+            for alias in unlinked:
+                alias.alias_id = None
+            self.session.flush()
+            deleted = CachedDefinition.from_definition(entry)
+            deleted_user_name = entry.user_name
+            changed_aliases = [CachedDefinition.from_definition(alias) for alias in unlinked]
             self.session.delete(entry)
+            self.publish_change(ids=[deleted.id] + [alias.id for alias in changed_aliases], terms=[deleted.term])
             self.session.commit()
 
+            self.definition_deleted(deleted, user_name=deleted_user_name, changed_aliases=changed_aliases)
+
             return f"The definition for {make_bold(delete_term)} has been deleted, which was {make_bold(entry.definition)}"
 
         #
@@ -443,6 +618,7 @@ class Bot:
         #
 
         if command_action in SEARCH_CMDS:
+            request.name = "search"
             search_term = command_params
 
             return self.search_term_and_get_response(search_term)
@@ -452,6 +628,7 @@ class Bot:
         #
 
         if command_action in HELP_CMDS or command_text.strip() == "":
+            request.name = "help"
             return f"*{slash_command} _term_* to show the definition for a term\n*{slash_command} _term_ = _definition_* to set the definition for a term\n*{slash_command} _alias_ = see _term_* to set an alias for a term\n*{slash_command} delete _term_* to delete the definition for a term\n*{slash_command} stats* to show usage statistics\n*{slash_command} recent* to show recently defined terms\n*{slash_command} search _term_* to search terms and definitions\n*{slash_command} help* to see this message\n<https://github.com/halkeye/glossary-bot/issues|report bugs and request features>"
 
         #
@@ -459,6 +636,7 @@ class Bot:
         #
 
         if command_action in STATS_CMDS:
+            request.name = "stats"
             stats_newline = self.get_stats()
             return stats_newline
 
@@ -467,6 +645,7 @@ class Bot:
         #
 
         if command_action in RECENT_CMDS:
+            request.name = "recent"
             # extract parameters
             recent_args = parse_learnings_params(command_params)
             learnings_plain_text, learnings_rich_text = self.get_learnings(
@@ -479,6 +658,7 @@ class Bot:
         #
 
         # check the definition
+        request.name = "get"
         return self.query_definition_and_get_response(
             slash_command, command_text, user_name
         )
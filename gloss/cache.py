@@ -0,0 +1,200 @@
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from .render import render_definition
+
+
+def normalize_query(text):
+    """Normalize a query for use as a cache key: lowercased, with whitespace collapsed"""
+    return " ".join(text.lower().split())
+
+
+class LRUCache:
+    """A thread-safe, bounded least recently used cache that counts hits, misses and evictions.
+
+    Entries are keyed by the cache's generation as well as their own key, so bumping the
+    generation invalidates everything at once; the orphaned entries are the least recently
+    used and are the first to be evicted as new ones arrive. Entries can also be given a
+    time to live, after which they are treated as missing.
+    """
+
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        """Return the cached value for the key, or default if there isn't one"""
+        with self._lock:
+            entry_key = (self.generation, key)
+            if entry_key not in self._entries:
+                self.misses += 1
+                return default
+            value, expires_at = self._entries[entry_key]
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[entry_key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._entries.move_to_end(entry_key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None, generation=None):
+        """Cache a value for the key, evicting the least recently used entry if the cache is full.
+
+        The value expires after `ttl` seconds, or the cache's own ttl if that isn't passed. A value
+        computed from the cache's `generation` at the time isn't cached if the generation has been
+        bumped since, as whatever bumped it may have made the value stale.
+        """
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._store(key, value, ttl if ttl is not None else self.ttl)
+
+    def _store(self, key, value, ttl):
+        # with the lock held
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        entry_key = (self.generation, key)
+        self._entries[entry_key] = (value, expires_at)
+        self._entries.move_to_end(entry_key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def discard(self, key):
+        """Remove the cached value for the key, if there is one"""
+        with self._lock:
+            self._entries.pop((self.generation, key), None)
+
+    def bump_generation(self):
+        """Invalidate every cached value"""
+        with self._lock:
+            self.generation += 1
+
+    def stats(self):
+        """Return the cache's counters, for sizing it"""
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "generation": self.generation,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class CachedDefinition(namedtuple("CachedDefinition", ["id", "term", "definition", "alias_id", "response"])):
+    """A read-only copy of a Definition that can outlive the session it was loaded in, along
+    with the response to a lookup of it, rendered up front so that lookups don't have to.
+    """
+
+    @classmethod
+    def from_definition(cls, definition):
+        return cls(
+            id=definition.id,
+            term=definition.term,
+            definition=definition.definition,
+            alias_id=definition.alias_id,
+            response=render_definition(definition.term, definition.definition),
+        )
+
+
+class TermCache(LRUCache):
+    """Definitions by case-folded term and by id, shared between bots and updated in place by writes.
+
+    Terms that have no definition are cached as None for `negative_ttl` seconds, so repeated
+    lookups of unknown terms don't go to the database, while definitions set by another
+    process are still picked up before long.
+
+    Writes are counted, so that a definition loaded from the database is only cached by fill()
+    if nothing was written while it was being loaded, and can't replace a newer one.
+    """
+
+    def __init__(self, maxsize=4096, negative_ttl=60):
+        super().__init__(maxsize=maxsize)
+        self.negative_ttl = negative_ttl
+        self.writes = 0
+
+    def remember(self, key, entry):
+        """Cache a CachedDefinition written for the key, or None if the key's definition was deleted"""
+        with self._lock:
+            self.writes += 1
+            self._remember(key, entry)
+
+    def fill(self, key, entry, writes):
+        """Cache a CachedDefinition loaded for the key, or None if the key has no definition, unless
+        there have been writes since `writes` was read, before it was loaded
+        """
+        with self._lock:
+            if writes != self.writes:
+                return
+            self._remember(key, entry)
+
+    def _remember(self, key, entry):
+        # with the lock held
+        self._store(key, entry, None if entry is not None else self.negative_ttl)
+        if entry is not None:
+            self._store(("id", entry.id), entry, None)
+
+    def discard(self, key):
+        with self._lock:
+            self.writes += 1
+            self._entries.pop((self.generation, key), None)
+
+    def bump_generation(self):
+        with self._lock:
+            self.writes += 1
+            self.generation += 1
+
+    def get_by_id(self, definition_id, default=None):
+        """Return the cached CachedDefinition with the passed id, or default if there isn't one"""
+        return self.get(("id", definition_id), default)
+
+    def forget_id(self, definition_id):
+        """Remove the definition with the passed id from the cache"""
+        self.discard(("id", definition_id))
+
+
+class SlackIdentityCache:
+    """AuthorizeResults by workspace and user names by user id, as fetched from the Slack API.
+
+    Both are cached for `ttl` seconds, so a warm mention is handled without any Slack API
+    calls, while renamed users and rotated tokens are still picked up before long.
+    """
+
+    def __init__(self, maxsize=1024, ttl=600):
+        self.authorizations = LRUCache(maxsize=maxsize, ttl=ttl)
+        self.user_names = LRUCache(maxsize=maxsize, ttl=ttl)
+
+    def get_authorization(self, enterprise_id, team_id):
+        """Return the cached AuthorizeResult for the workspace, or None if there isn't one"""
+        return self.authorizations.get((enterprise_id, team_id))
+
+    def remember_authorization(self, enterprise_id, team_id, authorization):
+        self.authorizations.set((enterprise_id, team_id), authorization)
+
+    def get_user_name(self, user_id):
+        """Return the cached name of the user, or None if there isn't one"""
+        return self.user_names.get(user_id)
+
+    def remember_user_name(self, user_id, user_name):
+        self.user_names.set(user_id, user_name)
+
+    def stats(self):
+        """Return the counters of both caches, for sizing them"""
+        return {
+            "authorizations": self.authorizations.stats(),
+            "user_names": self.user_names.stats(),
+        }
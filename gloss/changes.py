@@ -0,0 +1,171 @@
+import json
+import logging
+import select
+import threading
+import uuid
+
+from sqlalchemy import func, sql
+from sqlalchemy.orm import Session
+
+from .cache import CachedDefinition
+from .models import Definition, normalize_term
+
+logger = logging.getLogger(__name__)
+
+# the channel changes are published on, on postgres
+CHANNEL = "glossary_changes"
+
+
+def publish_refresh(session, channel=CHANNEL):
+    """Tell every process to reload everything, for after definitions have been written other
+    than by a Bot, like by an import. Must be called before the session is committed.
+    """
+    if session.get_bind().dialect.name != "postgresql":
+        return
+    payload = json.dumps({"refresh": True})
+    session.execute(sql.text("SELECT pg_notify(:channel, :payload)"), {"channel": channel, "payload": payload})
+
+
+class ChangeFeed:
+    """Keeps a process's shared index and caches current with definitions written by other processes.
+
+    On postgres, each write publishes the ids and terms it changed with NOTIFY, in the same
+    transaction, and every process LISTENs for them and updates just those entries. Other
+    databases have no way to push changes, so the definitions table is polled every
+    `poll_interval` seconds instead, and when its watermark (how many rows there are, the
+    highest id and the latest creation date) moves, everything is reloaded. Either way, the
+    definitions and definers of the stats command's counters, if passed, are recounted.
+
+    Writes that don't go through a Bot, like imports, publish a refresh with publish_refresh()
+    instead, which makes every process reload everything.
+    """
+
+    def __init__(self, engine, index, term_cache, result_cache, counters=None, channel=CHANNEL, poll_interval=5):
+        self.engine = engine
+        self.index = index
+        self.term_cache = term_cache
+        self.result_cache = result_cache
+        self.counters = counters
+        self.channel = channel
+        self.poll_interval = poll_interval
+        # identifies this process's own changes, which have already been applied
+        self.origin = uuid.uuid4().hex
+        self._stopping = threading.Event()
+        self._thread = None
+        self.received = 0
+        self.refreshes = 0
+
+    @property
+    def notifies(self):
+        """Whether changes are pushed with NOTIFY, rather than found by polling"""
+        return self.engine.dialect.name == "postgresql" and self.engine.dialect.driver == "psycopg2"
+
+    def publish(self, session, ids=(), terms=()):
+        """Tell other processes that the definitions with the passed ids have changed, and that
+        the passed terms have gone away. Must be called before the session is committed.
+        """
+        if session.get_bind().dialect.name != "postgresql":
+            return
+        payload = json.dumps({"origin": self.origin, "ids": list(ids), "terms": list(terms)})
+        session.execute(sql.text("SELECT pg_notify(:channel, :payload)"), {"channel": self.channel, "payload": payload})
+
+    def receive(self, payload):
+        """Apply a change published by publish() or publish_refresh()"""
+        change = json.loads(payload)
+        if change.get("origin") == self.origin:
+            return
+        if change.get("refresh"):
+            self.refresh()
+        else:
+            self.apply(ids=change["ids"], terms=change["terms"])
+        self.received += 1
+
+    def apply(self, ids=(), terms=()):
+        """Bring the index and caches up to date with the definitions with the passed ids, and
+        drop the passed terms from them
+        """
+        for term in terms:
+            self.index.remove(term)
+            self.term_cache.discard(normalize_term(term))
+        for definition_id in ids:
+            self.term_cache.forget_id(definition_id)
+        with Session(self.engine) as session:
+            for definition in session.query(Definition).filter(Definition.id.in_(ids)):
+                entry = CachedDefinition.from_definition(definition)
+                self.index.add(entry.term, entry.definition)
+                self.term_cache.remember(normalize_term(entry.term), entry)
+            if self.counters is not None:
+                self.counters.load_definitions(session)
+        self.result_cache.bump_generation()
+
+    def refresh(self):
+        """Reload everything, for when it isn't known what has changed"""
+        self.refreshes += 1
+        self.term_cache.bump_generation()
+        self.result_cache.bump_generation()
+        with Session(self.engine) as session:
+            if self.index.loaded:
+                self.index.load(session)
+            if self.counters is not None:
+                self.counters.load_definitions(session)
+
+    def start(self):
+        """Start following changes in the background"""
+        # a fresh origin, as processes forked from this one mustn't ignore each other's changes
+        self.origin = uuid.uuid4().hex
+        target = self._listen if self.notifies else self._poll
+        self._thread = threading.Thread(target=target, name="change-feed", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _listen(self):
+        reconnecting = False
+        while not self._stopping.is_set():
+            connection = None
+            try:
+                # a connection of its own, as it's left listening
+                connection = self.engine.raw_connection()
+                dbapi_connection = connection.driver_connection
+                connection.detach()
+                dbapi_connection.autocommit = True
+                with dbapi_connection.cursor() as cursor:
+                    cursor.execute(f"LISTEN {self.channel}")
+                # anything published while we weren't listening has been missed
+                if reconnecting:
+                    self.refresh()
+                while not self._stopping.is_set():
+                    if select.select([dbapi_connection], [], [], self.poll_interval) == ([], [], []):
+                        continue
+                    dbapi_connection.poll()
+                    while dbapi_connection.notifies:
+                        self.receive(dbapi_connection.notifies.pop(0).payload)
+            except Exception:
+                logger.exception("Stopped listening for glossary changes, trying again shortly")
+                reconnecting = True
+                self._stopping.wait(self.poll_interval)
+            finally:
+                if connection is not None:
+                    connection.close()
+
+    def get_watermark(self):
+        with Session(self.engine) as session:
+            return tuple(
+                session.query(func.count(Definition.id), func.max(Definition.id), func.max(Definition.creation_date)).one()
+            )
+
+    def _poll(self):
+        watermark = None
+        while True:
+            try:
+                latest = self.get_watermark()
+                if watermark is not None and latest != watermark:
+                    self.refresh()
+                watermark = latest
+            except Exception:
+                logger.exception("Unable to check for glossary changes")
+            if self._stopping.wait(self.poll_interval):
+                return
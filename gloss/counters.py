@@ -0,0 +1,138 @@
+import logging
+import threading
+from collections import Counter
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from .models import Definition, Interaction, InteractionRollup
+
+logger = logging.getLogger(__name__)
+
+
+class GlossaryCounters:
+    """Process-wide counts of definitions, definers and interactions, for the stats command.
+
+    The counts are loaded from the database once and then kept current by the bot's set,
+    delete and interaction logging paths, so that stats doesn't have to count every row of
+    the interactions table. Definitions written by other processes are recounted when a
+    ChangeFeed sees them, and everything is reconciled with the database periodically by
+    CounterReconciler.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.definitions = 0
+        # user name -> how many definitions they have, to count distinct definers
+        self._definers = Counter()
+        self.interactions = 0
+        self.loaded = False
+
+    def count_definitions(self, session):
+        """Return how many definitions there are, and how many each definer has"""
+        by_user_name = session.query(Definition.user_name, func.count(Definition.id)).group_by(Definition.user_name).all()
+        definitions = sum(count for _, count in by_user_name)
+        definers = Counter({user_name: count for user_name, count in by_user_name if user_name is not None})
+        return definitions, definers
+
+    def load(self, session):
+        """(Re)count everything from the database"""
+        definitions, definers = self.count_definitions(session)
+        # including those that have been pruned, and are only counted now
+        interactions = session.query(func.count(Interaction.id)).scalar()
+        interactions += session.query(func.coalesce(func.sum(InteractionRollup.count), 0)).scalar()
+        with self._lock:
+            self.definitions = definitions
+            self._definers = definers
+            self.interactions = interactions
+            self.loaded = True
+
+    def load_definitions(self, session):
+        """Recount just the definitions and definers, for after other processes have changed them"""
+        definitions, definers = self.count_definitions(session)
+        with self._lock:
+            # unloaded counters will count everything when they're loaded
+            if not self.loaded:
+                return
+            self.definitions = definitions
+            self._definers = definers
+
+    def ensure_loaded(self, session):
+        """Load the counts from the database unless that has already been done"""
+        if not self.loaded:
+            self.load(session)
+
+    def definition_added(self, user_name):
+        with self._lock:
+            # unloaded counters will pick the new row up when they're loaded
+            if not self.loaded:
+                return
+            self.definitions += 1
+            self._add_definer(user_name, 1)
+
+    def definition_replaced(self, previous_user_name, user_name):
+        with self._lock:
+            if not self.loaded:
+                return
+            self._add_definer(previous_user_name, -1)
+            self._add_definer(user_name, 1)
+
+    def definition_removed(self, user_name):
+        with self._lock:
+            if not self.loaded:
+                return
+            self.definitions -= 1
+            self._add_definer(user_name, -1)
+
+    def interaction_logged(self):
+        with self._lock:
+            if not self.loaded:
+                return
+            self.interactions += 1
+
+    def _add_definer(self, user_name, count):
+        if user_name is None:
+            return
+        self._definers[user_name] += count
+        if self._definers[user_name] <= 0:
+            del self._definers[user_name]
+
+    def counts(self):
+        """Return how many definitions, definers and interactions there are"""
+        with self._lock:
+            return self.definitions, len(self._definers), self.interactions
+
+
+class CounterReconciler:
+    """Recounts a GlossaryCounters from the database every `interval` seconds, in the background.
+
+    That corrects the counts for writes made by other processes, and for interactions that
+    were counted but never written.
+    """
+
+    def __init__(self, counters, engine, interval=3600):
+        self.counters = counters
+        self.engine = engine
+        self.interval = interval
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="counter-reconciler", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stopping.wait(self.interval):
+            self.reconcile()
+
+    def reconcile(self):
+        try:
+            with Session(self.engine) as session:
+                self.counters.load(session)
+        except Exception:
+            logger.exception("Unable to reconcile the glossary counters")
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join()
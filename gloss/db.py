@@ -0,0 +1,35 @@
+import os
+
+from sqlalchemy.engine import make_url
+
+# the asyncio driver to use for each database
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "mysql": "mysql+aiomysql",
+    "mariadb": "mariadb+aiomysql",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def get_database_url():
+    """Read DATABASE_URL from the environment, fixing up URLs SQLAlchemy won't accept"""
+    database_url = os.environ["DATABASE_URL"]
+    # SQLAlchemy no longer recognizes postgres:// URLs as "postgresql"
+    # https://github.com/sqlalchemy/sqlalchemy/issues/6083
+    if database_url.startswith("postgres://"):
+        database_url = database_url.replace("postgres://", "postgresql://", 1)
+    database_url = database_url.replace("ssl-mode=", "ssl_mode=", 1)
+    return database_url
+
+
+def get_async_database_url(database_url):
+    """Switch a database URL over to the asyncio driver for its database"""
+    url = make_url(database_url)
+    driver = ASYNC_DRIVERS.get(url.get_backend_name())
+    if driver is None:
+        return url
+    url = url.set(drivername=driver)
+    # asyncpg takes libpq's sslmode as ssl
+    if url.get_backend_name() == "postgresql" and "sslmode" in url.query:
+        url = url.difference_update_query(["sslmode"]).update_query_dict({"ssl": url.query["sslmode"]})
+    return url
@@ -0,0 +1,327 @@
+import io
+import json
+import logging
+import time
+from collections import Counter
+from datetime import datetime
+
+from sqlalchemy import delete, insert, select, sql
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from .bot import link_aliases
+from .changes import publish_refresh
+from .models import Definition, Interaction, InteractionRollup, LimitedLengthUnicode, normalize_term
+from .retention import add_rollups
+
+logger = logging.getLogger(__name__)
+
+# the columns dumped for each table, which are the ones needed to restore it
+TABLES = {
+    "definitions": (Definition, ("id", "creation_date", "term", "definition", "user_name")),
+    "interactions": (Interaction, ("id", "creation_date", "user_name", "term", "action")),
+    "interaction_rollups": (InteractionRollup, ("id", "month", "term", "action", "count")),
+}
+
+# the date column of each table, which date watermarks are compared with
+DATE_COLUMNS = {"definitions": "creation_date", "interactions": "creation_date", "interaction_rollups": "month"}
+
+# the columns of a definition that are overwritten when merging in a definition of the same term
+MERGED_COLUMNS = ("creation_date", "term", "definition", "user_name")
+
+
+def parse_watermark(value):
+    """Parse a watermark for a delta export: an id, or an ISO creation date"""
+    try:
+        return int(value)
+    except ValueError:
+        return datetime.fromisoformat(value)
+
+
+def iter_records(session, table, batch_size=1000, newest_first=False, since=None):
+    """Yield the rows of a table as dicts, streamed from the database `batch_size` rows at a time.
+
+    Only the dumped columns are selected, and no ORM objects are built, so memory use doesn't
+    grow with the size of the table. Rows come in id order unless `newest_first` is set. If a
+    watermark is passed as `since`, only rows with a greater id or a later creation date (as
+    the watermark is an int or a datetime) are included.
+    """
+    model, columns = TABLES[table]
+    date_column = getattr(model, DATE_COLUMNS[table])
+    order = date_column.desc() if newest_first else model.id.asc()
+    query = (
+        select(*[getattr(model, column) for column in columns])
+        .order_by(order)
+        .execution_options(stream_results=True, yield_per=batch_size)
+    )
+    if isinstance(since, int):
+        query = query.where(model.id > since)
+    elif since is not None:
+        query = query.where(date_column > since)
+    for row in session.execute(query):
+        record = row._asdict()
+        if record[DATE_COLUMNS[table]] is not None:
+            record[DATE_COLUMNS[table]] = record[DATE_COLUMNS[table]].isoformat()
+        yield record
+
+
+def write_ndjson(session, out, batch_size=1000, since=None):
+    """Write every table to `out` as newline-delimited JSON, one record per line, tagged with its
+    table. `since` can map tables to watermarks, as for iter_records. Returns how many records
+    were written.
+    """
+    since = since or {}
+    written = 0
+    for table in TABLES:
+        for record in iter_records(session, table, batch_size=batch_size, since=since.get(table)):
+            out.write(json.dumps({"table": table, **record}))
+            out.write("\n")
+            written += 1
+    return written
+
+
+class JSONStream:
+    """Reads JSON values one at a time from a text stream, buffering only as much as it needs"""
+
+    def __init__(self, stream, read_size=1 << 16):
+        self.stream = stream
+        self.read_size = read_size
+        self.buffer = ""
+        self.position = 0
+        self.decoder = json.JSONDecoder()
+
+    def read(self):
+        chunk = self.stream.read(self.read_size)
+        if not chunk:
+            return False
+        self.buffer = self.buffer[self.position :] + chunk
+        self.position = 0
+        return True
+
+    def peek(self):
+        """Return the next non-whitespace character, without consuming it"""
+        while True:
+            while self.position < len(self.buffer) and self.buffer[self.position].isspace():
+                self.position += 1
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self.read():
+                raise ValueError("Unexpected end of input")
+
+    def expect(self, characters):
+        """Consume and return the next non-whitespace character, which must be one of `characters`"""
+        character = self.peek()
+        if character not in characters:
+            raise ValueError(f"Expected one of {characters!r} but found {character!r}")
+        self.position += 1
+        return character
+
+    def value(self):
+        """Consume and return the next string, object or array"""
+        self.peek()
+        while True:
+            try:
+                value, self.position = self.decoder.raw_decode(self.buffer, self.position)
+                return value
+            except json.JSONDecodeError:
+                # the value might carry on past the end of the buffer
+                if not self.read():
+                    raise
+
+
+def iter_json(stream):
+    """Yield (table, record) pairs from an export in the json format, as it is read"""
+    reader = JSONStream(stream)
+    reader.expect("{")
+    if reader.peek() == "}":
+        return
+    while True:
+        table = reader.value()
+        reader.expect(":")
+        reader.expect("[")
+        if reader.peek() == "]":
+            reader.expect("]")
+        else:
+            while True:
+                yield table, reader.value()
+                if reader.expect(",]") == "]":
+                    break
+        if reader.expect(",}") == "}":
+            return
+
+
+def iter_ndjson(stream):
+    """Yield (table, record) pairs from an export in the ndjson format, as it is read"""
+    for line in stream:
+        if line.strip():
+            record = json.loads(line)
+            yield record.pop("table"), record
+
+
+def prepare_record(table, record):
+    """Turn an exported record into a row to insert"""
+    model, columns = TABLES[table]
+    row = {}
+    for column in columns:
+        if column not in record:
+            continue
+        value = record[column]
+        column_type = model.__table__.c[column].type
+        if isinstance(value, str) and column == DATE_COLUMNS[table]:
+            value = datetime.fromisoformat(value)
+        elif value is not None and isinstance(column_type, LimitedLengthUnicode):
+            # COPY skips the type's own truncation
+            value = column_type.process_bind_param(value, None)
+        row[column] = value
+    if model is Definition:
+        row["term_key"] = normalize_term(row["term"])
+    return row
+
+
+def copy_value(value):
+    """Format a value for postgres's COPY text format"""
+    if value is None:
+        return "\\N"
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+
+class Importer:
+    """Loads exported records into the database, `batch_size` rows per statement and transaction.
+
+    Rows are written with COPY on postgres, and with multi-row INSERTs elsewhere. Progress is
+    logged every `progress_interval` seconds. Definitions whose term has already been imported,
+    in a different case, are skipped.
+
+    With `merge` set, records are merged into what's already there instead: definitions are
+    upserted by their case-folded term, the last one for a term winning, interactions are
+    appended, and rolled up interaction counts are added to any already rolled up for the same
+    month, term and action. The exported ids are dropped, and the database assigns its own.
+    """
+
+    def __init__(self, engine, batch_size=1000, progress_interval=5, merge=False):
+        self.engine = engine
+        self.batch_size = batch_size
+        self.progress_interval = progress_interval
+        self.merge = merge
+        self.counts = {table: 0 for table in TABLES}
+        self.skipped = 0
+        self._term_keys = set()
+        self._started_at = None
+        self._reported_at = None
+
+    @property
+    def copies(self):
+        """Whether rows are written with COPY"""
+        return self.engine.dialect.name == "postgresql" and self.engine.dialect.driver == "psycopg2"
+
+    @property
+    def imported(self):
+        return sum(self.counts.values())
+
+    def rate(self):
+        """How many records have been imported per second"""
+        elapsed = time.monotonic() - self._started_at if self._started_at is not None else 0
+        return self.imported / elapsed if elapsed else 0
+
+    def clear(self):
+        """Delete everything from the tables being imported into"""
+        with self.engine.begin() as connection:
+            if self.engine.dialect.name == "postgresql":
+                # rather than DELETE, which checks every row for aliases pointing at it
+                connection.execute(sql.text("TRUNCATE interactions, interaction_rollups, definitions"))
+            else:
+                connection.execute(delete(Interaction))
+                connection.execute(delete(InteractionRollup))
+                connection.execute(delete(Definition))
+
+    def load(self, records):
+        """Import the (table, record) pairs, returning how many rows were imported into each table"""
+        self._started_at = self._reported_at = time.monotonic()
+        chunks = {table: [] for table in TABLES}
+        for table, record in records:
+            if table not in TABLES:
+                raise ValueError(f"Unknown table {table!r}")
+            row = prepare_record(table, record)
+            if self.merge:
+                row.pop("id", None)
+                # a statement can only upsert each term once, so a later definition replaces an earlier one
+                if table == "definitions" and row["term_key"] in self._term_keys:
+                    chunks[table] = [pending for pending in chunks[table] if pending["term_key"] != row["term_key"]]
+            elif table == "definitions" and row["term_key"] in self._term_keys:
+                self.skipped += 1
+                continue
+            if table == "definitions":
+                self._term_keys.add(row["term_key"])
+            chunks[table].append(row)
+            if len(chunks[table]) >= self.batch_size:
+                self.write(table, chunks[table])
+                chunks[table] = []
+                if self.merge and table == "definitions":
+                    self._term_keys = set()
+        for table, chunk in chunks.items():
+            if chunk:
+                self.write(table, chunk)
+        self.finish()
+        return self.counts
+
+    def write(self, table, rows):
+        with self.engine.begin() as connection:
+            if self.merge and table == "definitions":
+                self.upsert(connection, rows)
+            elif self.merge and table == "interaction_rollups":
+                counts = Counter()
+                for row in rows:
+                    counts[(row["month"], row["term"], row["action"])] += row["count"]
+                add_rollups(connection, counts)
+            elif self.copies:
+                self.copy(connection, table, rows)
+            else:
+                connection.execute(insert(TABLES[table][0]), rows)
+        self.counts[table] += len(rows)
+
+        now = time.monotonic()
+        if now - self._reported_at >= self.progress_interval:
+            self._reported_at = now
+            logger.info(f"Imported {self.imported} records ({self.rate():.0f} records/s)")
+
+    def copy(self, connection, table, rows):
+        columns = list(rows[0])
+        data = io.StringIO()
+        for row in rows:
+            data.write("\t".join(copy_value(row[column]) for column in columns))
+            data.write("\n")
+        data.seek(0)
+        with connection.connection.cursor() as cursor:
+            cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", data)
+
+    def upsert(self, connection, rows):
+        """Insert definitions, replacing those of the same terms"""
+        table = Definition.__table__
+        dialect = self.engine.dialect.name
+        if dialect in ("postgresql", "sqlite"):
+            statement = (postgresql if dialect == "postgresql" else sqlite).insert(table)
+            statement = statement.on_conflict_do_update(
+                index_elements=[table.c.term_key],
+                set_={column: statement.excluded[column] for column in MERGED_COLUMNS},
+            )
+        elif dialect in ("mysql", "mariadb"):
+            statement = mysql.insert(table)
+            statement = statement.on_duplicate_key_update({column: statement.inserted[column] for column in MERGED_COLUMNS})
+        else:
+            raise NotImplementedError(f"Merging isn't supported on {dialect}")
+        connection.execute(statement, rows)
+
+    def finish(self):
+        """Resolve aliases between the imported definitions and, on postgres, move the id
+        sequences past the imported ids and tell running processes to reload the glossary
+        """
+        with Session(self.engine) as session:
+            link_aliases(session)
+            if self.engine.dialect.name == "postgresql":
+                for table in TABLES:
+                    sequence = f"pg_get_serial_sequence('{table}', 'id')"
+                    session.execute(sql.text(f"SELECT setval({sequence}, COALESCE(MAX(id), 0) + 1, false) FROM {table}"))
+            publish_refresh(session)
+            session.commit()
@@ -0,0 +1,163 @@
+import threading
+
+import numpy as np
+from rapidfuzz import fuzz, process, utils
+
+from .models import Definition
+
+# characters that thefuzz's full_process(force_ascii=True) strips before scoring
+NON_ASCII_TABLE = {i: None for i in range(128, 256)}
+
+
+def process_choice(text):
+    """Normalize text for fuzzy scoring: ascii only, lowercased alphanumerics and single spaces"""
+    return utils.default_process(text.translate(NON_ASCII_TABLE))
+
+
+def get_trigrams(text):
+    """Return the set of lowercased three character sequences in the passed text"""
+    text = text.lower()
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+class GlossaryIndex:
+    """A process-wide, in-memory copy of the glossary's terms and definitions.
+
+    The index is loaded from the definitions table once and then kept current by
+    the bot's set and delete paths, so that suggestions for unknown terms can be
+    made without loading every row from the database on each miss.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        # writes are rare, so the mapping is replaced rather than mutated, which
+        # lets readers use whatever snapshot they grabbed without holding the lock
+        self._definitions = {}
+        # trigram -> set of terms containing it, for substring matching
+        self._trigrams = {}
+        # (terms, processed definitions) for fuzzy scoring, rebuilt after writes
+        self._choices = None
+        self.loaded = False
+
+    def __len__(self):
+        return len(self._definitions)
+
+    def __contains__(self, term):
+        return term in self._definitions
+
+    def load(self, session):
+        """(Re)load every definition from the database"""
+        rows = session.query(Definition.term, Definition.definition).order_by(Definition.term.asc())
+        with self._lock:
+            self._definitions = {term: definition for term, definition in rows}
+            self._trigrams = {}
+            for term in self._definitions:
+                self._index_term(term)
+            self._choices = None
+            self.loaded = True
+
+    def ensure_loaded(self, session):
+        """Load the index from the database unless that has already been done"""
+        if self.loaded:
+            return
+        with self._lock:
+            if not self.loaded:
+                self.load(session)
+
+    def definitions(self):
+        """Return a read-only snapshot of the index as a {term: definition} dict"""
+        return self._definitions
+
+    def add(self, term, definition):
+        """Add or replace a term in the index"""
+        with self._lock:
+            # an unloaded index will pick the new row up when it is loaded
+            if not self.loaded:
+                return
+            definitions = dict(self._definitions)
+            definitions[term] = definition
+            self._definitions = definitions
+            self._index_term(term)
+            self._choices = None
+
+    def remove(self, term):
+        """Remove a term from the index"""
+        with self._lock:
+            if not self.loaded or term not in self._definitions:
+                return
+            definitions = dict(self._definitions)
+            del definitions[term]
+            self._definitions = definitions
+            self._unindex_term(term)
+            self._choices = None
+
+    def substring_matches(self, text):
+        """Return the terms containing the passed text, ignoring case, like an
+        ILIKE '%text%' query would.
+        """
+        needle = text.lower()
+        with self._lock:
+            trigrams = get_trigrams(needle)
+            if not trigrams:
+                # too short to have any trigrams, so every term is a candidate
+                candidates = self._definitions.keys()
+            else:
+                postings = sorted((self._trigrams.get(trigram, set()) for trigram in trigrams), key=len)
+                candidates = set(postings[0]).intersection(*postings[1:])
+
+            # sharing every trigram doesn't guarantee the text is in the term
+            return [term for term in candidates if needle in term.lower()]
+
+    def fuzzy_matches(self, text, limit=20, score_cutoff=0):
+        """Fuzzy match the passed text against every definition and return up to `limit`
+        (term, score) tuples scoring at least `score_cutoff`, best first.
+
+        Scores are the same rounded WRatio that thefuzz's process.extract gives, but every
+        definition is scored in a single batched call and only the best are sorted.
+        """
+        terms, choices = self._get_choices()
+        if not terms:
+            return []
+
+        query = process_choice(utils.default_process(text))
+        # scores are rounded afterwards, so let anything that would round up to the cutoff through
+        native_cutoff = max(score_cutoff - 0.5, 0)
+        scores = process.cdist(
+            [query], choices, scorer=fuzz.WRatio, score_cutoff=native_cutoff, dtype=np.float64
+        )[0]
+
+        candidates = np.flatnonzero(scores >= native_cutoff) if native_cutoff else np.arange(len(scores))
+        if len(candidates) > limit:
+            # partially select the best scores; ties with the last place go to the earliest
+            # choices, the same as a full sort would give
+            kth_score = -np.partition(-scores[candidates], limit - 1)[limit - 1]
+            better = candidates[scores[candidates] > kth_score]
+            tied = candidates[scores[candidates] == kth_score]
+            candidates = np.concatenate((better, tied[: limit - len(better)]))
+
+        # best first, ties in choice order
+        candidates = candidates[np.lexsort((candidates, -scores[candidates]))]
+        return [(terms[i], int(round(scores[i]))) for i in candidates]
+
+    def _get_choices(self):
+        with self._lock:
+            if self._choices is None:
+                items = sorted(self._definitions.items())
+                self._choices = (
+                    [term for term, _ in items],
+                    [process_choice(definition) for _, definition in items],
+                )
+            return self._choices
+
+    def _index_term(self, term):
+        for trigram in get_trigrams(term):
+            self._trigrams.setdefault(trigram, set()).add(term)
+
+    def _unindex_term(self, term):
+        for trigram in get_trigrams(term):
+            postings = self._trigrams.get(trigram)
+            if postings is None:
+                continue
+            postings.discard(term)
+            if not postings:
+                del self._trigrams[trigram]
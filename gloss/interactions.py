@@ -0,0 +1,105 @@
+import logging
+import threading
+from datetime import datetime
+
+from sqlalchemy import insert
+
+from .models import Interaction
+
+logger = logging.getLogger(__name__)
+
+
+class InteractionLogger:
+    """Records interactions in the background, so lookups don't wait on a write transaction.
+
+    Interactions are buffered in memory and written by a background thread every
+    `flush_interval` seconds, `batch_size` rows to a multi-row INSERT. At most `max_buffer`
+    interactions are held at once; past that, new ones are dropped and counted rather than
+    letting the buffer grow without bound while the database is slow or down.
+    """
+
+    def __init__(self, engine, max_buffer=10000, batch_size=500, flush_interval=1.0):
+        self.engine = engine
+        self.max_buffer = max_buffer
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        # only one flush at a time, so batches are written in the order they were logged
+        self._flush_lock = threading.Lock()
+        self._buffer = []
+        self._stopping = threading.Event()
+        self._thread = None
+        self.logged = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.flushes = 0
+
+    def log(self, term, user_name, action):
+        """Buffer an interaction to be written by the next flush"""
+        row = {"creation_date": datetime.utcnow(), "term": term, "user_name": user_name, "action": action}
+        with self._lock:
+            if len(self._buffer) >= self.max_buffer:
+                self.dropped += 1
+                return
+            self._buffer.append(row)
+            self.logged += 1
+        self._ensure_started()
+
+    def _ensure_started(self):
+        # started on first use rather than on creation, so that it's running in forked processes too
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._stopping.is_set() or (self._thread is not None and self._thread.is_alive()):
+                return
+            self._thread = threading.Thread(target=self._run, name="interaction-logger", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stopping.wait(self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        """Write every buffered interaction to the database, returning how many were written"""
+        with self._flush_lock:
+            with self._lock:
+                rows, self._buffer = self._buffer, []
+            if not rows:
+                return 0
+            written = 0
+            for start in range(0, len(rows), self.batch_size):
+                batch = rows[start : start + self.batch_size]
+                try:
+                    with self.engine.begin() as connection:
+                        connection.execute(insert(Interaction).values(batch))
+                except Exception:
+                    logger.exception(f"Unable to write {len(batch)} interactions")
+                    with self._lock:
+                        self.failed += len(batch)
+                    continue
+                written += len(batch)
+            with self._lock:
+                self.written += written
+                self.flushes += 1
+            return written
+
+    def shutdown(self):
+        """Stop the background thread and write whatever is still buffered"""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+    def stats(self):
+        """Return the logger's counters"""
+        with self._lock:
+            return {
+                "buffered": len(self._buffer),
+                "max_buffer": self.max_buffer,
+                "logged": self.logged,
+                "written": self.written,
+                "dropped": self.dropped,
+                "failed": self.failed,
+                "flushes": self.flushes,
+            }
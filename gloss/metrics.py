@@ -0,0 +1,378 @@
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# the upper bounds, in seconds, of the latency histograms' buckets
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# the parts of a request that are timed separately
+PHASES = ("db", "fuzzy", "slack_api")
+
+# the Metrics attribute each histogram is kept in, and the metric, description and labels it's rendered with
+HISTOGRAMS = (
+    ("requests", "glossary_request_seconds", "How long requests took, by command", ("command",)),
+    (
+        "request_phases",
+        "glossary_request_phase_seconds",
+        "How long requests spent in each phase, by command",
+        ("command", "phase"),
+    ),
+    (
+        "phases",
+        "glossary_phase_seconds",
+        "How long each database statement, index search and Slack API call took",
+        ("phase",),
+    ),
+)
+
+# the request being worked on, in this thread or task
+current_request = ContextVar("current_request", default=None)
+
+
+class Histogram:
+    """How many observations fell in each of BUCKETS, and their sum, as a Prometheus histogram keeps them"""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        # the last is for anything past the largest bucket
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def merge(self, counts, total):
+        """Add another histogram's bucket counts and sum to this one's"""
+        for index, count in enumerate(counts):
+            self.counts[index] += count
+            self.count += count
+        self.sum += total
+
+    def quantile(self, share):
+        """Estimate a quantile, as the upper bound of the bucket it falls in"""
+        rank = share * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+class Request:
+    def __init__(self, name):
+        self.name = name
+        # seconds spent in each phase
+        self.phases = Counter()
+
+
+class Metrics:
+    """Counts and latency histograms of the requests a process handles, and of the time spent
+    in the database, searching the index and calling Slack's API while handling them.
+
+    Requests are timed with request(), and named after the command they turned out to be.
+    Phases are timed with track(), or with instrument() for database statements, and are
+    added both to a histogram of their own and to the request they happened in, if any.
+    Other components' stats() can be added with add_stats(), and everything is rendered in
+    Prometheus' text format by render().
+
+    With a `directory`, several processes (like gunicorn's workers) can share their metrics:
+    each one saves its own to a file there, and render() adds up every process's, so that it
+    doesn't matter which process is scraped. The files of processes that have exited are kept,
+    so that their counts don't go backwards, apart from their stats, which are dropped by
+    mark_process_dead().
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self._lock = threading.Lock()
+        # histograms by request name, by (request name, phase), and by phase
+        self.requests = {}
+        self.request_phases = {}
+        self.phases = {}
+        self.errors = Counter()
+        self._stats = {}
+
+    def _observe(self, histograms, key, value):
+        histogram = histograms.get(key)
+        if histogram is None:
+            histogram = histograms[key] = Histogram()
+        histogram.observe(value)
+
+    @contextmanager
+    def request(self, name=None):
+        """Time a request, and the phases within it. Within another request, just (re)name that
+        request instead, so that the command handling a request can name the one its app began.
+        """
+        request = current_request.get()
+        if request is not None:
+            if name is not None:
+                request.name = name
+            yield request
+            return
+
+        request = Request(name or "unknown")
+        token = current_request.set(request)
+        started_at = time.perf_counter()
+        failed = False
+        try:
+            yield request
+        except Exception:
+            failed = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - started_at
+            current_request.reset(token)
+            with self._lock:
+                self._observe(self.requests, request.name, elapsed)
+                for phase in PHASES:
+                    self._observe(self.request_phases, (request.name, phase), request.phases[phase])
+                if failed:
+                    self.errors[request.name] += 1
+
+    @contextmanager
+    def track(self, phase):
+        """Time a phase of the current request"""
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(phase, time.perf_counter() - started_at)
+
+    def observe(self, phase, seconds):
+        request = current_request.get()
+        if request is not None:
+            request.phases[phase] += seconds
+        with self._lock:
+            self._observe(self.phases, phase, seconds)
+
+    def instrument(self, engine):
+        """Time every statement run through the (synchronous) engine as db time"""
+
+        def before_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+            connection.info["statement_started_at"] = time.perf_counter()
+
+        def after_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+            started_at = connection.info.pop("statement_started_at", None)
+            if started_at is not None:
+                self.observe("db", time.perf_counter() - started_at)
+
+        event.listen(engine, "before_cursor_execute", before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", after_cursor_execute)
+
+    def add_stats(self, name, stats):
+        """Include the numbers returned by the `stats` callable as gauges, prefixed with `name`"""
+        self._stats[name] = stats
+
+    def state(self):
+        """Return this process's metrics as JSON-serializable values"""
+        with self._lock:
+            histograms = {
+                attribute: [
+                    [list(key) if isinstance(key, tuple) else [key], histogram.counts, histogram.sum]
+                    for key, histogram in getattr(self, attribute).items()
+                ]
+                for attribute, _, _, _ in HISTOGRAMS
+            }
+            errors = dict(self.errors)
+        gauges = [
+            [f"glossary_{prefix}_{name}", value]
+            for prefix, stats in self._stats.items()
+            for name, value in flatten_stats(stats())
+        ]
+        return {"pid": os.getpid(), "histograms": histograms, "errors": errors, "gauges": gauges}
+
+    def save(self):
+        """Write this process's metrics to its file in the directory, replacing what was there"""
+        path = metrics_path(self.directory, os.getpid())
+        with open(f"{path}.tmp", "w") as out:
+            json.dump(self.state(), out)
+        os.replace(f"{path}.tmp", path)
+
+    def render(self):
+        """Return everything in Prometheus' text exposition format, for every process sharing the
+        directory, if there is one
+        """
+        if self.directory:
+            self.save()
+            states = load_states(self.directory)
+        else:
+            states = [self.state()]
+
+        histograms = {attribute: {} for attribute, _, _, _ in HISTOGRAMS}
+        errors = Counter()
+        lines = []
+        for state in states:
+            for attribute, entries in state["histograms"].items():
+                for labels, counts, total in entries:
+                    histogram = histograms[attribute].setdefault(tuple(labels), Histogram())
+                    histogram.merge(counts, total)
+            errors.update(state["errors"])
+
+        for attribute, metric, description, label_names in HISTOGRAMS:
+            render_histograms(
+                lines,
+                metric,
+                description,
+                {tuple(zip(label_names, labels)): histogram for labels, histogram in histograms[attribute].items()},
+            )
+        lines.append("# HELP glossary_request_errors_total How many requests failed, by command")
+        lines.append("# TYPE glossary_request_errors_total counter")
+        for name, count in sorted(errors.items()):
+            lines.append(f"glossary_request_errors_total{format_labels((('command', name),))} {count}")
+
+        # the stats of each process that's still running, told apart by its pid
+        gauges = {}
+        for state in states:
+            labels = format_labels((("pid", state["pid"]),)) if self.directory else ""
+            for metric, value in state["gauges"]:
+                gauges.setdefault(metric, []).append(f"{metric}{labels} {value}")
+        for metric, samples in gauges.items():
+            lines.append(f"# TYPE {metric} gauge")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """Describe how this process's requests have gone, in a line for each command"""
+        lines = []
+        with self._lock:
+            for name, histogram in sorted(self.requests.items()):
+                phases = ", ".join(
+                    f"{phase} {self.request_phases[(name, phase)].sum / histogram.count * 1000:.1f}ms" for phase in PHASES
+                )
+                lines.append(
+                    f"{name}: {histogram.count} requests, {self.errors[name]} failed,"
+                    f" p50 <= {histogram.quantile(0.5) * 1000:g}ms, p99 <= {histogram.quantile(0.99) * 1000:g}ms,"
+                    f" average {phases}"
+                )
+        return lines
+
+
+def metrics_path(directory, pid):
+    return os.path.join(directory, f"metrics-{pid}.json")
+
+
+def load_states(directory):
+    """Load the metrics every process has saved to the directory"""
+    states = []
+    for path in sorted(glob.glob(os.path.join(directory, "metrics-*.json"))):
+        try:
+            with open(path) as source:
+                states.append(json.load(source))
+        except (OSError, ValueError):
+            logger.exception(f"Unable to read the metrics in {path}")
+    return states
+
+
+def mark_process_dead(directory, pid):
+    """Drop the stats of a process that has exited from its file, keeping its counts"""
+    path = metrics_path(directory, pid)
+    try:
+        with open(path) as source:
+            state = json.load(source)
+    except FileNotFoundError:
+        return
+    state["gauges"] = []
+    with open(f"{path}.tmp", "w") as out:
+        json.dump(state, out)
+    os.replace(f"{path}.tmp", path)
+
+
+def clear_directory(directory):
+    """Delete the metrics saved to the directory, for when the processes sharing it start afresh"""
+    for path in glob.glob(os.path.join(directory, "metrics-*.json*")):
+        os.remove(path)
+
+
+def format_labels(labels):
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels) + "}"
+
+
+def render_histograms(lines, metric, description, histograms):
+    lines.append(f"# HELP {metric} {description}")
+    lines.append(f"# TYPE {metric} histogram")
+    for labels, histogram in sorted(histograms.items()):
+        cumulative = 0
+        for bound, count in zip(histogram.buckets + ("+Inf",), histogram.counts):
+            cumulative += count
+            lines.append(f"{metric}_bucket{format_labels(labels + (('le', bound),))} {cumulative}")
+        lines.append(f"{metric}_sum{format_labels(labels)} {histogram.sum}")
+        lines.append(f"{metric}_count{format_labels(labels)} {histogram.count}")
+
+
+def flatten_stats(stats, prefix=""):
+    """Yield (name, value) for each number in a stats() dict, nested dicts' names joined with _"""
+    for name, value in stats.items():
+        if isinstance(value, dict):
+            yield from flatten_stats(value, f"{prefix}{name}_")
+        elif isinstance(value, (int, float)):
+            yield f"{prefix}{name}", value
+
+
+class MetricsWriter:
+    """Saves a Metrics to its directory every `interval` seconds, in the background, so that
+    other processes sharing the directory can serve it
+    """
+
+    def __init__(self, metrics, interval=1):
+        self.metrics = metrics
+        self.interval = interval
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="metrics-writer", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stopping.wait(self.interval):
+            try:
+                self.metrics.save()
+            except Exception:
+                logger.exception("Unable to save the metrics")
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.metrics.save()
+
+
+class MetricsLogger:
+    """Logs a summary of a Metrics every `interval` seconds, in the background, for when there's
+    nowhere to serve /metrics from
+    """
+
+    def __init__(self, metrics, interval=60):
+        self.metrics = metrics
+        self.interval = interval
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="metrics-logger", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stopping.wait(self.interval):
+            for line in self.metrics.summary():
+                logger.info(line)
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join()
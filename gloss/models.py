@@ -1,8 +1,13 @@
 from datetime import datetime
 
 import sqlalchemy.types as types
-from sqlalchemy import Column
-from sqlalchemy.orm import declarative_base
+from sqlalchemy import Column, ForeignKey, UniqueConstraint
+from sqlalchemy.orm import declarative_base, validates
+
+
+def normalize_term(term):
+    """Return the case-insensitive key a term is looked up by"""
+    return term.lower()
 
 
 class LimitedLengthUnicode(types.TypeDecorator):
@@ -12,7 +17,7 @@ class LimitedLengthUnicode(types.TypeDecorator):
     cache_ok = True
 
     def process_bind_param(self, value, dialect):
-        return value[: self.impl.length]
+        return value[: self.impl.length] if value is not None else None
 
     def copy(self, **kwargs):
         return LimitedLengthUnicode(self.impl.length)
@@ -29,8 +34,20 @@ class Definition(Base):
     id = Column(types.Integer, primary_key=True)
     creation_date = Column(types.DateTime(), default=datetime.utcnow)
     term = Column(LimitedLengthUnicode(255), index=True)
+    # normalize_term(term), so that case-insensitive lookups can use an index
+    term_key = Column(LimitedLengthUnicode(255), index=True, unique=True)
     definition = Column(types.UnicodeText)
     user_name = Column(types.Unicode(255))
+    # the definition this one is an alias of ("see term"), resolved when it is saved
+    alias_id = Column(types.Integer, ForeignKey("definitions.id", ondelete="SET NULL"), nullable=True)
+    # the key of the term this definition is an alias of, resolved or not, so that aliases set
+    # before their term was defined can be found through an index when it is
+    alias_key = Column(LimitedLengthUnicode(255), index=True, nullable=True)
+
+    @validates("term")
+    def update_term_key(self, key, term):
+        self.term_key = normalize_term(term) if term is not None else None
+        return term
 
     def __repr__(self):
         return "<Term: {}, Definition: {}>".format(self.term, self.definition)
@@ -42,10 +59,29 @@ class Interaction(Base):
     __tablename__ = "interactions"
     # Columns
     id = Column(types.Integer, primary_key=True)
-    creation_date = Column(types.DateTime(), default=datetime.utcnow)
+    # on postgres, the table is partitioned by month of creation_date
+    creation_date = Column(types.DateTime(), default=datetime.utcnow, index=True)
     user_name = Column(types.Unicode(255))
     term = Column(LimitedLengthUnicode(255))
     action = Column(types.UnicodeText, index=True)
 
     def __repr__(self):
         return "<Action: {}, Date: {}>".format(self.action, self.creation_date)
+
+
+class InteractionRollup(Base):
+    """Monthly counts of interactions, kept after the interactions themselves have been pruned"""
+
+    __tablename__ = "interaction_rollups"
+    __table_args__ = (UniqueConstraint("month", "term", "action", name="uq_interaction_rollups_month_term_action"),)
+    # Columns
+    id = Column(types.Integer, primary_key=True)
+    # the start of the month counted
+    month = Column(types.DateTime(), nullable=False)
+    # empty, rather than null, for interactions without one, so that the unique constraint holds
+    term = Column(LimitedLengthUnicode(255), nullable=False)
+    action = Column(types.Unicode(255), nullable=False)
+    count = Column(types.Integer, nullable=False)
+
+    def __repr__(self):
+        return "<Action: {}, Month: {}, Count: {}>".format(self.action, self.month, self.count)
@@ -0,0 +1,75 @@
+import re
+
+# the patterns are compiled once, rather than on every check; see verify_url for where this one is from
+URL_PATTERN = re.compile(
+    r"^(?:(?:https?)://|)(?:(?!(?:10|127)(?:\.\d{1,3}){3})(?!(?:169\.254|192\.168)(?:\.\d{1,3}){2})(?!172\.(?:1[6-9]|2\d|3[0-1])(?:\.\d{1,3}){2})(?:[1-9]\d?|1\d\d|2[01]\d|22[0-3])(?:\.(?:1?\d{1,2}|2[0-4]\d|25[0-5])){2}(?:\.(?:[1-9]\d?|1\d\d|2[0-4]\d|25[0-4]))|(?:(?:[a-z\u00a1-\uffff0-9]-*)*[a-z\u00a1-\uffff0-9]+)(?:\.(?:[a-z\u00a1-\uffff0-9]-*)*[a-z\u00a1-\uffff0-9]+)*(?:\.(?:com|net|org|edu|gov|mil|aero|asia|biz|cat|coop|info|int|jobs|mobi|museum|name|post|pro|tel|travel|xxx|ac|ad|ae|af|ag|ai|al|am|an|ao|aq|ar|as|at|au|aw|ax|az|ba|bb|bd|be|bf|bg|bh|bi|bj|bm|bn|bo|br|bs|bt|bv|bw|by|bz|ca|cc|cd|cf|cg|ch|ci|ck|cl|cm|cn|co|cr|cs|cu|cv|cx|cy|cz|dd|de|dj|dk|dm|do|dz|ec|ee|eg|eh|er|es|et|eu|fi|fj|fk|fm|fo|fr|ga|gb|gd|ge|gf|gg|gh|gi|gl|gm|gn|gp|gq|gr|gs|gt|gu|gw|gy|hk|hm|hn|hr|ht|hu|id|ie|il|im|in|io|iq|ir|is|it|je|jm|jo|jp|ke|kg|kh|ki|km|kn|kp|kr|kw|ky|kz|la|lb|lc|li|lk|lr|ls|lt|lu|lv|ly|ma|mc|md|me|mg|mh|mk|ml|mm|mn|mo|mp|mq|mr|ms|mt|mu|mv|mw|mx|my|mz|na|nc|ne|nf|ng|ni|nl|no|np|nr|nu|nz|om|pa|pe|pf|pg|ph|pk|pl|pm|pn|pr|ps|pt|pw|py|qa|re|ro|rs|ru|rw|sa|sb|sc|sd|se|sg|sh|si|sj|Ja|sk|sl|sm|sn|so|sr|ss|st|su|sv|sx|sy|sz|tc|td|tf|tg|th|tj|tk|tl|tm|tn|to|tp|tr|tt|tv|tw|tz|ua|ug|uk|us|uy|uz|va|vc|ve|vg|vi|vn|vu|wf|ws|ye|yt|yu|za|zm|zw)))(?::\d{2,5})?(?:/\S*)?$",
+    re.UNICODE,
+)
+
+IMAGE_SCHEME_PATTERN = re.compile("http")
+IMAGE_EXTENSION_PATTERN = re.compile(r"[gif|jpg|jpeg|png|bmp]$")
+
+
+def get_image_url(text):
+    """Extract an image url from the passed text. If there are multiple image urls,
+    only the first one will be returned.
+    """
+    if "http" not in text:
+        return None
+
+    for chunk in text.split(" "):
+        if verify_image_url(text) and verify_url(text):
+            return chunk
+
+    return None
+
+
+def make_bold(text):
+    """make the passed text bold, accounting for newlines"""
+    newline_split = text.split("\n")
+    bold_split = []
+    for line in newline_split:
+        bold_line = line
+        if line.strip() != "":
+            bold_line = "*{}*".format(line.strip())
+        bold_split.append(bold_line)
+
+    return "\n".join(bold_split)
+
+
+def verify_url(text):
+    """verify that the passed text is a URL
+
+    Adapted from @adamrofer's Python port of @dperini's pattern here: https://gist.github.com/dperini/729294
+    """
+    return URL_PATTERN.match(text)
+
+
+def verify_image_url(text):
+    """Verify that the passed text is an image URL.
+
+    We're verifying image URLs for inclusion in Slack's Incoming Webhook integration, which
+    requires a scheme at the beginning (http(s)) and a file extension at the end to render
+    correctly. So, a URL which passes verify_url() (like example.com/kitten.gif) might not
+    pass this test. If you need to test that the URL is both valid AND an image suitable for
+    the Incoming Webhook integration, run it through both verify_url() and verify_image_url().
+    """
+    return IMAGE_SCHEME_PATTERN.match(text) and IMAGE_EXTENSION_PATTERN.search(text)
+
+
+def render_definition(term, definition):
+    """Render the response to a lookup of the passed definition: mrkdwn text, with an image
+    block if the definition is an image URL. Done once per definition, when it is cached.
+    """
+    text = f"{make_bold(term)}: {definition}"
+    image_url = get_image_url(definition)
+    if image_url is None:
+        return text
+
+    return {
+        "text": text,
+        "blocks": [
+            {"type": "section", "text": {"type": "mrkdwn", "text": text}},
+            {"type": "image", "image_url": image_url, "alt_text": text},
+        ],
+    }
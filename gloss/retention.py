@@ -0,0 +1,164 @@
+import logging
+import re
+from collections import Counter
+from datetime import datetime
+
+from sqlalchemy import delete, insert, select, sql, update
+
+from .models import Interaction, InteractionRollup
+
+logger = logging.getLogger(__name__)
+
+# how many months ahead of the current one to keep partitions created for
+PARTITIONS_AHEAD = 3
+PARTITION_NAME = re.compile(r"^interactions_y(\d{4})m(\d{2})$")
+
+
+def add_months(moment, months):
+    """Return the start of the month `months` after the month of `moment`"""
+    index = moment.year * 12 + moment.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f"interactions_y{month.year:04d}m{month.month:02d}"
+
+
+def add_rollups(connection, counts):
+    """Add the counts, keyed by (month, term, action), to those already rolled up"""
+    for (month, term, action), count in counts.items():
+        updated = connection.execute(
+            update(InteractionRollup)
+            .where(InteractionRollup.month == month, InteractionRollup.term == term, InteractionRollup.action == action)
+            .values(count=InteractionRollup.count + count)
+        )
+        if not updated.rowcount:
+            connection.execute(insert(InteractionRollup).values(month=month, term=term, action=action, count=count))
+
+
+class InteractionPruner:
+    """Rolls old interactions up into monthly counts in interaction_rollups, and then deletes them.
+
+    On postgres, where interactions is partitioned by month, each month's partition is counted
+    with a single query and then detached and dropped, in one transaction. Elsewhere, and for
+    anything left in postgres' default partition, old interactions are counted and deleted
+    `batch_size` rows at a time, each batch in a transaction of its own, so that a prune that's
+    interrupted never counts an interaction twice.
+    """
+
+    def __init__(self, engine, batch_size=5000):
+        self.engine = engine
+        self.batch_size = batch_size
+
+    @property
+    def partitioned(self):
+        """Whether interactions is partitioned by month"""
+        if self.engine.dialect.name != "postgresql":
+            return False
+        with self.engine.connect() as connection:
+            partitioned = connection.execute(
+                sql.text("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('interactions')")
+            ).scalar()
+        return partitioned is not None
+
+    def partitions(self, connection):
+        """Return the names of the monthly partitions, by the start of the month they hold"""
+        names = connection.execute(
+            sql.text(
+                "SELECT child.relname FROM pg_inherits"
+                " JOIN pg_class child ON child.oid = pg_inherits.inhrelid"
+                " WHERE pg_inherits.inhparent = to_regclass('interactions')"
+            )
+        ).scalars()
+        partitions = {}
+        for name in names:
+            match = PARTITION_NAME.match(name)
+            if match:
+                partitions[datetime(int(match[1]), int(match[2]), 1)] = name
+        return partitions
+
+    def create_partitions(self, now=None):
+        """Create any missing partitions for this month and the PARTITIONS_AHEAD months after it,
+        returning the names of those created
+        """
+        now = now or datetime.utcnow()
+        created = []
+        with self.engine.begin() as connection:
+            existing = self.partitions(connection)
+            for months in range(PARTITIONS_AHEAD + 1):
+                month = add_months(now, months)
+                if month not in existing:
+                    self.create_partition(connection, month)
+                    created.append(partition_name(month))
+        return created
+
+    def create_partition(self, connection, month):
+        name = partition_name(month)
+        bounds = {"start": month, "end": add_months(month, 1)}
+        # the month's interactions may have gone into the default partition, which has to give
+        # them up before a partition for the month can be attached
+        connection.execute(sql.text("LOCK TABLE interactions_default IN ACCESS EXCLUSIVE MODE"))
+        connection.execute(sql.text(f"CREATE TABLE {name} (LIKE interactions INCLUDING DEFAULTS)"))
+        connection.execute(
+            sql.text(
+                "WITH moved AS (DELETE FROM interactions_default"
+                " WHERE creation_date >= :start AND creation_date < :end RETURNING *)"
+                f" INSERT INTO {name} SELECT * FROM moved"
+            ),
+            bounds,
+        )
+        connection.execute(
+            sql.text(f"ALTER TABLE interactions ATTACH PARTITION {name} FOR VALUES FROM (:start) TO (:end)"), bounds
+        )
+
+    def prune(self, before):
+        """Roll up and delete the interactions from before the month of `before`, returning how
+        many were pruned
+        """
+        cutoff = add_months(before, 0)
+        pruned = 0
+        if self.partitioned:
+            pruned += self.drop_partitions(cutoff)
+        pruned += self.delete_batches(cutoff)
+        return pruned
+
+    def drop_partitions(self, cutoff):
+        pruned = 0
+        with self.engine.connect() as connection:
+            partitions = self.partitions(connection)
+        for month, name in sorted(partitions.items()):
+            if month >= cutoff:
+                continue
+            with self.engine.begin() as connection:
+                count = connection.execute(sql.text(f"SELECT count(*) FROM {name}")).scalar()
+                connection.execute(
+                    sql.text(
+                        "INSERT INTO interaction_rollups (month, term, action, count)"
+                        f" SELECT :month, COALESCE(term, ''), COALESCE(action, ''), count(*) FROM {name} GROUP BY 2, 3"
+                        " ON CONFLICT (month, term, action) DO UPDATE SET count = interaction_rollups.count + excluded.count"
+                    ),
+                    {"month": month},
+                )
+                connection.execute(sql.text(f"ALTER TABLE interactions DETACH PARTITION {name}"))
+                connection.execute(sql.text(f"DROP TABLE {name}"))
+            logger.info(f"Rolled up and dropped {name}, with {count} interactions")
+            pruned += count
+        return pruned
+
+    def delete_batches(self, cutoff):
+        pruned = 0
+        while True:
+            with self.engine.begin() as connection:
+                rows = connection.execute(
+                    select(Interaction.id, Interaction.creation_date, Interaction.term, Interaction.action)
+                    .where(Interaction.creation_date < cutoff)
+                    .order_by(Interaction.creation_date)
+                    .limit(self.batch_size)
+                ).all()
+                if not rows:
+                    return pruned
+                counts = Counter((add_months(row.creation_date, 0), row.term or "", row.action or "") for row in rows)
+                add_rollups(connection, counts)
+                connection.execute(delete(Interaction).where(Interaction.id.in_([row.id for row in rows])))
+            pruned += len(rows)
+            logger.info(f"Rolled up and deleted {pruned} interactions")
@@ -0,0 +1,90 @@
+import re
+
+from sqlalchemy import text
+
+
+class SearchBackend:
+    """Ranked full-text search of terms and definitions, served by an index in the database.
+
+    Subclasses provide a `query` taking :query and :limit parameters and returning terms
+    best match first, and can override `prepare_query` to escape the searched text.
+    """
+
+    query = None
+
+    def __init__(self, session):
+        self.session = session
+
+    def prepare_query(self, search_text):
+        return search_text.strip()
+
+    def search(self, search_text, limit=20):
+        """Return up to `limit` terms whose term or definition matches the passed text"""
+        query_text = self.prepare_query(search_text)
+        if not query_text:
+            return []
+        rows = self.session.execute(self.query, {"query": query_text, "limit": limit})
+        return [row.term for row in rows]
+
+
+class PostgresSearchBackend(SearchBackend):
+    """Searches the weighted tsv_search column"""
+
+    query = text(
+        """
+        SELECT term FROM definitions, plainto_tsquery('pg_catalog.english', :query) AS query
+        WHERE tsv_search @@ query
+        ORDER BY ts_rank(tsv_search, query) DESC, term
+        LIMIT :limit
+        """
+    )
+
+
+class MySQLSearchBackend(SearchBackend):
+    """Searches the FULLTEXT indexes, counting matches in the term twice"""
+
+    query = text(
+        """
+        SELECT term FROM definitions
+        WHERE MATCH (term, definition) AGAINST (:query IN NATURAL LANGUAGE MODE)
+        ORDER BY
+            MATCH (term) AGAINST (:query IN NATURAL LANGUAGE MODE) * 2
+            + MATCH (term, definition) AGAINST (:query IN NATURAL LANGUAGE MODE) DESC,
+            term
+        LIMIT :limit
+        """
+    )
+
+
+class SQLiteSearchBackend(SearchBackend):
+    """Searches the definitions_fts FTS5 table, weighting terms ten times over definitions"""
+
+    query = text(
+        """
+        SELECT definitions.term FROM definitions_fts
+        JOIN definitions ON definitions.id = definitions_fts.rowid
+        WHERE definitions_fts MATCH :query
+        ORDER BY bm25(definitions_fts, 10.0, 1.0), definitions.term
+        LIMIT :limit
+        """
+    )
+
+    def prepare_query(self, search_text):
+        # quote every word so FTS5 doesn't read the text as query syntax
+        return " ".join(f'"{word}"' for word in re.findall(r"\w+", search_text))
+
+
+SEARCH_BACKENDS = {
+    "postgresql": PostgresSearchBackend,
+    "mysql": MySQLSearchBackend,
+    "mariadb": MySQLSearchBackend,
+    "sqlite": SQLiteSearchBackend,
+}
+
+
+def get_search_backend(session):
+    """Return the search backend for the session's database, or None if there isn't one"""
+    backend = SEARCH_BACKENDS.get(session.get_bind().dialect.name)
+    if backend is None:
+        return None
+    return backend(session)
@@ -0,0 +1,258 @@
+"""A compact binary format for glossary backups.
+
+A snapshot starts with a header:
+
+    b"GLOSSNAP", version (u8), compression (u8), metadata length (u32), metadata (JSON)
+
+The metadata lists the columns written for each table. Records follow in chunks, each with a
+header of its own:
+
+    table (u8, an index into the metadata's tables), records (u32), stored length (u32), raw length (u32)
+
+and then the chunk's compressed payload. A chunk header with a table of 255 ends the snapshot,
+so that a truncated one isn't mistaken for a complete one. As each chunk says how long it is,
+a reader can skip chunks, or hand them out to be decoded in parallel, without decoding them.
+
+Each chunk's payload has its own table of the strings in it, so that a user name or action
+repeated in thousands of interactions is only stored once per chunk, and chunks can be
+decoded independently. The string table is a u32 count followed by each string as a u32
+length and its UTF-8 bytes. Then come the records, each a u16 length followed by its columns:
+ints and dates (as microseconds since the epoch) as i64s, and strings as u32 indexes into the
+string table. A reader ignores any bytes past the columns it knows about.
+
+All numbers are little-endian.
+"""
+
+import gzip
+import json
+import struct
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+from .dump import DATE_COLUMNS, TABLES, iter_records
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+MAGIC = b"GLOSSNAP"
+VERSION = 1
+COMPRESSIONS = {"none": 0, "gzip": 1, "zstd": 2}
+
+HEADER = struct.Struct("<8sBBI")
+CHUNK_HEADER = struct.Struct("<BIII")
+END_OF_SNAPSHOT = 255
+COUNT = struct.Struct("<I")
+RECORD_LENGTH = struct.Struct("<H")
+
+# stand-ins for NULL
+NULL_INT = -(1 << 63)
+NULL_STRING = 0xFFFFFFFF
+
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+
+def column_codes(table, columns):
+    """The struct format characters for each of a table's columns"""
+    model = TABLES[table][0]
+    codes = []
+    for column in columns:
+        python_type = model.__table__.c[column].type.python_type
+        codes.append("q" if python_type in (int, datetime) else "I")
+    return "".join(codes)
+
+
+def compress(compression, data):
+    if compression == COMPRESSIONS["gzip"]:
+        return gzip.compress(data, compresslevel=6, mtime=0)
+    if compression == COMPRESSIONS["zstd"]:
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    return data
+
+
+def decompress(compression, data):
+    if compression == COMPRESSIONS["gzip"]:
+        return gzip.decompress(data)
+    if compression == COMPRESSIONS["zstd"]:
+        return zstandard.ZstdDecompressor().decompress(data)
+    return data
+
+
+def check_compression(name):
+    """Return the code for a compression, raising ValueError if it can't be used here"""
+    if name not in COMPRESSIONS:
+        raise ValueError(f"Unknown compression {name!r}")
+    if name == "zstd" and zstandard is None:
+        raise ValueError("zstd compression needs the zstandard package, which comes with `pip install .[zstd]`")
+    return COMPRESSIONS[name]
+
+
+def encode_chunk(table, columns, records):
+    """Encode exported records of a table into an uncompressed chunk payload"""
+    codes = column_codes(table, columns)
+    record_struct = struct.Struct("<" + codes)
+    strings = {}
+    encoded = []
+    for record in records:
+        values = []
+        for column, code in zip(columns, codes):
+            value = record[column]
+            if value is None:
+                values.append(NULL_INT if code == "q" else NULL_STRING)
+            elif code == "I":
+                values.append(strings.setdefault(value, len(strings)))
+            elif column == DATE_COLUMNS[table]:
+                values.append((datetime.fromisoformat(value) - EPOCH) // MICROSECOND)
+            else:
+                values.append(value)
+        encoded.append(RECORD_LENGTH.pack(record_struct.size) + record_struct.pack(*values))
+
+    parts = [COUNT.pack(len(strings))]
+    for string in strings:
+        data = string.encode("utf-8")
+        parts.append(COUNT.pack(len(data)))
+        parts.append(data)
+    parts.extend(encoded)
+    return b"".join(parts)
+
+
+def decode_chunk(table, columns, compression, payload, count):
+    """Decode a chunk's payload back into records, ready for the Importer"""
+    data = decompress(compression, payload)
+    codes = column_codes(table, columns)
+    record_struct = struct.Struct("<" + codes)
+
+    (string_count,) = COUNT.unpack_from(data, 0)
+    position = COUNT.size
+    strings = []
+    for _ in range(string_count):
+        (length,) = COUNT.unpack_from(data, position)
+        position += COUNT.size
+        strings.append(data[position : position + length].decode("utf-8"))
+        position += length
+
+    records = []
+    for _ in range(count):
+        (length,) = RECORD_LENGTH.unpack_from(data, position)
+        position += RECORD_LENGTH.size
+        values = record_struct.unpack_from(data, position)
+        position += length
+        record = {}
+        for column, code, value in zip(columns, codes, values):
+            if value == (NULL_INT if code == "q" else NULL_STRING):
+                value = None
+            elif code == "I":
+                value = strings[value]
+            elif column == DATE_COLUMNS[table]:
+                value = EPOCH + value * MICROSECOND
+            record[column] = value
+        records.append(record)
+    return table, records
+
+
+def write_snapshot(session, out, batch_size=1000, since=None, compression="gzip", chunk_size=10000):
+    """Write every table to the binary stream `out` as a snapshot, in chunks of `chunk_size`
+    records. `since` can map tables to watermarks, as for iter_records. Returns how many
+    records were written.
+    """
+    compression = check_compression(compression)
+    since = since or {}
+    tables = list(TABLES)
+    metadata = json.dumps({"tables": {table: list(TABLES[table][1]) for table in tables}}).encode("utf-8")
+    out.write(HEADER.pack(MAGIC, VERSION, compression, len(metadata)))
+    out.write(metadata)
+
+    written = 0
+    for index, table in enumerate(tables):
+        columns = TABLES[table][1]
+        chunk = []
+        for record in iter_records(session, table, batch_size=batch_size, since=since.get(table)):
+            chunk.append(record)
+            if len(chunk) >= chunk_size:
+                write_chunk(out, index, compression, table, columns, chunk)
+                written += len(chunk)
+                chunk = []
+        if chunk:
+            write_chunk(out, index, compression, table, columns, chunk)
+            written += len(chunk)
+    out.write(CHUNK_HEADER.pack(END_OF_SNAPSHOT, 0, 0, 0))
+    return written
+
+
+def write_chunk(out, index, compression, table, columns, records):
+    data = encode_chunk(table, columns, records)
+    payload = compress(compression, data)
+    out.write(CHUNK_HEADER.pack(index, len(records), len(payload), len(data)))
+    out.write(payload)
+
+
+def read_exactly(stream, size):
+    data = stream.read(size)
+    if len(data) != size:
+        raise ValueError("Unexpected end of snapshot")
+    return data
+
+
+def read_header(stream):
+    """Read a snapshot's header, returning its compression and its tables' (name, columns)"""
+    magic, version, compression, metadata_length = HEADER.unpack(read_exactly(stream, HEADER.size))
+    if magic != MAGIC:
+        raise ValueError("Not a glossary snapshot")
+    if version > VERSION:
+        raise ValueError(f"Snapshot version {version} is newer than this version of the importer")
+    if compression == COMPRESSIONS["zstd"]:
+        check_compression("zstd")
+    metadata = json.loads(read_exactly(stream, metadata_length))
+    tables = []
+    for table, columns in metadata["tables"].items():
+        if table not in TABLES:
+            raise ValueError(f"Unknown table {table!r}")
+        # only the columns this version knows about are decoded, which must come first
+        known = [column for column in columns if column in TABLES[table][1]]
+        if known != columns[: len(known)]:
+            raise ValueError(f"Unexpected columns for {table}: {columns!r}")
+        tables.append((table, known))
+    return compression, tables
+
+
+def iter_chunks(stream, tables):
+    """Yield a (table, columns, payload, count) tuple for each chunk of a snapshot after its
+    header, without decoding them
+    """
+    while True:
+        index, count, length, _ = CHUNK_HEADER.unpack(read_exactly(stream, CHUNK_HEADER.size))
+        if index == END_OF_SNAPSHOT:
+            return
+        table, columns = tables[index]
+        yield table, columns, read_exactly(stream, length), count
+
+
+def iter_snapshot(stream, jobs=1):
+    """Yield (table, record) pairs from a snapshot read from the binary stream `stream`.
+
+    With more than one job, chunks are decoded in that many processes, a few chunks ahead of
+    the records being consumed, and the records are still yielded in order.
+    """
+    compression, tables = read_header(stream)
+    chunks = iter_chunks(stream, tables)
+    if jobs <= 1:
+        for table, columns, payload, count in chunks:
+            yield from iter_decoded(*decode_chunk(table, columns, compression, payload, count))
+        return
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        pending = deque()
+        for table, columns, payload, count in chunks:
+            pending.append(executor.submit(decode_chunk, table, columns, compression, payload, count))
+            if len(pending) >= jobs * 2:
+                yield from iter_decoded(*pending.popleft().result())
+        while pending:
+            yield from iter_decoded(*pending.popleft().result())
+
+
+def iter_decoded(table, records):
+    for record in records:
+        yield table, record
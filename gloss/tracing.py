@@ -0,0 +1,125 @@
+import functools
+import inspect
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+try:
+    from opentelemetry import trace
+except ImportError:
+    trace = None
+
+try:
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+except ImportError:
+    TracerProvider = None
+
+EXPORTERS = ("console", "file")
+
+if TracerProvider is not None:
+
+    class FileSpanExporter(ConsoleSpanExporter):
+        """Appends spans to the file at `path`, a line of JSON each, and closes it on shutdown"""
+
+        def __init__(self, path):
+            # appended to a line at a time, so that processes can share the file
+            super().__init__(out=open(path, "a", buffering=1), formatter=lambda span: span.to_json(indent=None) + "\n")
+
+        def shutdown(self):
+            super().shutdown()
+            self.out.close()
+
+# spans go nowhere until a tracer provider is configured, by configure_tracing() or by the
+# app's own OpenTelemetry setup
+tracer = trace.get_tracer("gloss") if trace is not None else None
+
+
+def configure_tracing(exporter=None, path="traces.jsonl", service_name="glossary-bot"):
+    """Export spans to stdout ("console") or, a line of JSON each, to the file at `path` ("file"),
+    returning the tracer provider, whose shutdown() writes out any spans it's still holding.
+    Without an exporter, nothing is configured and None is returned.
+    """
+    if not exporter:
+        return None
+    if exporter not in EXPORTERS:
+        raise ValueError(f"Unknown tracing exporter {exporter!r}")
+    if TracerProvider is None:
+        raise ValueError("Tracing needs the opentelemetry packages, which come with `pip install .[tracing]`")
+
+    if exporter == "file":
+        span_exporter = FileSpanExporter(path)
+    else:
+        span_exporter = ConsoleSpanExporter()
+    provider = TracerProvider(resource=Resource.create({"service.name": service_name}))
+    provider.add_span_processor(BatchSpanProcessor(span_exporter))
+    trace.set_tracer_provider(provider)
+    return provider
+
+
+@contextmanager
+def span(name, **attributes):
+    """Trace a span, as a child of the current one. Without opentelemetry, this does nothing."""
+    if tracer is None:
+        yield None
+        return
+    with tracer.start_as_current_span(name, attributes=attributes) as current:
+        yield current
+
+
+def traced(function):
+    """Trace each call of the decorated function, or coroutine function, in a span named after it"""
+    name = function.__qualname__
+
+    if inspect.iscoroutinefunction(function):
+
+        @functools.wraps(function)
+        async def async_wrapper(*args, **kwargs):
+            with span(name):
+                return await function(*args, **kwargs)
+
+        return async_wrapper
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        with span(name):
+            return function(*args, **kwargs)
+
+    return wrapper
+
+
+def set_attributes(**attributes):
+    """Add attributes to the current span"""
+    if trace is not None:
+        trace.get_current_span().set_attributes(attributes)
+
+
+def instrument(engine):
+    """Trace every statement run through the (synchronous) engine in a span of its own"""
+    if tracer is None:
+        return
+
+    def before_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+        connection.info["statement_span"] = tracer.start_span(
+            statement.split(None, 1)[0] if statement.strip() else "statement",
+            kind=trace.SpanKind.CLIENT,
+            attributes={"db.system": engine.dialect.name, "db.statement": statement},
+        )
+
+    def after_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+        statement_span = connection.info.pop("statement_span", None)
+        if statement_span is not None:
+            statement_span.end()
+
+    def handle_error(exception_context):
+        connection = exception_context.connection
+        statement_span = connection.info.pop("statement_span", None) if connection is not None else None
+        if statement_span is not None:
+            statement_span.record_exception(exception_context.original_exception)
+            statement_span.set_status(trace.Status(trace.StatusCode.ERROR))
+            statement_span.end()
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", after_cursor_execute)
+    event.listen(engine, "handle_error", handle_error)
@@ -0,0 +1,87 @@
+import contextvars
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerPoolFull(Exception):
+    """Raised when work is submitted to a worker pool whose queue is already full"""
+
+
+class WorkerPool:
+    """A fixed number of worker threads fed from a bounded queue.
+
+    Slack listeners acknowledge their requests straight away and hand the glossary work to
+    the pool, so a burst of requests queues up here instead of missing Slack's 3 second
+    acknowledgement deadline. Once `max_queue` tasks are waiting, further submissions are
+    rejected with WorkerPoolFull rather than letting the backlog grow without bound.
+    """
+
+    def __init__(self, workers=4, max_queue=100, name="glossary-worker"):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        # tasks that have been submitted but haven't finished, and how many of them are running
+        self._pending = 0
+        self._active = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.max_queue_depth = 0
+
+    @property
+    def queue_depth(self):
+        """How many tasks are waiting for a worker"""
+        return self._pending - self._active
+
+    def submit(self, fn, *args, **kwargs):
+        """Queue fn(*args, **kwargs) to be run by a worker, returning a Future for its result"""
+        with self._lock:
+            if self._pending - self._active >= self.max_queue:
+                self.rejected += 1
+                raise WorkerPoolFull(f"{self.queue_depth} tasks are already waiting for a worker")
+            self._pending += 1
+            self.submitted += 1
+            self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+        # run in a copy of the submitter's context, so that the work is traced as part of its request
+        context = contextvars.copy_context()
+        return self._executor.submit(context.run, self._run, fn, *args, **kwargs)
+
+    def _run(self, fn, *args, **kwargs):
+        with self._lock:
+            self._active += 1
+        try:
+            return fn(*args, **kwargs)
+        except Exception:
+            with self._lock:
+                self.failed += 1
+            logger.exception("Glossary work failed")
+            raise
+        finally:
+            with self._lock:
+                self._active -= 1
+                self._pending -= 1
+                self.completed += 1
+
+    def shutdown(self, wait=True):
+        """Stop accepting work, waiting for queued tasks to finish if `wait` is set"""
+        self._executor.shutdown(wait=wait)
+
+    def stats(self):
+        """Return the pool's counters, for sizing it"""
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "active": self._active,
+                "queue_depth": self._pending - self._active,
+                "max_queue": self.max_queue,
+                "max_queue_depth": self.max_queue_depth,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+            }
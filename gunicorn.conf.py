@@ -0,0 +1,50 @@
+# gunicorn settings for receiving Slack's requests over HTTP, at /slack/events:
+#
+#   alembic upgrade head && gunicorn
+#
+# The app is loaded once and then forked, so each worker starts with the app already imported.
+import os
+import tempfile
+
+wsgi_app = "app:wsgi_app"
+bind = f"0.0.0.0:{os.getenv('PORT', '3000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+preload_app = True
+
+# where the workers share their metrics, so that whichever answers /metrics serves all of theirs
+if "METRICS_DIR" not in os.environ:
+    os.environ["METRICS_DIR"] = tempfile.mkdtemp(prefix="glossary-metrics-")
+
+
+def on_starting(server):
+    from gloss.metrics import clear_directory
+
+    # the counts of a previous run's workers would otherwise be added to this one's
+    clear_directory(os.environ["METRICS_DIR"])
+
+
+def post_fork(server, worker):
+    import app
+
+    app.post_fork()
+
+
+def worker_exit(server, worker):
+    import app
+
+    # write out whatever interactions the worker still has buffered
+    app.interaction_logger.shutdown()
+    # and whatever spans it hasn't exported
+    if app.tracer_provider is not None:
+        app.tracer_provider.shutdown()
+    # and the metrics it has counted since it last saved them
+    if app.metrics.directory:
+        app.metrics_writer.stop()
+
+
+def child_exit(server, worker):
+    from gloss.metrics import mark_process_dead
+
+    # its counts still count, but its caches and pool are gone
+    mark_process_dead(os.environ["METRICS_DIR"], worker.pid)
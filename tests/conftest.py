@@ -1,13 +1,16 @@
 import pytest
 from os import environ
+from pathlib import Path
 
 from unittest import TestCase
+from alembic import command
+from alembic.config import Config as AlembicConfig
 from pytest_alembic import Config
 from pytest_mock_resources import create_postgres_fixture
 from sqlalchemy import create_engine
 
 from sqlalchemy.orm import Session, declarative_base
-from gloss.models import Definition, Interaction
+from gloss.models import Definition, Interaction, InteractionRollup
 from gloss.bot import Bot
 
 if environ.get("TEST_DATABASE_URL"):
@@ -44,6 +47,7 @@ def db_session(alembic_engine, alembic_runner):
 
     session = Session(alembic_engine)
     session.query(Interaction).delete()
+    session.query(InteractionRollup).delete()
     session.query(Definition).delete()
 
     yield session
@@ -67,6 +71,26 @@ def handle_glossary(bot):
     return call_handle
 
 
+@pytest.fixture
+def sqlite_session(tmp_path, monkeypatch):
+    """A session on a migrated SQLite database, for exercising the non-postgres code paths"""
+    db_url = f"sqlite:///{tmp_path / 'glossary-bot-test.db'}"
+    monkeypatch.setenv("DATABASE_URL", db_url)
+
+    root = Path(__file__).parent.parent
+    config = AlembicConfig(str(root / "alembic.ini"))
+    config.set_main_option("script_location", str(root / "alembic"))
+    command.upgrade(config, "heads")
+
+    engine = create_engine(db_url)
+    session = Session(engine)
+
+    yield session
+
+    session.close()
+    engine.dispose()
+
+
 @pytest.fixture
 def testcase():
     tc = TestCase()
@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+import asyncio
+
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from gloss.async_bot import AsyncBot
+from gloss.db import get_async_database_url
+
+from . import conftest  # noqa: F401
+
+
+class TestAsyncBot:
+    def test_async_database_urls(self):
+        """Database URLs are switched over to their database's asyncio driver"""
+        assert str(get_async_database_url("postgresql://u:p@db/gloss?sslmode=require")) == (
+            "postgresql+asyncpg://u:***@db/gloss?ssl=require"
+        )
+        assert str(get_async_database_url("mysql://u@db/gloss")) == "mysql+aiomysql://u@db/gloss"
+        assert str(get_async_database_url("sqlite:///gloss.db")) == "sqlite+aiosqlite:///gloss.db"
+
+    def test_handle_glossary(self, sqlite_session):
+        """An AsyncBot sets, gets and searches definitions through an AsyncSession"""
+        url = get_async_database_url(sqlite_session.get_bind().url)
+
+        async def run():
+            engine = create_async_engine(url)
+            try:
+                async with AsyncSession(engine) as session:
+                    bot = AsyncBot(session=session, bot_name="Glossary Bot")
+
+                    async def handle_glossary(text):
+                        return await bot.handle_glossary(text=text, user_name="testuser", slash_command="/test_bot")
+
+                    assert await handle_glossary("EW = Eligibility Worker") == (
+                        "Definition for *EW* is now set to *Eligibility Worker*"
+                    )
+                    assert await handle_glossary("ew") == "*EW*: Eligibility Worker"
+                    assert "found *eligibility* in: *EW*" in await handle_glossary("search eligibility")
+            finally:
+                await engine.dispose()
+
+        asyncio.run(run())
@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+import random
+
+from benchmarks import load
+from benchmarks.handle_glossary import OPERATIONS, make_records, run
+
+from . import conftest  # noqa: F401
+
+
+class TestBenchmarks:
+    def test_run(self, tmp_path, monkeypatch):
+        """Every operation is timed for every size"""
+        monkeypatch.setenv("DATABASE_URL", "")
+        results = run(f"sqlite:///{tmp_path / 'benchmark.db'}", sizes=(100, 200), iterations=3)
+
+        assert results["database"] == "sqlite"
+        assert [result["size"] for result in results["results"]] == [100, 200]
+        for result in results["results"]:
+            assert sorted(result["operations"]) == sorted(OPERATIONS)
+            for timings in result["operations"].values():
+                assert timings["iterations"] == 3
+                assert 0 < timings["p50"] <= timings["p95"] <= timings["max"]
+
+    def test_small_glossaries_have_an_alias(self):
+        """There's an alias to look up however few definitions are generated"""
+        for seed_value in range(20):
+            records, terms = make_records(2, random.Random(seed_value))
+            assert len(terms["aliases"]) == 1
+
+
+class TestLoad:
+    def test_run(self, tmp_path, monkeypatch):
+        """Every command sent to the app is replied to through the stand-in Slack API"""
+        monkeypatch.setenv("DATABASE_URL", "")
+        mix = load.parse_mix("hit=2,miss,mention")
+        results = load.run(
+            database_url=f"sqlite:///{tmp_path / 'load.db'}", rate=20, duration=1, mix=mix, terms=3, workers=1
+        )
+
+        assert sorted(results["results"]) == ["hit", "mention", "miss"]
+        assert sum(result["sent"] for result in results["results"].values()) == 20
+        for result in results["results"].values():
+            assert result["replied"] == result["sent"]
+            assert result["errors"] == 0
+            assert result["latency"]["p50"] <= result["latency"]["p99"]
+        assert results["slack_calls"]["/api/auth.test"] == 1
@@ -286,6 +286,42 @@ class TestBot:
         assert robo_response is not None
         assert robo_response == f"*{original_term}*: {definition}"
 
+    def test_alias_chains_are_followed(self, db_session, handle_glossary):
+        """Aliases of aliases resolve to the definition at the end of the chain"""
+        handle_glossary(text="Glossary Bot = A Slack bot that maintains a glossary")
+        handle_glossary(text="Gloss Bot = see Glossary Bot")
+        handle_glossary(text="GB = see gloss bot")
+
+        robo_response = handle_glossary(text="GB")
+        assert robo_response == "*Glossary Bot*: A Slack bot that maintains a glossary"
+
+        alias = db_session.query(Definition).filter(Definition.term == "GB").first()
+        target = db_session.query(Definition).filter(Definition.term == "Gloss Bot").first()
+        assert alias.alias_id == target.id
+
+    def test_alias_set_before_its_term(self, db_session, handle_glossary):
+        """An alias set before the term it points at is linked once the term is defined"""
+        handle_glossary(text="GB = see Glossary Bot")
+        assert handle_glossary(text="GB") == "*GB*: see Glossary Bot"
+
+        handle_glossary(text="Glossary Bot = A Slack bot that maintains a glossary")
+        assert handle_glossary(text="GB") == "*Glossary Bot*: A Slack bot that maintains a glossary"
+
+        handle_glossary(text="delete Glossary Bot")
+        assert handle_glossary(text="GB") == "*GB*: see Glossary Bot"
+        alias = db_session.query(Definition).filter(Definition.term == "GB").first()
+        assert alias.alias_id is None
+
+    def test_alias_cycles(self, db_session, handle_glossary):
+        """Aliases that loop back on themselves stop at the last definition before the loop"""
+        handle_glossary(text="ping = see pong")
+        handle_glossary(text="pong = see ping")
+        handle_glossary(text="echo = see echo")
+
+        assert handle_glossary(text="ping") == "*pong*: see ping"
+        assert handle_glossary(text="pong") == "*ping*: see pong"
+        assert handle_glossary(text="echo") == "*echo*: see echo"
+
     def test_delete_definition(self, db_session, handle_glossary):
         """A definition can be deleted from the database"""
         # first set a value in the database and verify that it's there
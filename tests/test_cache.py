@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+from sqlalchemy.orm import Session
+
+from gloss.bot import Bot
+from gloss.cache import CachedDefinition, LRUCache, SlackIdentityCache, TermCache, normalize_query
+from gloss.models import Definition
+
+from . import conftest  # noqa: F401
+
+
+class TestLRUCache:
+    def test_least_recently_used_entries_are_evicted(self):
+        """The least recently used entry is evicted once the cache is full"""
+        cache = LRUCache(maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        assert cache.get("a") == 1
+        cache.set("c", 3)
+
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+        assert cache.stats() == {
+            "size": 2,
+            "maxsize": 2,
+            "generation": 0,
+            "hits": 3,
+            "misses": 1,
+            "evictions": 1,
+            "expirations": 0,
+        }
+
+    def test_bumping_the_generation_invalidates_everything(self):
+        """Entries cached before the generation is bumped are no longer returned"""
+        cache = LRUCache()
+        cache.set("a", [])
+        assert cache.get("a") == []
+
+        cache.bump_generation()
+        assert cache.get("a") is None
+        cache.set("a", ["b"])
+        assert cache.get("a") == ["b"]
+
+    def test_values_from_a_previous_generation_are_not_cached(self):
+        """A value computed before the generation was bumped isn't cached"""
+        cache = LRUCache()
+        generation = cache.generation
+        cache.bump_generation()
+        cache.set("a", [], generation=generation)
+        assert cache.get("a") is None
+
+        cache.set("a", ["b"], generation=cache.generation)
+        assert cache.get("a") == ["b"]
+
+    def test_entries_expire_after_their_ttl(self, monkeypatch):
+        """An entry is treated as missing once its ttl has passed"""
+        now = [100.0]
+        monkeypatch.setattr("gloss.cache.time.monotonic", lambda: now[0])
+        cache = LRUCache(ttl=10)
+        cache.set("a", 1)
+        cache.set("b", 2, ttl=30)
+
+        now[0] += 20
+        assert cache.get("a") is None
+        assert cache.get("b") == 2
+        assert cache.expirations == 1
+
+    def test_normalize_query(self):
+        """Queries differing only in case and whitespace share a key"""
+        assert normalize_query("  Calwin   Youth ") == normalize_query("calwin youth")
+
+    def test_writes_invalidate_cached_suggestions(self, db_session):
+        """Suggestions cached before a definition is set or deleted aren't reused afterwards"""
+        cache = LRUCache()
+        bot = Bot(bot_name="Glossary Bot", session=db_session, result_cache=cache)
+
+        def handle_glossary(text):
+            return bot.handle_glossary(text=text, user_name="testuser", slash_command="/test_bot")
+
+        handle_glossary(text="glossed gloss = a really useful tool")
+        assert "*glossed gloss*" in handle_glossary(text="gloss")
+        assert "*glossed gloss*" in handle_glossary(text="GLOSS")
+        assert cache.hits == 1
+
+        handle_glossary(text="standard gloss = a good resource")
+        assert "*glossed gloss*, *standard gloss*" in handle_glossary(text="gloss")
+
+        handle_glossary(text="delete glossed gloss")
+        assert "*glossed gloss*" not in handle_glossary(text="gloss")
+        assert "*glossed gloss*" not in handle_glossary(text="search gloss")
+
+    def test_suggestions_searched_during_a_write_are_not_cached(self, db_session, monkeypatch):
+        """Suggestions searched for before a concurrent write was saved aren't served after it"""
+        bot = Bot(bot_name="Glossary Bot", session=db_session, result_cache=LRUCache())
+
+        def handle_glossary(text):
+            return bot.handle_glossary(text=text, user_name="testuser", slash_command="/test_bot")
+
+        handle_glossary(text="glossed gloss = a really useful tool")
+        get_substring_matches = bot.get_substring_matches
+
+        def write_while_searching(term):
+            matches = get_substring_matches(term)
+            # another request's write lands between this search and caching its results
+            Bot(bot_name="Glossary Bot", session=db_session, result_cache=bot.result_cache).handle_glossary(
+                text="standard gloss = a good resource", user_name="testuser", slash_command="/test_bot"
+            )
+            return matches
+
+        with monkeypatch.context() as patch:
+            patch.setattr(bot, "get_substring_matches", write_while_searching)
+            handle_glossary(text="gloss")
+        assert "*standard gloss*" in handle_glossary(text="gloss")
+
+
+class TestTermCache:
+    def test_lookups_are_cached(self, db_session, handle_glossary):
+        """A lookup of a cached term, in any case, doesn't go to the database"""
+        term_cache = TermCache()
+        bot = Bot(bot_name="Glossary Bot", session=db_session, term_cache=term_cache)
+        handle_glossary(text="EW = Eligibility Worker")
+
+        entry = bot.query_definition("ew")
+        assert entry == CachedDefinition(
+            id=entry.id,
+            term="EW",
+            definition="Eligibility Worker",
+            alias_id=None,
+            response="*EW*: Eligibility Worker",
+        )
+
+        # change the row behind the cache's back
+        db_session.query(Definition).update({Definition.definition: "Egg Weathervane"})
+        assert bot.query_definition("EW").definition == "Eligibility Worker"
+        assert bot.handle_glossary(text="EW", user_name="testuser", slash_command="/test_bot") == entry.response
+        assert term_cache.hits == 2
+
+    def test_misses_are_cached_until_they_expire(self, db_session, handle_glossary, monkeypatch):
+        """A term without a definition is remembered as missing for negative_ttl seconds"""
+        now = [100.0]
+        monkeypatch.setattr("gloss.cache.time.monotonic", lambda: now[0])
+        bot = Bot(bot_name="Glossary Bot", session=db_session, term_cache=TermCache(negative_ttl=60))
+        assert bot.query_definition("EW") is None
+
+        # set the definition from another bot, which doesn't share the cache
+        handle_glossary(text="EW = Eligibility Worker")
+        assert bot.query_definition("EW") is None
+
+        now[0] += 61
+        assert bot.query_definition("EW").definition == "Eligibility Worker"
+
+    def test_writes_update_a_shared_cache(self, db_session):
+        """Bots sharing a term cache see each other's sets and deletes"""
+        term_cache = TermCache()
+        first = Bot(bot_name="Glossary Bot", session=db_session, term_cache=term_cache)
+        second = Bot(bot_name="Glossary Bot", session=db_session, term_cache=term_cache)
+
+        assert second.query_definition("EW") is None
+        first.handle_glossary(text="EW = Eligibility Worker", user_name="testuser", slash_command="/test_bot")
+        assert second.query_definition("ew").definition == "Eligibility Worker"
+
+        first.handle_glossary(text="ew = Egg Weathervane", user_name="testuser", slash_command="/test_bot")
+        assert second.query_definition("EW") == CachedDefinition(
+            id=second.query_definition("EW").id,
+            term="ew",
+            definition="Egg Weathervane",
+            alias_id=None,
+            response="*ew*: Egg Weathervane",
+        )
+
+        first.handle_glossary(text="delete EW", user_name="testuser", slash_command="/test_bot")
+        assert second.query_definition("EW") is None
+        assert "Sorry, there is no definition for *EW*" in second.handle_glossary(
+            text="EW", user_name="testuser", slash_command="/test_bot"
+        )
+
+
+    def test_lookups_loaded_during_a_write_are_not_cached(self, db_session, handle_glossary, monkeypatch):
+        """A definition loaded before a concurrent write was saved doesn't replace the written one"""
+        term_cache = TermCache()
+        bot = Bot(bot_name="Glossary Bot", session=db_session, term_cache=term_cache)
+        handle_glossary(text="EW = v1")
+        load_definition = bot.load_definition
+
+        def write_while_loading(term):
+            definition = load_definition(term)
+            # another request's write lands between this load and caching what it loaded
+            with Session(db_session.get_bind()) as session:
+                Bot(bot_name="Glossary Bot", session=session, term_cache=term_cache).handle_glossary(
+                    text="EW = v2", user_name="testuser", slash_command="/test_bot"
+                )
+            return definition
+
+        with monkeypatch.context() as patch:
+            patch.setattr(bot, "load_definition", write_while_loading)
+            assert bot.query_definition("EW").definition == "v1"
+        assert bot.query_definition("EW").definition == "v2"
+
+
+class TestSlackIdentityCache:
+    def test_identities_are_cached_until_they_expire(self, monkeypatch):
+        """Authorizations are cached by workspace and user names by user id, for ttl seconds"""
+        now = [100.0]
+        monkeypatch.setattr("gloss.cache.time.monotonic", lambda: now[0])
+        cache = SlackIdentityCache(ttl=60)
+        assert cache.get_authorization(None, "T1") is None
+        cache.remember_authorization(None, "T1", {"bot_token": "xoxb-1"})
+        cache.remember_user_name("U1", "testuser")
+
+        assert cache.get_authorization(None, "T1") == {"bot_token": "xoxb-1"}
+        assert cache.get_authorization(None, "T2") is None
+        assert cache.get_user_name("U1") == "testuser"
+
+        now[0] += 61
+        assert cache.get_authorization(None, "T1") is None
+        assert cache.get_user_name("U1") is None
+        stats = cache.stats()
+        assert stats["authorizations"]["hits"] == 1
+        assert stats["authorizations"]["misses"] == 3
+        assert stats["user_names"]["expirations"] == 1
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+import time
+
+import pytest
+
+from gloss.bot import Bot
+from gloss.cache import LRUCache, TermCache
+from gloss.changes import ChangeFeed
+from gloss.counters import GlossaryCounters
+from gloss.dump import Importer
+from gloss.index import GlossaryIndex
+from gloss.models import Definition
+
+from . import conftest  # noqa: F401
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.02)
+    return True
+
+
+def make_process(session, **kwargs):
+    """A bot with the shared index and caches of a process of its own, and a change feed for them"""
+    index = GlossaryIndex()
+    index.load(session)
+    term_cache = TermCache()
+    result_cache = LRUCache()
+    counters = GlossaryCounters()
+    counters.load(session)
+    change_feed = ChangeFeed(session.get_bind(), index, term_cache, result_cache, counters=counters, **kwargs)
+    bot = Bot(
+        bot_name="Glossary Bot",
+        session=session,
+        index=index,
+        result_cache=result_cache,
+        term_cache=term_cache,
+        counters=counters,
+        change_feed=change_feed,
+    )
+    return bot, change_feed
+
+
+class TestChangeFeed:
+    def test_changes_are_pushed_to_other_processes(self, db_session):
+        """On postgres, a write in one process updates the caches of another through NOTIFY"""
+        db_session.commit()
+        first, first_feed = make_process(db_session, poll_interval=0.1)
+        second, second_feed = make_process(db_session, poll_interval=0.1)
+        if not second_feed.notifies:
+            pytest.skip("NOTIFY needs postgres and psycopg2")
+        second.handle_glossary(text="EW = Eligibility Worker", user_name="testuser", slash_command="/test_bot")
+        assert second.query_definition("ew").definition == "Eligibility Worker"
+
+        first_feed.start()
+        second_feed.start()
+        try:
+            # give the listener time to start listening
+            time.sleep(0.3)
+            first.handle_glossary(text="ew = Egg Weathervane", user_name="testuser", slash_command="/test_bot")
+            first.handle_glossary(text="FW = Fluffy Worker", user_name="testuser", slash_command="/test_bot")
+            assert wait_for(lambda: second_feed.received == 2)
+            assert second.query_definition("EW").definition == "Egg Weathervane"
+            assert second.index.definitions() == {"ew": "Egg Weathervane", "FW": "Fluffy Worker"}
+            assert second.counters.counts()[:2] == (2, 1)
+
+            first.handle_glossary(text="delete EW", user_name="testuser", slash_command="/test_bot")
+            assert wait_for(lambda: second_feed.received == 3)
+            assert second.query_definition("EW") is None
+            assert second.index.definitions() == {"FW": "Fluffy Worker"}
+            assert second.counters.counts()[:2] == (1, 1)
+            # a process ignores its own changes, which it has already applied
+            assert first_feed.received == 0
+        finally:
+            first_feed.stop()
+            second_feed.stop()
+
+    def test_imports_make_other_processes_reload(self, db_session):
+        """On postgres, an import makes every process reload the glossary"""
+        db_session.commit()
+        bot, change_feed = make_process(db_session, poll_interval=0.1)
+        if not change_feed.notifies:
+            pytest.skip("NOTIFY needs postgres and psycopg2")
+        bot.handle_glossary(text="EW = Eligibility Worker", user_name="testuser", slash_command="/test_bot")
+        assert bot.query_definition("EW").definition == "Eligibility Worker"
+
+        change_feed.start()
+        try:
+            time.sleep(0.3)
+            records = [
+                ("definitions", {"term": "ew", "definition": "Egg Weathervane", "user_name": "prod"}),
+                ("definitions", {"term": "FW", "definition": "Fluffy Worker", "user_name": "prod"}),
+            ]
+            Importer(db_session.get_bind(), merge=True).load(records)
+
+            assert wait_for(lambda: bot.counters.counts()[:2] == (2, 1))
+            assert change_feed.refreshes == 1
+            assert bot.query_definition("EW").definition == "Egg Weathervane"
+            assert bot.index.definitions() == {"ew": "Egg Weathervane", "FW": "Fluffy Worker"}
+        finally:
+            change_feed.stop()
+
+    def test_changes_are_polled_for(self, sqlite_session):
+        """Elsewhere, a change to the definitions table makes other processes reload everything"""
+        bot, change_feed = make_process(sqlite_session, poll_interval=0.05)
+        assert not change_feed.notifies
+        bot.handle_glossary(text="EW = Eligibility Worker", user_name="testuser", slash_command="/test_bot")
+        assert bot.query_definition("EW").definition == "Eligibility Worker"
+
+        change_feed.start()
+        try:
+            time.sleep(0.2)
+            # written behind the bot's back, as another process would
+            sqlite_session.query(Definition).update({Definition.definition: "Egg Weathervane"})
+            sqlite_session.add(Definition(term="FW", definition="Fluffy Worker", user_name="otheruser"))
+            sqlite_session.commit()
+
+            assert wait_for(lambda: "FW" in bot.index)
+            assert wait_for(lambda: bot.counters.counts()[:2] == (2, 2))
+            assert bot.query_definition("EW").definition == "Egg Weathervane"
+        finally:
+            change_feed.stop()
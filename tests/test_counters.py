@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+from gloss.bot import Bot
+from gloss.counters import CounterReconciler, GlossaryCounters
+from gloss.models import Definition
+
+from . import conftest  # noqa: F401
+
+
+class TestGlossaryCounters:
+    def test_writes_keep_the_counters_current(self, db_session, monkeypatch):
+        """Once loaded, the counters are kept current without counting rows again"""
+        counters = GlossaryCounters()
+        bots = {
+            user_name: Bot(bot_name="Glossary Bot", session=db_session, counters=counters)
+            for user_name in ("alice", "bob")
+        }
+
+        def handle(user_name, text):
+            return bots[user_name].handle_glossary(text=text, user_name=user_name, slash_command="/test_bot")
+
+        assert "I don't have any definitions" in handle("alice", "stats")
+        loads = []
+        monkeypatch.setattr(counters, "load", loads.append)
+
+        handle("alice", "EW = Eligibility Worker")
+        handle("alice", "FW = Fluffy Worker")
+        handle("bob", "EW")
+        handle("bob", "GW")
+        assert counters.counts() == (2, 1, 2)
+
+        # bob taking over alice's only other definition still leaves two definers
+        handle("bob", "FW = Fuzzy Worker")
+        assert counters.counts() == (2, 2, 2)
+        handle("bob", "delete EW")
+        assert counters.counts() == (1, 1, 2)
+
+        response = handle("alice", "stats")
+        assert "I have definitions for 1 term" in response
+        assert "1 person has defined terms" in response
+        assert "I've been asked for definitions 2 times" in response
+        assert loads == []
+
+    def test_reconciling_picks_up_other_writes(self, db_session):
+        """Reconciling recounts the rows written without going through the counters"""
+        counters = GlossaryCounters()
+        counters.load(db_session)
+        db_session.add(Definition(term="EW", definition="Eligibility Worker", user_name="alice"))
+        db_session.commit()
+        assert counters.counts() == (0, 0, 0)
+
+        CounterReconciler(counters, db_session.get_bind()).reconcile()
+        assert counters.counts() == (1, 1, 0)
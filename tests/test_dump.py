@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+import io
+import json
+from datetime import datetime
+
+import pytest
+
+from gloss.bot import Bot
+from gloss.dump import TABLES, Importer, iter_json, iter_ndjson, iter_records, write_ndjson
+from gloss.models import Definition, InteractionRollup
+
+from . import conftest  # noqa: F401
+
+
+class TestDump:
+    def test_write_ndjson(self, db_session, handle_glossary):
+        """Every row is written as a line of JSON, tagged with its table"""
+        handle_glossary(text="EW = Eligibility Worker")
+        handle_glossary(text="FW = Fluffy Worker")
+        handle_glossary(text="EW")
+
+        out = io.StringIO()
+        assert write_ndjson(db_session, out, batch_size=1) == 3
+        records = [json.loads(line) for line in out.getvalue().splitlines()]
+        assert [(record["table"], record["term"]) for record in records] == [
+            ("definitions", "EW"),
+            ("definitions", "FW"),
+            ("interactions", "EW"),
+        ]
+        assert records[0]["definition"] == "Eligibility Worker"
+        assert records[0]["user_name"] == "testuser"
+        assert records[2]["action"] == "found"
+        assert isinstance(records[2]["creation_date"], str)
+
+    @pytest.mark.parametrize("session_fixture", ["db_session", "sqlite_session"])
+    @pytest.mark.parametrize("export_format", ["json", "ndjson"])
+    def test_exports_can_be_imported(self, request, session_fixture, export_format):
+        """Importing an export, in chunks, restores every row"""
+        session = request.getfixturevalue(session_fixture)
+        bot = Bot(bot_name="Glossary Bot", session=session)
+        for text in ("EW = Eligibility Worker", "FW = see ew", "GW = tab\tand\nnewline \\N", "EW", "HW"):
+            bot.handle_glossary(text=text, user_name="testuser", slash_command="/test_bot")
+        session.add(InteractionRollup(month=datetime(2024, 1, 1), term="EW", action="found", count=12))
+        session.commit()
+        exported = {table: list(iter_records(session, table)) for table in TABLES}
+
+        out = io.StringIO()
+        if export_format == "json":
+            json.dump(exported, out, indent=2)
+        else:
+            write_ndjson(session, out)
+        out.seek(0)
+        records = iter_json(out) if export_format == "json" else iter_ndjson(out)
+        session.close()
+
+        # replacing what's there, including rollups the export doesn't have
+        session.add(InteractionRollup(month=datetime(2023, 1, 1), term="EW", action="found", count=5))
+        session.commit()
+        session.close()
+        importer = Importer(session.get_bind(), batch_size=2)
+        importer.clear()
+        assert importer.load(records) == {"definitions": 3, "interactions": 2, "interaction_rollups": 1}
+        assert {table: list(iter_records(session, table)) for table in TABLES} == exported
+        alias = session.query(Definition).filter(Definition.term == "FW").one()
+        assert alias.alias_id == session.query(Definition.id).filter(Definition.term == "EW").scalar()
+
+        # the ids carry on from the imported ones
+        bot.handle_glossary(text="IW = Ice Worker", user_name="testuser", slash_command="/test_bot")
+        assert bot.query_definition("IW").id > max(record["id"] for record in exported["definitions"])
+
+    @pytest.mark.parametrize("session_fixture", ["db_session", "sqlite_session"])
+    def test_merge(self, request, session_fixture):
+        """Merging upserts definitions by term, adds interactions and sums rollups, keeping what was there"""
+        session = request.getfixturevalue(session_fixture)
+        bot = Bot(bot_name="Glossary Bot", session=session)
+        for text in ("EW = Eligibility Worker", "GW = Goldfish Worker", "EW"):
+            bot.handle_glossary(text=text, user_name="testuser", slash_command="/test_bot")
+        session.add(InteractionRollup(month=datetime(2024, 1, 1), term="EW", action="found", count=12))
+        session.commit()
+        local_ids = dict(session.query(Definition.term, Definition.id))
+        session.close()
+
+        records = [
+            (
+                "definitions",
+                {
+                    "id": 7,
+                    "creation_date": "2026-01-02T03:04:05",
+                    "term": "ew",
+                    "definition": "Egg Weathervane",
+                    "user_name": "prod",
+                },
+            ),
+            (
+                "definitions",
+                {"id": 8, "creation_date": "2026-01-02T03:04:05", "term": "FW", "definition": "Fluffy", "user_name": "prod"},
+            ),
+            (
+                "definitions",
+                {"id": 8, "creation_date": "2026-01-02T03:04:06", "term": "FW", "definition": "see EW", "user_name": "prod"},
+            ),
+            (
+                "interactions",
+                {"id": 1, "creation_date": "2026-01-02T03:04:05", "user_name": "prod", "term": "EW", "action": "found"},
+            ),
+            ("interaction_rollups", {"id": 1, "month": "2024-01-01T00:00:00", "term": "EW", "action": "found", "count": 3}),
+            ("interaction_rollups", {"id": 2, "month": "2024-02-01T00:00:00", "term": "EW", "action": "found", "count": 4}),
+        ]
+        importer = Importer(session.get_bind(), merge=True)
+        assert importer.load(records) == {"definitions": 2, "interactions": 1, "interaction_rollups": 2}
+
+        definitions = {row.term: row for row in session.query(Definition)}
+        assert sorted(definitions) == ["FW", "GW", "ew"]
+        assert definitions["ew"].id == local_ids["EW"]
+        assert definitions["ew"].definition == "Egg Weathervane"
+        assert definitions["FW"].alias_id == local_ids["EW"]
+        assert definitions["GW"].definition == "Goldfish Worker"
+        assert [record["user_name"] for record in iter_records(session, "interactions")] == ["testuser", "prod"]
+        assert [(record["month"], record["count"]) for record in iter_records(session, "interaction_rollups")] == [
+            ("2024-01-01T00:00:00", 15),
+            ("2024-02-01T00:00:00", 4),
+        ]
+
+    def test_export_since(self, db_session, handle_glossary):
+        """Only rows after an id or creation date watermark are exported"""
+        handle_glossary(text="EW = Eligibility Worker")
+        handle_glossary(text="FW = Fluffy Worker")
+        first, second = iter_records(db_session, "definitions")
+
+        assert [record["term"] for record in iter_records(db_session, "definitions", since=first["id"])] == ["FW"]
+        watermark = datetime.fromisoformat(first["creation_date"])
+        assert [record["term"] for record in iter_records(db_session, "definitions", since=watermark)] == ["FW"]
+        handle_glossary(text="EW = Egg Weathervane")
+        assert [record["term"] for record in iter_records(db_session, "definitions", since=watermark)] == ["EW", "FW"]
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+from gloss.bot import Bot
+from gloss.index import GlossaryIndex
+
+from . import conftest  # noqa: F401
+
+
+class TestGlossaryIndex:
+    def test_index_loads_definitions(self, db_session, handle_glossary):
+        """The index is loaded with every definition in the database"""
+        handle_glossary(text="EW = Eligibility Worker")
+        handle_glossary(text="SAWS = Statewide Automated Welfare System")
+
+        index = GlossaryIndex()
+        index.ensure_loaded(db_session)
+        assert index.definitions() == {
+            "EW": "Eligibility Worker",
+            "SAWS": "Statewide Automated Welfare System",
+        }
+
+    def test_unloaded_index_ignores_writes(self):
+        """Writes to an index that hasn't been loaded yet are left for the load to pick up"""
+        index = GlossaryIndex()
+        index.add("EW", "Eligibility Worker")
+        assert len(index) == 0
+
+    def test_index_is_kept_current_by_writes(self, db_session):
+        """Setting, resetting and deleting definitions update a shared index"""
+        index = GlossaryIndex()
+        index.ensure_loaded(db_session)
+        bot = Bot(bot_name="Glossary Bot", session=db_session, index=index)
+
+        def handle_glossary(text):
+            return bot.handle_glossary(text=text, user_name="testuser", slash_command="/test_bot")
+
+        handle_glossary(text="lower case = NOT UPPER CASE")
+        assert index.definitions() == {"lower case": "NOT UPPER CASE"}
+
+        handle_glossary(text="LOWER CASE = really not upper case")
+        assert index.definitions() == {"LOWER CASE": "really not upper case"}
+
+        handle_glossary(text="delete lower case")
+        assert index.definitions() == {}
+
+    def test_snapshots_are_not_changed_by_writes(self, db_session):
+        """A snapshot taken before a write is left untouched by it"""
+        index = GlossaryIndex()
+        index.ensure_loaded(db_session)
+        index.add("EW", "Eligibility Worker")
+
+        snapshot = index.definitions()
+        index.remove("EW")
+        assert snapshot == {"EW": "Eligibility Worker"}
+        assert "EW" not in index
+
+    def test_substring_matches(self, db_session):
+        """Substring matches ignore case and only return terms containing the whole text"""
+        index = GlossaryIndex()
+        index.ensure_loaded(db_session)
+        for term in ("abglosscd", "glossed gloss", "Standard GLOSS", "glosloss", "luster"):
+            index.add(term, "a definition")
+
+        assert sorted(index.substring_matches("gloss")) == ["Standard GLOSS", "abglosscd", "glossed gloss"]
+        assert sorted(index.substring_matches("LOSS")) == ["Standard GLOSS", "abglosscd", "glosloss", "glossed gloss"]
+        # "glosloss" has every trigram in "gloss" without containing it
+        assert "glosloss" not in index.substring_matches("gloss")
+        # too short for trigrams
+        assert sorted(index.substring_matches("us")) == ["luster"]
+
+        index.remove("abglosscd")
+        assert sorted(index.substring_matches("gloss")) == ["Standard GLOSS", "glossed gloss"]
+
+    def test_fuzzy_matches(self, db_session):
+        """Fuzzy matches are scored against definitions and cut off below the score cutoff"""
+        index = GlossaryIndex()
+        index.ensure_loaded(db_session)
+        index.add("dictionary helper", "a gloss that is really glossing my world")
+        index.add("luster", "a prominent gloss")
+        index.add("EW", "Eligibility Worker")
+
+        matches = index.fuzzy_matches("gloss", score_cutoff=50)
+        assert [term for term, score in matches] == ["dictionary helper", "luster"]
+        assert all(score >= 50 for term, score in matches)
+        assert len(index.fuzzy_matches("gloss", limit=1, score_cutoff=50)) == 1
+
+    def test_fuzzy_matches_break_ties_alphabetically(self, db_session):
+        """Equally good matches are returned in term order when the limit cuts them off"""
+        index = GlossaryIndex()
+        index.ensure_loaded(db_session)
+        for term in ("delta", "alpha", "charlie", "bravo"):
+            index.add(term, "a prominent gloss")
+
+        assert index.fuzzy_matches("gloss", limit=2, score_cutoff=50) == [("alpha", 90), ("bravo", 90)]
@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+from gloss.bot import Bot
+from gloss.interactions import InteractionLogger
+from gloss.models import Interaction
+
+from . import conftest  # noqa: F401
+
+
+class TestInteractionLogger:
+    def test_interactions_are_written_when_flushed(self, db_session):
+        """Lookups only buffer their interactions, which are written together by a flush"""
+        db_session.commit()
+        interaction_logger = InteractionLogger(db_session.get_bind(), batch_size=2, flush_interval=60)
+        bot = Bot(bot_name="Glossary Bot", session=db_session, interaction_logger=interaction_logger)
+        bot.handle_glossary(text="EW = Eligibility Worker", user_name="testuser", slash_command="/test_bot")
+        for text in ("EW", "ew", "FW"):
+            bot.handle_glossary(text=text, user_name="testuser", slash_command="/test_bot")
+        assert db_session.query(Interaction).count() == 0
+
+        interaction_logger.shutdown()
+        db_session.commit()
+        interactions = db_session.query(Interaction).order_by(Interaction.id).all()
+        assert [(item.term, item.action) for item in interactions] == [
+            ("EW", "found"),
+            ("ew", "found"),
+            ("FW", "not_found"),
+        ]
+        assert all(item.creation_date is not None for item in interactions)
+        stats = interaction_logger.stats()
+        assert stats["written"] == 3
+        assert stats["buffered"] == 0
+
+    def test_interactions_past_the_buffer_size_are_dropped(self, db_session):
+        """Once the buffer is full, new interactions are dropped and counted"""
+        db_session.commit()
+        interaction_logger = InteractionLogger(db_session.get_bind(), max_buffer=2, flush_interval=60)
+        for term in ("a", "b", "c"):
+            interaction_logger.log(term=term, user_name="testuser", action="found")
+        assert interaction_logger.stats()["dropped"] == 1
+
+        assert interaction_logger.flush() == 2
+        interaction_logger.log(term="d", user_name="testuser", action="found")
+        interaction_logger.shutdown()
+        assert sorted(term for term, in db_session.query(Interaction.term)) == ["a", "b", "d"]
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+import os
+
+import pytest
+
+from gloss.bot import Bot
+from gloss.metrics import Histogram, Metrics, flatten_stats, mark_process_dead
+
+from . import conftest  # noqa: F401
+
+
+class TestMetrics:
+    def test_histogram_buckets(self):
+        """Observations are counted in the first bucket they fit in, and quantiles estimated from them"""
+        histogram = Histogram(buckets=(0.1, 1))
+        for value in (0.05, 0.1, 0.5, 5):
+            histogram.observe(value)
+
+        assert histogram.counts == [2, 1, 1]
+        assert histogram.count == 4
+        assert histogram.sum == pytest.approx(5.65)
+        assert histogram.quantile(0.5) == 0.1
+        assert histogram.quantile(0.75) == 1
+        assert histogram.quantile(1) == float("inf")
+
+    def test_phases_are_added_to_the_current_request(self):
+        """Phases are attributed to the request they happen in, which a nested request renames"""
+        metrics = Metrics()
+        with metrics.request():
+            with metrics.request("search"):
+                metrics.observe("db", 0.25)
+                metrics.observe("db", 0.25)
+        metrics.observe("slack_api", 1)
+
+        assert metrics.requests["search"].count == 1
+        assert metrics.request_phases[("search", "db")].sum == 0.5
+        assert metrics.request_phases[("search", "fuzzy")].sum == 0
+        assert metrics.phases["db"].count == 2
+        assert metrics.phases["slack_api"].count == 1
+
+    def test_failed_requests_are_counted(self):
+        metrics = Metrics()
+        with pytest.raises(ValueError):
+            with metrics.request("set"):
+                raise ValueError()
+
+        assert metrics.requests["set"].count == 1
+        assert metrics.errors["set"] == 1
+
+    def test_render(self):
+        """Histograms are rendered cumulatively in Prometheus' text format, with stats as gauges"""
+        metrics = Metrics()
+        metrics.add_stats("worker_pool", lambda: {"active": 2, "caches": {"hits": 3}, "name": "ignored"})
+        with metrics.request("get"):
+            metrics.observe("fuzzy", 0.003)
+
+        lines = metrics.render().splitlines()
+        assert "# TYPE glossary_request_seconds histogram" in lines
+        assert 'glossary_request_phase_seconds_bucket{command="get",phase="fuzzy",le="0.0025"} 0' in lines
+        assert 'glossary_request_phase_seconds_bucket{command="get",phase="fuzzy",le="0.005"} 1' in lines
+        assert 'glossary_request_phase_seconds_bucket{command="get",phase="fuzzy",le="+Inf"} 1' in lines
+        assert 'glossary_request_seconds_count{command="get"} 1' in lines
+        assert "glossary_worker_pool_active 2" in lines
+        assert "glossary_worker_pool_caches_hits 3" in lines
+        assert not any("ignored" in line for line in lines)
+
+    def test_processes_sharing_a_directory_are_added_up(self, tmp_path, monkeypatch):
+        """Any process sharing a directory renders everyone's counts, and the stats of those still running"""
+        worker = Metrics(directory=str(tmp_path))
+        worker.add_stats("worker_pool", lambda: {"active": 1})
+        with worker.request("get"):
+            worker.observe("fuzzy", 0.003)
+        with monkeypatch.context() as patch:
+            patch.setattr("gloss.metrics.os.getpid", lambda: 1234)
+            worker.save()
+
+        metrics = Metrics(directory=str(tmp_path))
+        metrics.add_stats("worker_pool", lambda: {"active": 2})
+        with pytest.raises(RuntimeError):
+            with metrics.request("get"):
+                raise RuntimeError("oops")
+
+        lines = metrics.render().splitlines()
+        assert 'glossary_request_seconds_count{command="get"} 2' in lines
+        assert 'glossary_phase_seconds_count{phase="fuzzy"} 1' in lines
+        assert 'glossary_request_errors_total{command="get"} 1' in lines
+        assert 'glossary_worker_pool_active{pid="1234"} 1' in lines
+        assert f'glossary_worker_pool_active{{pid="{os.getpid()}"}} 2' in lines
+
+        mark_process_dead(str(tmp_path), 1234)
+        lines = metrics.render().splitlines()
+        assert 'glossary_request_seconds_count{command="get"} 2' in lines
+        assert not any('pid="1234"' in line for line in lines)
+
+    def test_flatten_stats(self):
+        assert list(flatten_stats({"a": 1, "b": {"c": 2.5}})) == [("a", 1), ("b_c", 2.5)]
+
+    def test_bot_requests_are_named_after_their_command(self, sqlite_session):
+        """handle_glossary is timed by command, with its statements and fuzzy matching as phases"""
+        metrics = Metrics()
+        metrics.instrument(sqlite_session.get_bind())
+        bot = Bot(bot_name="Glossary Bot", session=sqlite_session, metrics=metrics)
+
+        bot.handle_glossary(user_name="glossie", slash_command="/gloss", text="EW = Eligibility Worker")
+        bot.handle_glossary(user_name="glossie", slash_command="/gloss", text="EX")
+        bot.handle_glossary(user_name="glossie", slash_command="/gloss", text="stats")
+        bot.handle_glossary(user_name="glossie", slash_command="/gloss", text="help")
+
+        assert sorted(metrics.requests) == ["get", "help", "set", "stats"]
+        assert metrics.request_phases[("set", "db")].sum > 0
+        assert metrics.request_phases[("get", "fuzzy")].sum > 0
+        assert metrics.request_phases[("help", "db")].sum == 0
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+from pathlib import Path
+
+from alembic import command
+from alembic.config import Config as AlembicConfig
+from sqlalchemy import text
+
+from . import conftest  # noqa: F401
+
+
+class TestMigrations:
+    def test_term_key_is_backfilled(self, alembic_runner, alembic_engine):
+        """Existing definitions get a term_key, and case-insensitive duplicates are merged into the oldest"""
+        alembic_runner.migrate_up_to("heads")
+        alembic_runner.migrate_down_to("a3e5d7f90b12")
+        with alembic_engine.begin() as conn:
+            conn.execute(text("DELETE FROM interactions"))
+            conn.execute(text("DELETE FROM definitions"))
+        alembic_runner.insert_into(
+            "definitions",
+            [
+                {"id": 1, "term": "EW", "definition": "Eligibility Worker"},
+                {"id": 2, "term": "ew", "definition": "Egg Weathervane"},
+                {"id": 3, "term": "SAWS", "definition": "Statewide Automated Welfare System"},
+                {"id": 4, "term": "Éclair", "definition": "A pastry"},
+                {"id": 5, "term": "Ew", "definition": "Ewe Whisperer"},
+            ],
+        )
+        alembic_runner.migrate_up_one()
+
+        with alembic_engine.connect() as conn:
+            rows = conn.execute(text("SELECT id, term_key, definition FROM definitions ORDER BY id")).all()
+        assert [tuple(row) for row in rows] == [
+            (1, "ew", "Eligibility Worker"),
+            (3, "saws", "Statewide Automated Welfare System"),
+            (4, "éclair", "A pastry"),
+        ]
+
+    def test_aliases_are_resolved(self, alembic_runner, alembic_engine):
+        """Existing aliases are pointed at the definitions they name"""
+        alembic_runner.migrate_up_to("heads")
+        alembic_runner.migrate_down_to("c81b5e2f4d37")
+        with alembic_engine.begin() as conn:
+            conn.execute(text("DELETE FROM interactions"))
+            conn.execute(text("DELETE FROM definitions"))
+        alembic_runner.insert_into(
+            "definitions",
+            [
+                {"id": 1, "term": "Glossary Bot", "term_key": "glossary bot", "definition": "A Slack bot"},
+                {"id": 2, "term": "GB", "term_key": "gb", "definition": "See Glossary Bot"},
+                {"id": 3, "term": "GBot", "term_key": "gbot", "definition": "see also gb"},
+                {"id": 4, "term": "nothing", "term_key": "nothing", "definition": "see nobody"},
+            ],
+        )
+        alembic_runner.migrate_up_one()
+
+        with alembic_engine.connect() as conn:
+            rows = conn.execute(text("SELECT id, alias_id FROM definitions ORDER BY id")).all()
+        assert [tuple(row) for row in rows] == [(1, None), (2, 1), (3, 2), (4, None)]
+
+    def test_alias_key_is_backfilled(self, alembic_runner, alembic_engine):
+        """Existing aliases get the key of the term they name, whether it's defined or not"""
+        alembic_runner.migrate_up_to("heads")
+        alembic_runner.migrate_down_to("b7d3e1f5a962")
+        with alembic_engine.begin() as conn:
+            conn.execute(text("DELETE FROM interactions"))
+            conn.execute(text("DELETE FROM definitions"))
+        alembic_runner.insert_into(
+            "definitions",
+            [
+                {"id": 1, "term": "Glossary Bot", "term_key": "glossary bot", "definition": "A Slack bot"},
+                {"id": 2, "term": "GB", "term_key": "gb", "definition": "See Glossary Bot"},
+                {"id": 3, "term": "nothing", "term_key": "nothing", "definition": "see Nobody"},
+            ],
+        )
+        alembic_runner.migrate_up_one()
+
+        with alembic_engine.connect() as conn:
+            rows = conn.execute(text("SELECT id, alias_key FROM definitions ORDER BY id")).all()
+        assert [tuple(row) for row in rows] == [(1, None), (2, "glossary bot"), (3, "nobody")]
+
+    def test_interactions_are_partitioned(self, alembic_runner, alembic_engine):
+        """Existing interactions are moved into monthly partitions"""
+        alembic_runner.migrate_up_to("heads")
+        alembic_runner.migrate_down_to("e4a92c6b1f08")
+        with alembic_engine.begin() as conn:
+            conn.execute(text("DELETE FROM interactions"))
+        alembic_runner.insert_into(
+            "interactions",
+            [
+                {"id": 1, "creation_date": "2024-01-31 23:59:59", "term": "EW", "action": "found"},
+                {"id": 2, "creation_date": "2024-02-01 00:00:00", "term": "EW", "action": "found"},
+                {"id": 3, "creation_date": None, "term": "FW", "action": "not_found"},
+            ],
+        )
+        alembic_runner.migrate_up_one()
+
+        with alembic_engine.connect() as conn:
+            rows = conn.execute(text("SELECT id, tableoid::regclass::text FROM interactions ORDER BY id")).all()
+        assert [tuple(row) for row in rows] == [
+            (1, "interactions_y2024m01"),
+            (2, "interactions_y2024m02"),
+            (3, "interactions_y2024m01"),
+        ]
+
+    def test_sqlite_downgrades_and_upgrades_again(self, sqlite_session):
+        """Every migration's downgrade undoes its upgrade on sqlite too, so it can be run again"""
+        root = Path(__file__).parent.parent
+        config = AlembicConfig(str(root / "alembic.ini"))
+        config.set_main_option("script_location", str(root / "alembic"))
+        sqlite_session.close()
+
+        command.downgrade(config, "e4a92c6b1f08")
+        command.upgrade(config, "heads")
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+from datetime import datetime
+
+from sqlalchemy import text
+
+from gloss.counters import GlossaryCounters
+from gloss.models import Interaction, InteractionRollup
+from gloss.retention import InteractionPruner
+
+from . import conftest  # noqa: F401
+
+
+def add_interactions(session, *interactions):
+    for creation_date, term, action in interactions:
+        session.add(Interaction(creation_date=creation_date, user_name="testuser", term=term, action=action))
+    session.commit()
+
+
+def get_rollups(session):
+    return sorted((rollup.month, rollup.term, rollup.action, rollup.count) for rollup in session.query(InteractionRollup))
+
+
+class TestInteractionPruner:
+    def test_old_interactions_are_rolled_up_and_deleted(self, sqlite_session):
+        """Interactions from before the cutoff's month are counted by month, term and action, in batches"""
+        add_interactions(
+            sqlite_session,
+            (datetime(2020, 1, 3), "EW", "found"),
+            (datetime(2020, 1, 4), "EW", "found"),
+            (datetime(2020, 1, 5), "EW", None),
+            (datetime(2020, 2, 1), "EW", "found"),
+            (datetime(2020, 3, 1), "EW", "found"),
+        )
+        pruner = InteractionPruner(sqlite_session.get_bind(), batch_size=2)
+        assert not pruner.partitioned
+
+        assert pruner.prune(datetime(2020, 2, 20)) == 3
+        assert get_rollups(sqlite_session) == [
+            (datetime(2020, 1, 1), "EW", "", 1),
+            (datetime(2020, 1, 1), "EW", "found", 2),
+        ]
+        assert pruner.prune(datetime(2020, 3, 20)) == 1
+        assert get_rollups(sqlite_session)[-1] == (datetime(2020, 2, 1), "EW", "found", 1)
+        assert [row.creation_date for row in sqlite_session.query(Interaction)] == [datetime(2020, 3, 1)]
+
+        # pruned interactions still count towards stats
+        counters = GlossaryCounters()
+        counters.load(sqlite_session)
+        assert counters.counts() == (0, 0, 5)
+
+    def test_partitions_are_rolled_up_and_dropped(self, db_session):
+        """On postgres, whole partitions are rolled up and dropped, and new ones take their rows from the default"""
+        add_interactions(
+            db_session,
+            (datetime(2020, 1, 3), "EW", "found"),
+            (datetime(2020, 1, 4), "EW", "found"),
+            (datetime(2020, 2, 1), "EW", "not_found"),
+        )
+        pruner = InteractionPruner(db_session.get_bind())
+        assert pruner.partitioned
+
+        with pruner.engine.begin() as connection:
+            for name in pruner.partitions(connection).values():
+                if name < "interactions_y2021":
+                    connection.execute(text(f"DROP TABLE {name}"))
+        assert pruner.create_partitions(now=datetime(2020, 1, 15)) == [
+            "interactions_y2020m01",
+            "interactions_y2020m02",
+            "interactions_y2020m03",
+            "interactions_y2020m04",
+        ]
+        assert db_session.execute(text("SELECT count(*) FROM interactions_y2020m01")).scalar() == 2
+        assert db_session.execute(text("SELECT count(*) FROM interactions_default")).scalar() == 0
+        db_session.commit()
+
+        assert pruner.prune(datetime(2020, 2, 20)) == 2
+        assert get_rollups(db_session) == [(datetime(2020, 1, 1), "EW", "found", 2)]
+        db_session.commit()
+        with pruner.engine.connect() as connection:
+            assert sorted(pruner.partitions(connection))[0] == datetime(2020, 2, 1)
+        assert [row.action for row in db_session.query(Interaction)] == ["not_found"]
@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+from gloss.bot import Bot
+from gloss.search import PostgresSearchBackend, SQLiteSearchBackend, get_search_backend
+
+from . import conftest  # noqa: F401
+
+
+DEFINITIONS = [
+    ("TAY", "Transitional Age Youth, people who are in transition from foster care."),
+    ("ACYF", "Administration for Children, Youth and Families, covering youth and family services."),
+    ("SAWS", "the Statewide Automated Welfare System, made up of multiple systems including CalWIN."),
+    ("CalWIN", "CalWORKs Information Network, a service supporting public assistance. Part of SAWS."),
+]
+
+
+class TestSearchBackends:
+    def test_backend_is_picked_by_dialect(self, db_session, sqlite_session):
+        """The search backend matches the session's database"""
+        assert isinstance(get_search_backend(db_session), PostgresSearchBackend)
+        assert isinstance(get_search_backend(sqlite_session), SQLiteSearchBackend)
+
+    def test_postgres_search_is_ranked(self, db_session, handle_glossary):
+        """Terms are ranked above definitions, and more matches rank higher"""
+        for term, definition in DEFINITIONS:
+            handle_glossary(text=f"{term} = {definition}")
+
+        backend = get_search_backend(db_session)
+        assert backend.search("youth") == ["ACYF", "TAY"]
+        assert backend.search("saws") == ["SAWS", "CalWIN"]
+        assert backend.search("banana") == []
+
+    def test_sqlite_search_is_ranked(self, sqlite_session):
+        """The FTS5 table is kept current by triggers and ranks terms above definitions"""
+        bot = Bot(bot_name="Glossary Bot", session=sqlite_session)
+        for term, definition in DEFINITIONS:
+            bot.handle_glossary(text=f"{term} = {definition}", user_name="testuser", slash_command="/test_bot")
+
+        backend = get_search_backend(sqlite_session)
+        assert backend.search("youth") == ["ACYF", "TAY"]
+        assert backend.search("calwin") == ["CalWIN", "SAWS"]
+        # the query syntax is escaped
+        assert backend.search('sys* OR "') == []
+
+        bot.handle_glossary(text="delete SAWS", user_name="testuser", slash_command="/test_bot")
+        assert backend.search("calwin") == ["CalWIN"]
+
+        robo_response = bot.handle_glossary(text="search cal", user_name="testuser", slash_command="/test_bot")
+        assert "found *cal* in: *CalWIN*" in robo_response
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+import io
+
+import pytest
+
+from datetime import datetime
+
+from gloss.bot import Bot
+from gloss.dump import TABLES, Importer, iter_records
+from gloss.models import InteractionRollup
+from gloss.snapshot import CHUNK_HEADER, HEADER, iter_snapshot, read_header, write_snapshot
+
+from . import conftest  # noqa: F401
+
+
+class TestSnapshot:
+    @pytest.mark.parametrize("jobs", [1, 2])
+    def test_snapshots_can_be_imported(self, sqlite_session, jobs):
+        """A snapshot, written in chunks, restores every row"""
+        bot = Bot(bot_name="Glossary Bot", session=sqlite_session)
+        for text in ("EW = Eligibility Worker", "FW = see ew", "GW = ünïcode\tand\nnewline", "EW", "HW", "EW"):
+            bot.handle_glossary(text=text, user_name="testuser", slash_command="/test_bot")
+        sqlite_session.add(InteractionRollup(month=datetime(2024, 1, 1), term="EW", action="found", count=12))
+        sqlite_session.commit()
+        exported = {table: list(iter_records(sqlite_session, table)) for table in TABLES}
+
+        out = io.BytesIO()
+        assert write_snapshot(sqlite_session, out, chunk_size=2) == 7
+        sqlite_session.close()
+        out.seek(0)
+
+        importer = Importer(sqlite_session.get_bind())
+        importer.clear()
+        assert importer.load(iter_snapshot(out, jobs=jobs)) == {
+            "definitions": 3,
+            "interactions": 3,
+            "interaction_rollups": 1,
+        }
+        assert {table: list(iter_records(sqlite_session, table)) for table in TABLES} == exported
+
+    def test_repeated_strings_are_stored_once(self, sqlite_session):
+        """A chunk's repeated user names and actions go in its string table"""
+        bot = Bot(bot_name="Glossary Bot", session=sqlite_session)
+        bot.handle_glossary(text="EW = Eligibility Worker", user_name="a_very_long_user_name", slash_command="/test_bot")
+        for _ in range(100):
+            bot.handle_glossary(text="EW", user_name="a_very_long_user_name", slash_command="/test_bot")
+        sqlite_session.commit()
+
+        out = io.BytesIO()
+        write_snapshot(sqlite_session, out, compression="none")
+        assert out.getvalue().count(b"a_very_long_user_name") == 2
+
+    def test_truncated_snapshots_are_refused(self, sqlite_session):
+        out = io.BytesIO()
+        write_snapshot(sqlite_session, out)
+        with pytest.raises(ValueError):
+            list(iter_snapshot(io.BytesIO(out.getvalue()[: -CHUNK_HEADER.size])))
+        with pytest.raises(ValueError):
+            read_header(io.BytesIO(b"{}" + out.getvalue()[: HEADER.size]))
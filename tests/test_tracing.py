@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+import asyncio
+import json
+
+import pytest
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+from gloss import tracing
+from gloss.bot import Bot
+from gloss.tracing import FileSpanExporter, configure_tracing, span, traced
+from gloss.workers import WorkerPool
+
+from . import conftest  # noqa: F401
+
+
+@pytest.fixture
+def exporter(monkeypatch):
+    """Spans finished while the test runs, without touching the global tracer provider"""
+    exporter = InMemorySpanExporter()
+    provider = TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+    monkeypatch.setattr(tracing, "tracer", provider.get_tracer("gloss"))
+    return exporter
+
+
+def spans_by_name(exporter):
+    return {finished.name: finished for finished in exporter.get_finished_spans()}
+
+
+class TestTracing:
+    def test_configure_tracing(self):
+        """Tracing is left alone without an exporter, and unknown exporters are refused"""
+        assert configure_tracing(None) is None
+        with pytest.raises(ValueError):
+            configure_tracing("zipkin")
+
+    def test_file_exporter(self, tmp_path):
+        """Spans are appended to the file a line each, and the file is closed on shutdown"""
+        span_exporter = FileSpanExporter(tmp_path / "traces.jsonl")
+        provider = TracerProvider()
+        provider.add_span_processor(SimpleSpanProcessor(span_exporter))
+        with provider.get_tracer("gloss").start_as_current_span("lookup"):
+            pass
+        provider.shutdown()
+
+        assert span_exporter.out.closed
+        lines = (tmp_path / "traces.jsonl").read_text().splitlines()
+        assert [json.loads(line)["name"] for line in lines] == ["lookup"]
+
+    def test_traced_functions_nest(self, exporter):
+        @traced
+        def inner():
+            return 1
+
+        @traced
+        async def outer():
+            return inner() + 1
+
+        assert asyncio.run(outer()) == 2
+        spans = spans_by_name(exporter)
+        inner_name = "TestTracing.test_traced_functions_nest.<locals>.inner"
+        outer_name = "TestTracing.test_traced_functions_nest.<locals>.outer"
+        assert spans[inner_name].parent.span_id == spans[outer_name].context.span_id
+
+    def test_worker_pool_work_is_traced_as_part_of_its_request(self, exporter):
+        """Work handed to the worker pool is a child of the span it was submitted from"""
+        pool = WorkerPool(workers=1)
+
+        def work():
+            with span("work"):
+                pass
+
+        with span("listener") as listener:
+            pool.submit(work).result(timeout=5)
+        pool.shutdown()
+
+        assert spans_by_name(exporter)["work"].parent.span_id == listener.get_span_context().span_id
+
+    def test_bot_methods_and_statements_are_traced(self, exporter, sqlite_session):
+        """Each Bot method is a span, with the statements it runs as its children"""
+        tracing.instrument(sqlite_session.get_bind())
+        bot = Bot(bot_name="Glossary Bot", session=sqlite_session)
+
+        bot.handle_glossary(user_name="glossie", slash_command="/gloss", text="EW = Eligibility Worker")
+
+        spans = exporter.get_finished_spans()
+        by_name = spans_by_name(exporter)
+        assert by_name["Bot.handle_glossary"].attributes["glossary.command"] == "set"
+        assert by_name["Bot.set_definition_and_get_response"].parent.span_id == (
+            by_name["Bot.dispatch_glossary"].context.span_id
+        )
+        inserts = [finished for finished in spans if finished.name == "INSERT"]
+        assert inserts
+        assert inserts[0].attributes["db.system"] == "sqlite"
+        assert inserts[0].attributes["db.statement"].startswith("INSERT INTO definitions")
+        assert inserts[0].parent.span_id in {finished.context.span_id for finished in spans}
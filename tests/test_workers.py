@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+import threading
+
+import pytest
+
+from gloss.workers import WorkerPool, WorkerPoolFull
+
+
+class TestWorkerPool:
+    def test_work_is_run(self):
+        """Submitted work runs on a worker and its result is returned through the future"""
+        pool = WorkerPool(workers=2, max_queue=2)
+        assert pool.submit(lambda a, b: a + b, 1, b=2).result(timeout=5) == 3
+        pool.shutdown()
+
+        stats = pool.stats()
+        assert stats["submitted"] == 1
+        assert stats["completed"] == 1
+        assert stats["queue_depth"] == 0
+
+    def test_full_queue_rejects_work(self):
+        """Once max_queue tasks are waiting, further work is rejected"""
+        pool = WorkerPool(workers=1, max_queue=1)
+        started = threading.Event()
+        release = threading.Event()
+
+        def block():
+            started.set()
+            release.wait(timeout=5)
+
+        running = pool.submit(block)
+        started.wait(timeout=5)
+        queued = pool.submit(block)
+        assert pool.queue_depth == 1
+        with pytest.raises(WorkerPoolFull):
+            pool.submit(block)
+
+        release.set()
+        running.result(timeout=5)
+        queued.result(timeout=5)
+        pool.shutdown()
+
+        stats = pool.stats()
+        assert stats["rejected"] == 1
+        assert stats["max_queue_depth"] == 1
+        assert stats["completed"] == 2
+
+    def test_failures_are_counted(self):
+        """Work that raises is counted as failed and the exception reaches the future"""
+        pool = WorkerPool(workers=1, max_queue=1)
+
+        def fail():
+            raise ValueError("nope")
+
+        with pytest.raises(ValueError):
+            pool.submit(fail).result(timeout=5)
+        pool.shutdown()
+        assert pool.stats()["failed"] == 1